@@ -0,0 +1,87 @@
+"""
+Sinh bộ dữ liệu tổng hợp gấp N lần datasets/covid_19_clean_complete.csv để đo hiệu năng.
+
+Mỗi bản sao j của dữ liệu gốc được dời ngày đi (j % số bản sao theo ngày) * số ngày của bộ
+gốc và gắn hậu tố " #k" vào tên tỉnh (k = j // số bản sao theo ngày), nên không có dòng nào
+trùng nhau và số quốc gia không đổi. Số ca được nhân với một hệ số ngẫu nhiên nhỏ (seed cố định)
+để dữ liệu không lặp y hệt. Cùng nguồn, hệ số và seed thì luôn sinh ra cùng một file.
+
+    python -m benchmarks.generate 10 -o /tmp/covid_x10.csv
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "datasets", "covid_19_clean_complete.csv")
+PROVINCE_COL = "Tỉnh/Bang"
+COUNTRY_COL = "Quốc gia/Vùng lãnh thổ"
+DATE_COL = "Ngày"
+COUNT_COLS = ["Ca xác nhận", "Tử vong", "Hồi phục", "Đang điều trị"]
+
+
+def copy_layout(factor):
+    """Số bản sao theo ngày và theo tỉnh: chia đều hệ số cho hai chiều (vd. 10 -> 4 x 3)."""
+    date_copies = max(1, int(math.sqrt(factor)))
+    return date_copies, math.ceil(factor / date_copies)
+
+
+def scaled_copy(base, dates, j, date_copies, rng):
+    df = base.copy()
+    shift, suffix = j % date_copies, j // date_copies
+    if shift:
+        span = pd.Timedelta(days=int(dates.dt.normalize().nunique()))
+        df[DATE_COL] = (dates + shift * span).dt.strftime("%Y-%m-%d")
+    if suffix:
+        names = df[PROVINCE_COL].fillna(df[COUNTRY_COL])
+        df[PROVINCE_COL] = names + f" #{suffix}"
+    if j:
+        noise = rng.uniform(0.9, 1.1, size=len(df))
+        for col in COUNT_COLS:
+            df[col] = np.round(df[col].fillna(0) * noise).astype(np.int64)
+    return df
+
+
+def generate(factor, output, source=SOURCE, seed=0):
+    """Ghi file gấp factor lần file nguồn, từng bản sao một (bộ nhớ chỉ cần cho một bản). Trả về số dòng."""
+    base = pd.read_csv(source)
+    dates = pd.to_datetime(base[DATE_COL], errors="coerce")
+    date_copies, _ = copy_layout(factor)
+    rng = np.random.default_rng(seed)
+    rows = 0
+    tmp = output + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        for j in range(factor):
+            df = scaled_copy(base, dates, j, date_copies, rng)
+            df.to_csv(f, index=False, header=(j == 0))
+            rows += len(df)
+    os.replace(tmp, output)
+    return rows
+
+
+def ensure_dataset(factor, data_dir, source=SOURCE, seed=0):
+    """Đường dẫn file gấp factor lần trong data_dir, chỉ sinh lại nếu chưa có."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"covid_x{factor}_seed{seed}.csv")
+    if not os.path.exists(path):
+        generate(factor, path, source, seed)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.generate",
+                                     description="Sinh dữ liệu COVID-19 tổng hợp gấp N lần bộ gốc.")
+    parser.add_argument("factor", type=int, help="hệ số nhân (1, 10, 100, ...)")
+    parser.add_argument("-o", "--output", required=True, help="file CSV ghi ra")
+    parser.add_argument("--source", default=SOURCE, help="file nguồn (mặc định: covid_19_clean_complete.csv)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    rows = generate(args.factor, args.output, args.source, args.seed)
+    print(f"Đã ghi {rows} dòng vào {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Bộ đo hiệu năng không cần giao diện: đọc/ghi, phân trang, tìm kiếm, sắp xếp, thêm/sửa/xóa,
+làm sạch (như TabCleaning) và tính dữ liệu biểu đồ trên dữ liệu gấp 1x, 10x, 100x.
+
+    python -m benchmarks.run --scales 1 10 -o before.json
+    python -m benchmarks.run --scales 1 10 -o after.json --compare before.json
+
+Mỗi phép đo chạy --repeat lần để lấy thời gian, rồi chạy thêm một lần dưới tracemalloc để lấy
+bộ nhớ cấp phát cao nhất (bỏ qua bằng --no-memory). Kết quả ghi ra JSON để so sánh hai lần chạy.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generate import ensure_dataset
+from covid_stats.analyzer import ANALYTICS, CaseCube, SeriesAnalytics
+from covid_stats.chart_jobs import PAYLOADS, map_payload
+from covid_stats.cleaning import STEP_TYPES, build_pipeline
+from covid_stats.data_loader import ColumnarCache, DataLoader
+from covid_stats.exporter import StreamingExporter
+from covid_stats.filters import Contains, FilterEngine, Range
+from covid_stats.materialized import VIEW_NAMES, MaterializedViews
+from covid_stats.models import CovidStats
+from covid_stats.profiler import Profiler
+from covid_stats.schema import COLUMN_MAP
+from covid_stats.spatial import SpatialIndex
+
+COUNTRY_COL = "Quốc gia/Vùng lãnh thổ"
+PROVINCE_COL = "Tỉnh/Bang"
+DATE_COL = "Ngày"
+# Tùy chọn mặc định của TabCleaning
+TAB_CLEANING_OPTIONS = {"autofill_missing": True, "remove_duplicates": True}
+PAGE_SIZE = 20
+N_PAGES = 200
+# Số dòng sửa/xóa trong một lần gọi update_many/delete_many, và số lần gọi add_record/update_record
+N_CHANGES = 1000
+N_SINGLE_CHANGES = 100
+
+
+class Case:
+    """Một phép đo: setup() chuẩn bị trạng thái (không tính giờ), run(trạng thái) là phần được đo."""
+    def __init__(self, name, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+    def once(self):
+        state = self.setup() if self.setup else None
+        start = time.perf_counter()
+        self.run(state)
+        return time.perf_counter() - start
+
+    def peak_memory(self):
+        state = self.setup() if self.setup else None
+        tracemalloc.start()
+        try:
+            self.run(state)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+
+def measure(case, repeat, memory=True):
+    seconds = [case.once() for _ in range(repeat)]
+    result = {"seconds": seconds, "best": min(seconds), "mean": sum(seconds) / len(seconds)}
+    result["peak_bytes"] = case.peak_memory() if memory else None
+    return result
+
+
+def build_cases(path, work_dir, seed=0):
+    """Các phép đo cho một file dữ liệu; dữ liệu và model dùng chung được nạp một lần ở đây."""
+    rng = np.random.default_rng(seed)
+    df = DataLoader(path, use_cache=False, column_map=COLUMN_MAP).load_data()
+    cache = ColumnarCache(root=os.path.join(work_dir, "cache"))
+    DataLoader(path, cache=cache, column_map=COLUMN_MAP).load_data()
+    model = CovidStats(df.copy())
+    n_pages = model.get_total_pages(PAGE_SIZE)
+    pages = rng.integers(1, n_pages + 1, size=N_PAGES)
+    countries = df[COUNTRY_COL].value_counts()
+    top_country = countries.index[0]
+    cube = CaseCube(df)
+    spatial = SpatialIndex(df)
+    queries = np.column_stack([rng.uniform(-60, 70, N_PAGES), rng.uniform(-180, 180, N_PAGES)])
+    region = cube.region_names()[0] if cube.region_names() else None
+    out_path = os.path.join(work_dir, "saved.csv")
+    record = {COUNTRY_COL: "Vietnam", PROVINCE_COL: "Bench", DATE_COL: "2020-05-01",
+              "Ca xác nhận": "10", "Tử vong": "0", "Hồi phục": "5", "Đang điều trị": "5"}
+
+    def fresh_model():
+        return CovidStats(df.copy())
+
+    def sorted_model():
+        m = CovidStats(df)
+        m.sort_records("Ca xác nhận")
+        return m
+
+    def random_ids(m, n):
+        return rng.choice(m.all_ids(), size=min(n, len(m)), replace=False)
+
+    def get_pages(_):
+        for page in pages:
+            model.get_page(int(page), PAGE_SIZE)
+
+    def add_records(m):
+        for _ in range(N_SINGLE_CHANGES):
+            m.add_record(record)
+
+    def attached_views():
+        m = CovidStats(df.copy())
+        views = MaterializedViews(CaseCube(m.data)).attach(m)
+        for name in VIEW_NAMES:
+            views.table(name)
+        return m, views
+
+    def build_views(_):
+        views = MaterializedViews(CaseCube(df))
+        for name in VIEW_NAMES:
+            views.table(name)
+
+    def update_views(state):
+        m, views = state
+        m.update_many(random_ids(m, N_CHANGES), {"Tử vong": "1"})
+        for name in VIEW_NAMES:
+            views.table(name)
+
+    compound = (Contains(COUNTRY_COL, "an") & Range("Ca xác nhận", 1000, 50000)
+                & Range(DATE_COL, "2020-04-01", "2020-05-31"))
+
+    def warm_filters():
+        engine = FilterEngine(model)
+        engine.ids(compound)
+        return engine
+
+    def spatial_bbox(_):
+        for lat, lon in queries:
+            spatial.bbox_rows(lat - 10, lat + 10, lon - 20, lon + 20)
+
+    def spatial_nearest(_):
+        for lat, lon in queries:
+            spatial.nearest(lat, lon, k=5)
+
+    def rank_all(analytics):
+        for name in ANALYTICS:
+            analytics.rank(name, top=50)
+
+    def update_records(m):
+        for row_id in random_ids(m, N_SINGLE_CHANGES):
+            m.update_record(row_id, {"Ca xác nhận": "123", COUNTRY_COL: "Vietnam"})
+
+    def edited_model():
+        # Một loạt thao tác sửa/xóa sẵn trong lịch sử để đo hoàn tác và làm lại
+        m = fresh_model()
+        m.update_many(random_ids(m, N_CHANGES), {"Tử vong": "1"})
+        m.delete_many(random_ids(m, N_CHANGES))
+        return m
+
+    def undo_all(m):
+        while m.undo():
+            pass
+
+    def undone_model():
+        m = edited_model()
+        undo_all(m)
+        return m
+
+    def redo_all(m):
+        while m.redo():
+            pass
+
+    cases = [
+        Case("load_data", lambda _: DataLoader(path, use_cache=False, column_map=COLUMN_MAP).load_data()),
+        Case("load_data_cached", lambda _: DataLoader(path, cache=cache, column_map=COLUMN_MAP).load_data()),
+        Case("save_data", lambda _: DataLoader(out_path).save_data(df)),
+        Case("export_view_csv", lambda m: StreamingExporter.from_model(m, out_path).run(), setup=sorted_model),
+        Case("export_view_gzip", lambda m: StreamingExporter.from_model(m, out_path + ".gz").run(), setup=sorted_model),
+        Case("export_view_jsonl", lambda m: StreamingExporter.from_model(m, out_path + ".jsonl").run(),
+             setup=sorted_model),
+        Case("model_build", CovidStats, setup=lambda: df.copy()),
+        Case("get_page", get_pages),
+        Case("search_contains", lambda _: model.search_ids("an", [COUNTRY_COL])),
+        Case("search_prefix", lambda _: model.search_ids("new", [PROVINCE_COL], mode="prefix")),
+        Case("search_date_range", lambda _: model.range_ids(DATE_COL, "2020-04-01", "2020-04-30")),
+        Case("filter_compound", lambda _: FilterEngine(model).ids(compound)),
+        Case("filter_refine", lambda e: e.ids(compound & ~Contains(COUNTRY_COL, "japan") | Contains(PROVINCE_COL, "new")),
+             setup=warm_filters),
+        Case("sort_cold", lambda m: m.sort_records("Ca xác nhận", ascending=False), setup=lambda: CovidStats(df)),
+        Case("sort_cached", lambda m: m.sort_records("Ca xác nhận", ascending=False), setup=sorted_model),
+        Case("add_record", add_records, setup=fresh_model),
+        Case("update_record", update_records, setup=fresh_model),
+        Case("update_many", lambda m: m.update_many(random_ids(m, N_CHANGES), {"Tử vong": "1"}), setup=fresh_model),
+        Case("delete_many", lambda m: m.delete_many(random_ids(m, N_CHANGES)), setup=fresh_model),
+        Case("undo", undo_all, setup=edited_model),
+        Case("redo", redo_all, setup=undone_model),
+        Case("clean_tab_defaults", lambda d: build_pipeline(TAB_CLEANING_OPTIONS).run(d), setup=lambda: df.copy()),
+        Case("clean_all_steps", lambda d: build_pipeline(dict.fromkeys(STEP_TYPES, True)).run(d),
+             setup=lambda: df.copy()),
+        Case("profile", Profiler, setup=lambda: CovidStats(df)),
+        Case("cube_build", lambda _: CaseCube(df)),
+        Case("spatial_build", lambda _: SpatialIndex(df)),
+        Case("spatial_bbox", spatial_bbox),
+        Case("spatial_nearest", spatial_nearest),
+        Case("chart_map_world", lambda _: map_payload(spatial)),
+        Case("views_build", build_views),
+        Case("views_update", update_views, setup=attached_views),
+        Case("analytics_countries", lambda _: rank_all(SeriesAnalytics.from_cube(cube))),
+        Case("analytics_provinces", lambda _: rank_all(SeriesAnalytics.from_frame(df))),
+        Case("analytics_rerank", rank_all, setup=lambda: SeriesAnalytics.from_frame(df)),
+    ]
+    for kind, payload in PAYLOADS.items():
+        cases.append(Case(f"chart_{kind}_world", lambda _, f=payload: f(cube, None, None)))
+        cases.append(Case(f"chart_{kind}_country", lambda _, f=payload: f(cube, top_country, None)))
+        if region is not None:
+            cases.append(Case(f"chart_{kind}_region", lambda _, f=payload: f(cube, None, region)))
+    return len(df), cases
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scales, data_dir, repeat=3, memory=True, only=None, seed=0, log=print):
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "scales": {},
+    }
+    for factor in scales:
+        path = ensure_dataset(factor, data_dir, seed=seed)
+        work_dir = tempfile.mkdtemp(prefix="covid-bench-")
+        try:
+            rows, cases = build_cases(path, work_dir, seed)
+            log(f"== {factor}x: {rows} dòng, {os.path.getsize(path) / 1e6:.1f} MB ==")
+            results = {}
+            for case in cases:
+                if only and not any(fnmatch.fnmatch(case.name, pattern) for pattern in only):
+                    continue
+                results[case.name] = measure(case, repeat, memory)
+                log(format_result(case.name, results[case.name]))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        report["scales"][str(factor)] = {"rows": rows, "file_bytes": os.path.getsize(path), "results": results}
+    return report
+
+
+def format_result(name, result, baseline=None):
+    peak = result.get("peak_bytes")
+    line = f"  {name:<24} {result['best'] * 1000:>10.2f} ms"
+    line += f"  {peak / 1e6:>9.1f} MB" if peak is not None else f"  {'':>12}"
+    if baseline is not None and baseline.get("best"):
+        line += f"  {result['best'] / baseline['best']:>6.2f}x thời gian"
+        if peak is not None and baseline.get("peak_bytes"):
+            line += f"  {peak / baseline['peak_bytes']:>6.2f}x bộ nhớ"
+    return line
+
+
+def compare(report, baseline):
+    """Bảng so sánh với một lần chạy trước (tỉ lệ > 1 là chậm hơn/tốn bộ nhớ hơn)."""
+    lines = []
+    for factor, scale in report["scales"].items():
+        base_scale = baseline.get("scales", {}).get(factor)
+        if base_scale is None:
+            continue
+        lines.append(f"== {factor}x so với {baseline['meta'].get('commit') or 'lần chạy trước'} ==")
+        for name, result in scale["results"].items():
+            base = base_scale["results"].get(name)
+            if base is not None:
+                lines.append(format_result(name, result, base))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Đo hiệu năng covid_stats.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="các hệ số dữ liệu (mặc định: 1 10 100)")
+    parser.add_argument("--repeat", type=int, default=3, help="số lần chạy mỗi phép đo (mặc định: 3)")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "covid_bench_data"),
+                        help="thư mục chứa dữ liệu tổng hợp (sinh một lần, dùng lại cho các lần chạy sau)")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="file JSON kết quả")
+    parser.add_argument("--compare", help="file JSON của lần chạy trước để so sánh")
+    parser.add_argument("--only", nargs="+", help="chỉ chạy các phép đo khớp mẫu (vd. 'chart_*' sort_cold)")
+    parser.add_argument("--no-memory", action="store_true", help="không đo bộ nhớ (nhanh hơn)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.scales, args.data_dir, args.repeat, not args.no_memory, args.only, args.seed)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi kết quả vào {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(report, json.load(f)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
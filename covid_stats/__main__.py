@@ -0,0 +1,58 @@
+"""
+Chạy không cần giao diện: python -m covid_stats datasets/ -o output/
+
+Đọc, làm sạch và tổng hợp mọi file CSV trong thư mục bằng nhiều tiến trình, rồi in bảng thời gian.
+Module này không import tkinter hay matplotlib.
+"""
+import argparse
+import os
+import sys
+import time
+
+from covid_stats.batch import DEFAULT_STEPS, format_summary, run_batch
+from covid_stats.cleaning import STEP_TYPES
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m covid_stats",
+                                     description="Làm sạch và tổng hợp các file dữ liệu COVID-19 theo lô.")
+    parser.add_argument("input_dir", nargs="?", default="datasets", help="thư mục chứa file CSV (mặc định: datasets)")
+    parser.add_argument("-o", "--output", default=None, help="thư mục ghi kết quả (mặc định: <input_dir>/output)")
+    parser.add_argument("-p", "--pattern", default="*.csv", help="mẫu tên file (mặc định: *.csv)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="số tiến trình (mặc định: số CPU)")
+    parser.add_argument("-s", "--steps", default=",".join(DEFAULT_STEPS),
+                        help="các bước làm sạch, cách nhau bởi dấu phẩy: " + ", ".join(STEP_TYPES))
+    parser.add_argument("--no-cache", action="store_true", help="không dùng cache dạng cột khi đọc file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    steps = [s.strip() for s in args.steps.split(",") if s.strip()]
+    unknown = [s for s in steps if s not in STEP_TYPES]
+    if unknown:
+        print(f"Lỗi: bước làm sạch không hợp lệ: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    if not os.path.isdir(args.input_dir):
+        print(f"Lỗi: không tìm thấy thư mục {args.input_dir}", file=sys.stderr)
+        return 2
+    output_dir = args.output or os.path.join(args.input_dir, "output")
+
+    def on_result(result):
+        status = f"lỗi: {result['error']}" if result["error"] else f"{result['rows_out']} dòng"
+        print(f"Xong {os.path.basename(result['file'])} ({status})", flush=True)
+
+    start = time.perf_counter()
+    results = run_batch(args.input_dir, output_dir, args.pattern, args.workers, steps,
+                        use_cache=not args.no_cache, on_result=on_result)
+    if not results:
+        print(f"Không có file nào khớp {args.pattern} trong {args.input_dir}")
+        return 1
+    print()
+    print(format_summary(results, time.perf_counter() - start))
+    print(f"Kết quả được ghi vào: {output_dir}")
+    return 1 if any(r["error"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+COUNTRY_COL = "Quốc gia/Vùng lãnh thổ"
+PROVINCE_COL = "Tỉnh/Bang"
+REGION_COL = "Khu vực WHO"
+DATE_COL = "Ngày"
+METRICS = ["Ca xác nhận", "Tử vong", "Hồi phục", "Đang điều trị"]
+
+# Chỉ số phân tích (tính cho mọi chuỗi cùng lúc, xem SeriesAnalytics)
+ROLLING_WINDOW = 7
+ANALYTICS = ["Ca xác nhận", "Ca mới", "Ca mới (TB 7 ngày)", "Tử vong mới (TB 7 ngày)",
+             "Tăng trưởng (%/ngày)", "Thời gian nhân đôi (ngày)", "Tỉ lệ tử vong (%)"]
+
+
+class CaseCube:
+    """
+    Khối dữ liệu dày quốc gia × ngày × chỉ số (Ca xác nhận, Tử vong, Hồi phục, Đang điều trị),
+    dựng một lần cho mỗi phiên bản dữ liệu. Tổng theo khu vực WHO và toàn thế giới được tính sẵn.
+    Khi gắn với CovidStats (attach), mỗi thay đổi chỉ cộng/trừ vào các ô bị ảnh hưởng.
+    Các hàm đọc và cập nhật giữ self.lock nên có thể đọc khối từ luồng khác.
+    """
+    def __init__(self, df: pd.DataFrame):
+        self.lock = threading.RLock()
+        self.model = None
+        self.version = 0
+        self.countries = []
+        self._country_code = {}
+        self.regions = []
+        self._region_code = {}
+        country_codes, country_region = self._encode_countries(df)
+        date_values = self._to_dates(df[DATE_COL]) if DATE_COL in df.columns else np.empty(0, "datetime64[D]")
+        date_codes, dates = pd.factorize(date_values, sort=True)
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.country_region = country_region
+
+        shape = (len(self.countries), len(self.dates))
+        valid = (country_codes >= 0) & (date_codes >= 0) & (date_codes < len(self.dates))
+        flat = country_codes[valid] * shape[1] + date_codes[valid]
+        size = shape[0] * shape[1]
+        self.counts = np.bincount(flat, minlength=size).reshape(shape)
+        metrics = self._metric_values(df)[valid]
+        self.values = np.stack([np.bincount(flat, weights=metrics[:, m], minlength=size).reshape(shape)
+                                for m in range(len(METRICS))], axis=-1)
+        self._rebuild_rollups()
+
+    # --- Mã hóa ---
+    def _encode_countries(self, df):
+        if COUNTRY_COL not in df.columns:
+            return np.full(len(df), -1, dtype=np.int64), np.empty(0, dtype=np.int64)
+        codes, uniques = pd.factorize(df[COUNTRY_COL], sort=True)
+        for name in uniques:
+            self._country_code[name] = len(self.countries)
+            self.countries.append(name)
+        country_region = np.full(len(uniques), -1, dtype=np.int64)
+        if REGION_COL in df.columns:
+            # Khu vực của một quốc gia lấy theo dòng đầu tiên có ghi khu vực
+            regions = df[REGION_COL]
+            has_region = (codes >= 0) & regions.notna().to_numpy()
+            first_codes, first_rows = np.unique(codes[has_region], return_index=True)
+            region_names = regions.to_numpy()[has_region][first_rows]
+            for code, name in zip(first_codes, region_names):
+                country_region[code] = self._region(name)
+        return codes.astype(np.int64), country_region
+
+    def _region(self, name):
+        code = self._region_code.get(name)
+        if code is None:
+            code = len(self.regions)
+            self._region_code[name] = code
+            self.regions.append(name)
+        return code
+
+    @staticmethod
+    def _to_dates(values):
+        return pd.to_datetime(pd.Series(values), errors="coerce").to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+
+    @staticmethod
+    def _metric_values(df):
+        columns = [pd.to_numeric(df[m], errors="coerce").fillna(0).to_numpy(dtype=np.float64) if m in df.columns
+                   else np.zeros(len(df)) for m in METRICS]
+        return np.column_stack(columns) if len(df) else np.zeros((0, len(METRICS)))
+
+    def _rebuild_rollups(self):
+        self.region_values = np.zeros((len(self.regions), len(self.dates), len(METRICS)))
+        known = self.country_region >= 0
+        np.add.at(self.region_values, self.country_region[known], self.values[known])
+        self.world = self.values.sum(axis=0)
+
+    # --- Cập nhật tăng dần theo thay đổi của CovidStats ---
+    def attach(self, model):
+        self.detach()
+        self.model = model
+        self.version = model.version
+        model.add_listener(self.on_mutation)
+        return self
+
+    def detach(self):
+        if self.model is not None:
+            self.model.remove_listener(self.on_mutation)
+            self.model = None
+
+    def _country_index(self, name, region):
+        code = self._country_code.get(name)
+        if code is None:
+            code = len(self.countries)
+            self._country_code[name] = code
+            self.countries.append(name)
+            region_code = self._region(region) if not pd.isna(region) else -1
+            self.country_region = np.append(self.country_region, region_code)
+            self.values = np.concatenate([self.values, np.zeros((1,) + self.values.shape[1:])])
+            self.counts = np.concatenate([self.counts, np.zeros((1, self.counts.shape[1]), dtype=self.counts.dtype)])
+            if region_code >= len(self.region_values):
+                self.region_values = np.concatenate([self.region_values, np.zeros((1,) + self.region_values.shape[1:])])
+        return code
+
+    def _date_index(self, date):
+        pos = int(np.searchsorted(self.dates, date))
+        if pos == len(self.dates) or self.dates[pos] != date:
+            # Ngày mới: chèn một cột vào trục ngày (không nhóm lại toàn bộ dữ liệu)
+            self.dates = np.insert(self.dates, pos, date)
+            self.values = np.insert(self.values, pos, 0.0, axis=1)
+            self.counts = np.insert(self.counts, pos, 0, axis=1)
+            self.region_values = np.insert(self.region_values, pos, 0.0, axis=1)
+            self.world = np.insert(self.world, pos, 0.0, axis=0)
+        return pos
+
+    def _apply(self, rows, sign):
+        if rows is None or not len(rows) or COUNTRY_COL not in rows.columns or DATE_COL not in rows.columns:
+            return
+        dates = self._to_dates(rows[DATE_COL])
+        metrics = self._metric_values(rows) * sign
+        regions = rows[REGION_COL].to_numpy() if REGION_COL in rows.columns else [np.nan] * len(rows)
+        for name, region, date, delta in zip(rows[COUNTRY_COL].to_numpy(), regions, dates, metrics):
+            if pd.isna(name) or np.isnat(date):
+                continue
+            c = self._country_index(name, region)
+            d = self._date_index(date)
+            self.values[c, d] += delta
+            self.counts[c, d] += sign
+            self.world[d] += delta
+            if self.country_region[c] >= 0:
+                self.region_values[self.country_region[c], d] += delta
+
+    def on_mutation(self, mutation):
+        touched = set(mutation.columns) & {COUNTRY_COL, DATE_COL, REGION_COL, *METRICS}
+        with self.lock:
+            if touched:
+                self._apply(mutation.before, -1)
+                self._apply(mutation.after, 1)
+            self.version = self.model.version if self.model is not None else self.version + 1
+
+    # --- Đọc dữ liệu cho biểu đồ ---
+    def _slice(self, country=None, region=None):
+        # Không chỉ định quốc gia/khu vực WHO thì lấy tổng toàn thế giới
+        if country is not None:
+            c = self._country_code.get(country)
+            if c is None:
+                return np.zeros((0, len(METRICS))), np.zeros(0, dtype=np.int64)
+            return self.values[c], self.counts[c]
+        if region is not None:
+            r = self._region_code.get(region)
+            if r is None:
+                return np.zeros((0, len(METRICS))), np.zeros(0, dtype=np.int64)
+            return self.region_values[r], self.counts[self.country_region == r].sum(axis=0)
+        return self.world, self.counts.sum(axis=0)
+
+    def series(self, country=None, region=None):
+        """DataFrame theo ngày (index) với 4 chỉ số, chỉ gồm các ngày có dữ liệu."""
+        with self.lock:
+            values, counts = self._slice(country, region)
+            present = counts > 0
+            dates = self.dates[:len(present)][present]
+            return pd.DataFrame(values[present], index=pd.DatetimeIndex(dates, name=DATE_COL),
+                                columns=METRICS)
+
+    def latest(self, country=None, region=None):
+        """Giá trị 4 chỉ số tại ngày mới nhất có dữ liệu."""
+        with self.lock:
+            values, counts = self._slice(country, region)
+            present = np.flatnonzero(counts > 0)
+            if not len(present):
+                return pd.Series(0.0, index=METRICS)
+            return pd.Series(values[present[-1]], index=METRICS)
+
+    def country_totals(self, metric="Ca xác nhận", countries=None):
+        """Tổng một chỉ số theo quốc gia (cộng dồn mọi ngày), sắp giảm dần."""
+        m = METRICS.index(metric)
+        with self.lock:
+            totals = pd.Series(self.values[:, :, m].sum(axis=1), index=pd.Index(self.countries, name=COUNTRY_COL))
+            totals = totals[self.counts.sum(axis=1) > 0]
+        if countries is not None:
+            totals = totals[totals.index.isin(countries)]
+        return totals.sort_values(ascending=False)
+
+    def to_frame(self):
+        """Bảng dài (quốc gia, ngày, khu vực WHO, 4 chỉ số) gồm các ô có dữ liệu, sắp theo ngày rồi quốc gia."""
+        with self.lock:
+            days, countries = np.nonzero(self.counts.T > 0)
+            regions = np.array(self.regions + [np.nan], dtype=object)[self.country_region[countries]] \
+                if len(self.country_region) else np.empty(0, dtype=object)
+            frame = pd.DataFrame({
+                DATE_COL: pd.DatetimeIndex(self.dates[days]),
+                COUNTRY_COL: np.array(self.countries, dtype=object)[countries],
+                REGION_COL: regions,
+            })
+            values = self.values[countries, days]
+            for m, metric in enumerate(METRICS):
+                frame[metric] = values[:, m]
+            return frame
+
+    def country_names(self):
+        with self.lock:
+            present = self.counts.sum(axis=1) > 0
+            return sorted(name for name, ok in zip(self.countries, present) if ok)
+
+    def region_countries(self, region):
+        with self.lock:
+            r = self._region_code.get(region, -2)
+            return [name for name, code in zip(self.countries, self.country_region) if code == r]
+
+    def region_names(self):
+        with self.lock:
+            return sorted(self.regions)
+
+
+# --- Phép tính vectơ trên ma trận chuỗi × ngày ---
+def carried_forward(values, present):
+    """
+    Giá trị của khối (..., ngày, chỉ số) tại mỗi ô; ô không có dữ liệu lấy giá trị của ngày có dữ liệu
+    gần nhất trước đó (0 nếu trước đó chưa có), để ngày thiếu số liệu không bị coi là giảm về 0.
+    """
+    if present.all():
+        return values.copy()
+    n_days, n_metrics = values.shape[-2:]
+    last = np.maximum.accumulate(np.where(present, np.arange(n_days), -1), axis=-1)
+    # Lấy theo chỉ số phẳng (nhanh hơn take_along_axis khi phải lan truyền qua trục chỉ số)
+    flat = np.maximum(last, 0).reshape(-1, n_days) + (np.arange(last.size // max(n_days, 1)) * n_days)[:, None]
+    filled = values.reshape(-1, n_metrics)[flat.ravel()].reshape(values.shape)
+    filled[last < 0] = 0
+    return filled
+
+
+def daily_new(values, present, start=0):
+    """
+    Số ca mới theo ngày của tối đa 3 chỉ số đầu (Ca xác nhận, Tử vong, Hồi phục) từ khối
+    (..., ngày, chỉ số), chỉ cho các ngày từ start trở đi. So với ngày có dữ liệu gần nhất trước đó;
+    ngày đầu tiên bằng 0. Ca mới âm (số liệu bị điều chỉnh giảm) được đưa về 0 như bộ dữ liệu gốc,
+    còn Tử vong mới và Hồi phục mới giữ nguyên dấu.
+    """
+    filled = carried_forward(values[..., :3], present)
+    block = filled[..., max(start - 1, 0):, :]
+    new = np.diff(block, axis=-2, prepend=block[..., :1, :]) if start == 0 else np.diff(block, axis=-2)
+    np.maximum(new[..., 0], 0, out=new[..., 0])
+    return new
+
+
+def rolling_mean(values, window=ROLLING_WINDOW):
+    """Trung bình trượt theo trục ngày (trục cuối); NaN cho window - 1 ngày đầu chưa đủ số liệu."""
+    csum = np.cumsum(values, axis=-1, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    out[..., window - 1:] = csum[..., window - 1:]
+    out[..., window:] -= csum[..., :-window]
+    return out / window
+
+
+def _window_ratio(confirmed, window):
+    # Tỉ số ca xác nhận so với window ngày trước (NaN nếu trước đó chưa có ca nào)
+    ratio = np.full(confirmed.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio[..., window:] = np.where(confirmed[..., :-window] > 0,
+                                       confirmed[..., window:] / confirmed[..., :-window], np.nan)
+    return ratio
+
+
+def growth_rate(confirmed, window=ROLLING_WINDOW):
+    """Tốc độ tăng ca xác nhận bình quân mỗi ngày (%) trong window ngày gần nhất."""
+    return (_window_ratio(confirmed, window) ** (1 / window) - 1) * 100
+
+
+def doubling_time(confirmed, window=ROLLING_WINDOW):
+    """Số ngày để ca xác nhận tăng gấp đôi với tốc độ của window ngày gần nhất (NaN nếu không tăng)."""
+    ratio = _window_ratio(confirmed, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ratio > 1, window * np.log(2) / np.log(ratio), np.nan)
+
+
+def fatality_ratio(deaths, confirmed):
+    """Tỉ lệ tử vong trên số ca xác nhận (%); NaN khi chưa có ca nào."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(confirmed > 0, deaths / confirmed * 100, np.nan)
+
+
+class SeriesAnalytics:
+    """
+    Chỉ số phân tích (ca mới, trung bình 7 ngày, tốc độ tăng, thời gian nhân đôi, tỉ lệ tử vong)
+    cho mọi chuỗi (quốc gia hoặc tỉnh/bang) cùng lúc, tính bằng phép toán NumPy trên ma trận
+    chuỗi × ngày. Mỗi chỉ số được tính một lần khi cần rồi giữ lại, nên xếp hạng tại một ngày bất kỳ
+    chỉ là cắt một cột và sắp xếp.
+    """
+    def __init__(self, labels, dates, values, present, window=ROLLING_WINDOW):
+        self.labels = np.asarray(labels, dtype=object)
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.window = window
+        self.present = present
+        # Chỉ cần Ca xác nhận và Tử vong; ngày thiếu số liệu lấy giá trị ngày trước đó
+        filled = carried_forward(values[..., :2], present)
+        self.confirmed = filled[..., 0]
+        self.deaths = filled[..., 1]
+        self._new = None
+        self._cache = {}
+        # Ngày đầu tiên có dữ liệu của mỗi chuỗi (số ngày nếu chưa từng có)
+        first = np.argmax(present, axis=1) if present.shape[1] else np.zeros(len(present), dtype=np.int64)
+        self.first_day = np.where(present.any(axis=1), first, present.shape[1])
+
+    @classmethod
+    def from_cube(cls, cube, window=ROLLING_WINDOW):
+        """Chuỗi theo quốc gia, lấy từ khối CaseCube."""
+        with cube.lock:
+            return cls(list(cube.countries), cube.dates.copy(), cube.values[:, :, :2].copy(), cube.counts > 0, window)
+
+    @classmethod
+    def from_frame(cls, df, window=ROLLING_WINDOW):
+        """
+        Chuỗi theo tỉnh/bang (dòng không có tỉnh/bang tính cho cả quốc gia), nhóm bằng bincount trên
+        mã factorize như CaseCube.
+        """
+        if COUNTRY_COL not in df.columns or DATE_COL not in df.columns:
+            return cls([], np.empty(0, "datetime64[D]"), np.zeros((0, 0, 2)), np.zeros((0, 0), dtype=bool), window)
+        # Ghép mã tỉnh/bang với mã quốc gia, chỉ tạo tên cho các cặp khác nhau (không nối chuỗi từng dòng)
+        country_codes, countries = pd.factorize(df[COUNTRY_COL])
+        n = max(len(countries), 1)
+        if PROVINCE_COL in df.columns:
+            province_codes, provinces = pd.factorize(df[PROVINCE_COL])
+        else:
+            province_codes, provinces = np.full(len(df), -1), []
+        pairs = np.where(country_codes >= 0, (province_codes.astype(np.int64) + 1) * n + country_codes, -1)
+        codes, unique_pairs = pd.factorize(pairs)
+
+        def label(pair):
+            province, country = divmod(int(pair), n)
+            return countries[country] if province == 0 else f"{provinces[province - 1]} ({countries[country]})"
+
+        labels = np.array([label(p) if p >= 0 else "" for p in unique_pairs], dtype=object)
+        # Đánh lại mã theo thứ tự tên; dòng không có quốc gia ("" đứng đầu) nhận mã -1
+        order = np.argsort(labels, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order)) - (unique_pairs < 0).sum()
+        codes, names = rank[codes], labels[order][(unique_pairs < 0).sum():]
+        date_codes, dates = pd.factorize(CaseCube._to_dates(df[DATE_COL]), sort=True)
+        valid = (codes >= 0) & (date_codes >= 0)
+        shape = (len(names), len(dates))
+        flat = codes[valid] * shape[1] + date_codes[valid]
+        size = shape[0] * shape[1]
+        values = np.stack([np.bincount(flat, weights=pd.to_numeric(df[m], errors="coerce").fillna(0)
+                                       .to_numpy(dtype=np.float64)[valid], minlength=size).reshape(shape)
+                           if m in df.columns else np.zeros(shape) for m in METRICS[:2]], axis=-1)
+        present = np.bincount(flat, minlength=size).reshape(shape) > 0
+        return cls(list(names), dates, values, present, window)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def new(self):
+        """Ca mới và Tử vong mới theo ngày (chuỗi × ngày × 2)."""
+        if self._new is None:
+            self._new = daily_new(np.stack([self.confirmed, self.deaths], axis=-1), self.present)
+        return self._new
+
+    def metric(self, name):
+        """Ma trận chuỗi × ngày của một chỉ số trong ANALYTICS."""
+        if name not in self._cache:
+            if name == "Ca xác nhận":
+                result = self.confirmed
+            elif name == "Ca mới":
+                result = self.new[..., 0]
+            elif name == "Ca mới (TB 7 ngày)":
+                result = rolling_mean(self.new[..., 0], self.window)
+            elif name == "Tử vong mới (TB 7 ngày)":
+                result = rolling_mean(self.new[..., 1], self.window)
+            elif name == "Tăng trưởng (%/ngày)":
+                result = growth_rate(self.confirmed, self.window)
+            elif name == "Thời gian nhân đôi (ngày)":
+                result = doubling_time(self.confirmed, self.window)
+            elif name == "Tỉ lệ tử vong (%)":
+                result = fatality_ratio(self.deaths, self.confirmed)
+            else:
+                raise ValueError(f"Không có chỉ số phân tích '{name}'")
+            self._cache[name] = result
+        return self._cache[name]
+
+    def day_index(self, date=None):
+        """Vị trí của ngày trên trục ngày (ngày có dữ liệu gần nhất không sau date; mặc định là ngày cuối)."""
+        if date is None:
+            return len(self.dates) - 1
+        return int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date).date(), "D"), side="right")) - 1
+
+    def reporting_day(self):
+        """Ngày mới nhất mà số chuỗi có dữ liệu là nhiều nhất (bỏ qua vài ngày lẻ chỉ một nơi báo cáo)."""
+        if not len(self.dates):
+            return None
+        reporting = self.present.sum(axis=0)
+        return self.dates[np.flatnonzero(reporting == reporting.max())[-1]]
+
+    def snapshot(self, date=None, metrics=ANALYTICS):
+        """Giá trị các chỉ số của mọi chuỗi đã có dữ liệu tính đến ngày date."""
+        d = self.day_index(date)
+        if d < 0:
+            return pd.DataFrame(columns=list(metrics))
+        rows = np.flatnonzero(self.first_day <= d)
+        return pd.DataFrame({name: self.metric(name)[rows, d] for name in metrics},
+                            index=pd.Index(self.labels[rows], name="Tên"))
+
+    def rank(self, metric, date=None, ascending=False, top=None, metrics=ANALYTICS):
+        """
+        Xếp hạng các chuỗi theo một chỉ số tại ngày date; chuỗi không có giá trị (NaN) xếp cuối.
+        Trả về DataFrame có cột Hạng và các chỉ số, top dòng đầu (mặc định tất cả).
+        """
+        d = self.day_index(date)
+        if d < 0:
+            return pd.DataFrame(columns=["Hạng", "Tên"] + list(metrics))
+        rows = np.flatnonzero(self.first_day <= d)
+        values = self.metric(metric)[rows, d]
+        keys = values if ascending else -values
+        order = np.argsort(keys, kind="stable")
+        if top is not None:
+            order = order[:top]
+        rows = rows[order]
+        frame = pd.DataFrame({"Hạng": np.arange(1, len(rows) + 1), "Tên": self.labels[rows]})
+        for name in metrics:
+            frame[name] = self.metric(name)[rows, d]
+        return frame
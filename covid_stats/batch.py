@@ -0,0 +1,97 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from covid_stats.analyzer import COUNTRY_COL, DATE_COL, CaseCube
+from covid_stats.cleaning import build_pipeline
+from covid_stats.data_loader import DataLoader
+from covid_stats.materialized import MaterializedViews
+from covid_stats.schema import COLUMN_MAP
+
+DEFAULT_STEPS = ["autofill_missing", "remove_duplicates"]
+STAGES = ["Đọc", "Làm sạch", "Tổng hợp", "Ghi"]
+
+
+def process_file(path, output_dir, steps=DEFAULT_STEPS, use_cache=True):
+    """
+    Xử lý một file (chạy trong tiến trình con): đọc, làm sạch, tổng hợp quốc gia × ngày và ghi
+    <tên>.cleaned.csv cùng các bảng dẫn xuất <tên>.full_grouped.csv, <tên>.day_wise.csv,
+    <tên>.country_wise_latest.csv vào output_dir. Trả về dict thời gian từng bước.
+    """
+    result = {"file": path, "rows_in": 0, "rows_out": 0, "aggregate_rows": None, "times": {}, "error": None}
+    times = result["times"]
+    name = os.path.splitext(os.path.basename(path))[0]
+    try:
+        t = time.perf_counter()
+        df = DataLoader(path, use_cache=use_cache, column_map=COLUMN_MAP).load_data()
+        times["Đọc"] = time.perf_counter() - t
+        if df.empty and not len(df.columns):
+            raise ValueError("không đọc được dữ liệu")
+        result["rows_in"] = len(df)
+
+        t = time.perf_counter()
+        df, report = build_pipeline(dict.fromkeys(steps, True)).run(df)
+        times["Làm sạch"] = time.perf_counter() - t
+        result["rows_out"] = len(df)
+        result["cleaning"] = report.lines()
+
+        views = None
+        t = time.perf_counter()
+        if COUNTRY_COL in df.columns and DATE_COL in df.columns:
+            views = MaterializedViews(CaseCube(df))
+            result["aggregate_rows"] = len(views.full_grouped())
+            views.day_wise()
+            views.country_wise_latest()
+        times["Tổng hợp"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        os.makedirs(output_dir, exist_ok=True)
+        df.to_csv(os.path.join(output_dir, f"{name}.cleaned.csv"), index=False)
+        if views is not None:
+            views.save(output_dir, prefix=f"{name}.")
+        times["Ghi"] = time.perf_counter() - t
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def run_batch(input_dir, output_dir, pattern="*.csv", workers=None, steps=DEFAULT_STEPS, use_cache=True,
+              on_result=None):
+    """Xử lý song song mọi file khớp pattern trong input_dir bằng một nhóm tiến trình."""
+    files = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    results = []
+    if not files:
+        return results
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_file, path, output_dir, list(steps), use_cache) for path in files]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result:
+                on_result(result)
+    results.sort(key=lambda r: r["file"])
+    return results
+
+
+def format_summary(results, wall_seconds):
+    """Bảng thời gian theo từng file và từng bước, kèm tổng."""
+    name_width = max([len(os.path.basename(r["file"])) for r in results] + [4])
+    header = f"{'File':<{name_width}}  {'Dòng vào':>9}  {'Dòng ra':>9}" + "".join(f"  {s:>9}" for s in STAGES)
+    lines = [header, "-" * len(header)]
+    totals = dict.fromkeys(STAGES, 0.0)
+    for r in results:
+        name = os.path.basename(r["file"])
+        if r["error"]:
+            lines.append(f"{name:<{name_width}}  Lỗi: {r['error']}")
+            continue
+        cells = ""
+        for stage in STAGES:
+            seconds = r["times"].get(stage, 0.0)
+            totals[stage] += seconds
+            cells += f"  {seconds:>8.3f}s"
+        lines.append(f"{name:<{name_width}}  {r['rows_in']:>9}  {r['rows_out']:>9}{cells}")
+    lines.append("-" * len(header))
+    lines.append(f"{'Tổng':<{name_width}}  {'':>9}  {'':>9}" + "".join(f"  {totals[s]:>8.3f}s" for s in STAGES))
+    lines.append(f"Thời gian thực: {wall_seconds:.3f}s cho {len(results)} file")
+    return "\n".join(lines)
@@ -0,0 +1,201 @@
+import queue
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from covid_stats.analyzer import METRICS
+from covid_stats.utils import lttb, lttb_indices, bin_by_width
+
+# Số điểm tối đa vẽ cho mỗi đường (chuỗi dài hơn được giảm mẫu bằng LTTB)
+MAX_POINTS = 1000
+# Số cột tối đa của biểu đồ cột chồng; nhiều ngày hơn thì gộp thành các nhóm ngày
+MAX_BARS = 60
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def date_numbers(index):
+    # matplotlib chỉ được import khi vẽ biểu đồ lần đầu (không làm chậm lúc khởi động)
+    import matplotlib.dates as mdates
+    return mdates.date2num(index.to_numpy(dtype="datetime64[ns]"))
+
+
+# --- Tính dữ liệu cho từng loại biểu đồ (chạy trên luồng nền, không đụng tới Tk) ---
+def pie_payload(cube, country, region, job=None):
+    if cube.series(country=country, region=region).empty:
+        return None
+    return {"sizes": cube.latest(country=country, region=region).tolist()}
+
+
+def line_payload(cube, country, region, job=None):
+    df = cube.series(country=country, region=region)
+    if df.empty:
+        return None
+    x = date_numbers(df.index)
+    lines = []
+    for metric in METRICS:
+        if job is not None:
+            job.check()
+        lines.append(lttb(x, df[metric].to_numpy(), MAX_POINTS))
+    return {"lines": lines}
+
+
+def area_payload(cube, country, region, job=None):
+    df = cube.series(country=country, region=region)
+    if df.empty:
+        return None
+    x = date_numbers(df.index)
+    values = df[METRICS].fillna(0).to_numpy()
+    tops = np.cumsum(values, axis=1)
+    # Các lớp chồng lên nhau nên dùng chung một tập điểm, chọn theo đường trên cùng
+    keep = lttb_indices(x, tops[:, -1], MAX_POINTS)
+    return {"x": x[keep], "tops": tops[keep], "bottoms": tops[keep] - values[keep]}
+
+
+def stacked_payload(cube, country, region, job=None):
+    df = cube.series(country=country, region=region)
+    if df.empty:
+        return None
+    # Gộp các ngày thành tối đa MAX_BARS khoảng cùng độ rộng (trung bình mỗi khoảng), một cột mỗi khoảng
+    lefts, means, size = bin_by_width(date_numbers(df.index), df[METRICS].to_numpy(), MAX_BARS)
+    return {"x": lefts + size / 2, "heights": means, "size": size}
+
+
+def bar_payload(cube, country, region, job=None):
+    if country is not None:
+        members = [country]
+    elif region is not None:
+        members = cube.region_countries(region)
+    else:
+        members = None
+    top = cube.country_totals('Ca xác nhận', members).head(10)
+    if top.empty:
+        return None
+    return {"labels": top.index.tolist(), "heights": top.to_numpy()}
+
+
+def map_payload(spatial, countries=None, job=None):
+    """Số ca xác nhận (ngày gần nhất) của các địa điểm, gộp theo ô lưới; countries None là mọi quốc gia."""
+    lat, lon, totals, counts, size = spatial.binned("Ca xác nhận", countries)
+    if not len(totals):
+        return None
+    return {"lat": lat, "lon": lon, "totals": totals, "counts": counts, "size": size}
+
+
+PAYLOADS = {
+    "pie": pie_payload,
+    "line": line_payload,
+    "area": area_payload,
+    "stacked": stacked_payload,
+    "bar": bar_payload,
+}
+
+
+class ChartJob:
+    def __init__(self, scheduler, key, func, generation):
+        self.scheduler = scheduler
+        self.key = key
+        self.func = func
+        self.generation = generation
+
+    @property
+    def cancelled(self):
+        return self.generation != self.scheduler.generation
+
+    def check(self):
+        """Gọi giữa các bước tính toán; dừng sớm nếu đã có yêu cầu mới hơn."""
+        if self.cancelled:
+            raise JobCancelled()
+
+
+class ChartScheduler:
+    """
+    Tính dữ liệu biểu đồ trên một luồng phụ. Mỗi lần submit() thay thế yêu cầu trước đó
+    (yêu cầu cũ bị hủy nếu chưa xong), kết quả được giữ trong cache LRU theo khóa
+    (loại biểu đồ, lựa chọn, phiên bản dữ liệu) nên xem lại một biểu đồ sẽ có ngay.
+    Luồng giao diện gọi poll() định kỳ (qua after) để lấy kết quả của yêu cầu mới nhất.
+    """
+    def __init__(self, cache_size=32):
+        self.cache_size = cache_size
+        self.generation = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._thread = None
+        self._pending = None
+
+    def cached(self, key):
+        with self._lock:
+            if key not in self._cache:
+                return False, None
+            self._cache.move_to_end(key)
+            return True, self._cache[key]
+
+    def _store(self, key, payload):
+        with self._lock:
+            self._cache[key] = payload
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def submit(self, key, func):
+        """
+        Trả về (True, kết quả) nếu đã có trong cache; ngược lại đưa yêu cầu sang luồng phụ
+        và trả về (False, None).
+        """
+        self.generation += 1
+        hit, payload = self.cached(key)
+        if hit:
+            self._pending = None
+            return True, payload
+        job = ChartJob(self, key, func, self.generation)
+        self._pending = job
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._requests.put(job)
+        return False, None
+
+    def cancel(self):
+        self.generation += 1
+        self._pending = None
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def pending(self):
+        return self._pending is not None
+
+    def _run(self):
+        while True:
+            job = self._requests.get()
+            # Bỏ qua các yêu cầu đã bị thay thế khi còn nằm trong hàng đợi
+            if job.cancelled:
+                continue
+            try:
+                payload = job.func(job)
+            except JobCancelled:
+                continue
+            except Exception as e:
+                self._results.put((job, None, e))
+                continue
+            self._store(job.key, payload)
+            self._results.put((job, payload, None))
+
+    def poll(self):
+        """Gọi từ luồng giao diện: trả về (khóa, kết quả, lỗi) của yêu cầu mới nhất nếu đã xong."""
+        latest = None
+        while True:
+            try:
+                job, payload, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if job is self._pending:
+                latest = (job.key, payload, error)
+                self._pending = None
+        return latest
@@ -0,0 +1,647 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from covid_stats.schema import COUNT_COLUMNS, canonical_name
+
+DATE_KEYWORDS = ("date", "ngày")
+
+StepReport = namedtuple("StepReport", ["name", "label", "seconds", "rows_changed"])
+
+
+def is_categorical(series):
+    return isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def is_text(series):
+    if is_categorical(series):
+        return is_text(series.cat.categories.to_series())
+    return pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)
+
+
+def date_columns(df):
+    return [col for col in df.columns if any(k in str(col).lower() for k in DATE_KEYWORDS)]
+
+
+class CleaningStep:
+    """
+    Một bước làm sạch. Bước theo cột (per_column = True) biến đổi từng Series và trả về
+    mặt nạ các dòng bị thay đổi; bước theo bảng biến đổi cả DataFrame tại chỗ.
+    """
+    name = "step"
+    label = ""
+    per_column = True
+
+    def applies_to(self, col, series):
+        return True
+
+    def transform(self, series):
+        raise NotImplementedError
+
+    def apply_frame(self, df):
+        raise NotImplementedError
+
+
+class FillMissing(CleaningStep):
+    """Điền giá trị thiếu: auto (trung bình cho cột số, 1970-01-01 cho ngày, "unknown" cho chữ),
+    mean, median, mode, ffill hoặc constant (dùng value)."""
+    name = "autofill_missing"
+    label = "Tự động điền dữ liệu bị khuyết (NaN)"
+
+    def __init__(self, strategy="auto", value=None, values=None):
+        self.strategy = strategy
+        self.value = value
+        # Giá trị điền tính sẵn theo cột (chế độ làm sạch theo khối tính ở lượt đọc đầu)
+        self.values = values
+
+    def fill_value(self, series):
+        if self.values is not None and series.name in self.values:
+            return self.values[series.name]
+        if self.strategy == "constant":
+            return self.value
+        numeric = pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+        if self.strategy == "mean" or (self.strategy == "auto" and numeric):
+            return series.mean() if numeric else None
+        if self.strategy == "median":
+            return series.median() if numeric else None
+        if self.strategy == "mode":
+            mode = series.mode()
+            return mode.iloc[0] if len(mode) else None
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return pd.Timestamp("1970-01-01")
+        return "unknown"
+
+    def transform(self, series):
+        missing = series.isna().to_numpy()
+        if not missing.any():
+            return series, missing
+        if self.strategy == "ffill":
+            result = series.ffill()
+        else:
+            value = self.fill_value(series)
+            if value is None or pd.isna(value):
+                return series, np.zeros(len(series), dtype=bool)
+            if is_categorical(series) and value not in series.cat.categories:
+                series = series.cat.add_categories([value])
+            elif pd.api.types.is_integer_dtype(series.dtype) and float(value) != int(value):
+                # Cột số nguyên (kiểu gọn của schema) không chứa được giá trị lẻ như trung bình
+                series = series.astype(np.float64)
+            result = series.fillna(value)
+        return result, missing & result.notna().to_numpy()
+
+
+class NormalizeCase(CleaningStep):
+    """Bỏ khoảng trắng thừa và chuẩn hóa chữ hoa/thường (lower, upper, title) cho cột chữ."""
+    name = "standardize_case"
+    label = "Chuẩn hóa chữ hoa/thường"
+
+    def __init__(self, mode="lower", columns=None):
+        self.mode = mode
+        self.columns = columns
+
+    def applies_to(self, col, series):
+        return (self.columns is None or col in self.columns) and is_text(series)
+
+    def _normalize(self, text):
+        normalized = getattr(text.str.strip().str, self.mode)()
+        if pd.api.types.is_object_dtype(text.dtype) and pd.api.types.infer_dtype(text, skipna=True) != "string":
+            # .str biến các ô không phải chuỗi (số, ngày...) thành NaN: giữ nguyên các ô đó
+            is_str = np.fromiter((isinstance(v, str) for v in text), dtype=bool, count=len(text))
+            normalized = normalized.where(is_str, text)
+        return normalized
+
+    def transform(self, series):
+        if is_categorical(series):
+            return self._transform_categories(series)
+        text = self._normalize(series)
+        changed = (text != series).to_numpy(dtype=bool) & series.notna().to_numpy()
+        if not changed.any():
+            return series, changed
+        return text, changed
+
+    def _transform_categories(self, series):
+        # Chỉ chuẩn hóa danh sách category (vài trăm giá trị) rồi ánh xạ lại mã; các category
+        # trùng nhau sau khi chuẩn hóa được gộp làm một
+        categories = series.cat.categories
+        normalized = self._normalize(categories.to_series()).to_numpy()
+        codes = series.cat.codes.to_numpy()
+        category_changed = np.append(normalized != categories.to_numpy(), False)
+        changed = category_changed[codes]
+        if not changed.any():
+            return series, changed
+        new_codes, uniques = pd.factorize(normalized)
+        result = pd.Categorical.from_codes(np.append(new_codes, -1)[codes], uniques)
+        return pd.Series(result, index=series.index, name=series.name), changed
+
+
+class CoerceDates(CleaningStep):
+    """Chuyển cột ngày (tên có "date"/"ngày") sang kiểu datetime; giá trị sai định dạng thành NaT."""
+    name = "convert_date"
+    label = "Chuyển định dạng ngày (nếu có cột ngày)"
+
+    def __init__(self, columns=None, date_format=None):
+        self.columns = columns
+        self.date_format = date_format
+
+    def applies_to(self, col, series):
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return False
+        if self.columns is not None:
+            return col in self.columns
+        return any(k in str(col).lower() for k in DATE_KEYWORDS)
+
+    def transform(self, series):
+        with warnings.catch_warnings():
+            # Không đoán được định dạng thì pandas phân tích từng giá trị; kết quả vẫn đúng nên không cần cảnh báo
+            warnings.simplefilter("ignore", UserWarning)
+            result = pd.to_datetime(series, errors="coerce", format=self.date_format)
+        return result, series.notna().to_numpy()
+
+
+class ClampNegative(CleaningStep):
+    """Đưa các số ca âm về 0 (hoặc giá trị lower); cột theo tên tiếng Việt hoặc tên gốc trong file CSV."""
+    name = "clamp_negative"
+    label = "Đưa số ca âm về 0"
+
+    def __init__(self, columns=COUNT_COLUMNS, lower=0):
+        self.columns = columns
+        self.lower = lower
+
+    def applies_to(self, col, series):
+        return ((col in self.columns or canonical_name(col) in self.columns)
+                and pd.api.types.is_numeric_dtype(series.dtype))
+
+    def transform(self, series):
+        negative = (series < self.lower).fillna(False).to_numpy(dtype=bool)
+        if not negative.any():
+            return series, negative
+        return series.clip(lower=self.lower), negative
+
+
+class DropEmptyColumns(CleaningStep):
+    name = "drop_unused_columns"
+    label = "Loại bỏ cột không cần thiết (cột toàn NaN)"
+    per_column = False
+
+    def apply_frame(self, df):
+        empty = df.columns[df.isna().all()]
+        if len(empty):
+            df.drop(columns=empty, inplace=True)
+        self.dropped = list(empty)
+        return 0
+
+
+class DropDuplicates(CleaningStep):
+    name = "remove_duplicates"
+    label = "Xóa dữ liệu trùng lặp"
+    per_column = False
+
+    def __init__(self, subset=None):
+        self.subset = subset
+
+    def apply_frame(self, df):
+        before = len(df)
+        df.drop_duplicates(subset=self.subset, inplace=True)
+        return before - len(df)
+
+
+# Thứ tự chạy trong một lượt qua mỗi cột: đổi kiểu ngày trước, rồi chuẩn hóa, đưa về 0, cuối cùng mới điền
+COLUMN_ORDER = [CoerceDates, NormalizeCase, ClampNegative, FillMissing]
+
+
+class CleaningReport:
+    def __init__(self, steps, rows_before, rows_after, columns_dropped, seconds):
+        self.steps = steps
+        self.rows_before = rows_before
+        self.rows_after = rows_after
+        self.columns_dropped = columns_dropped
+        self.seconds = seconds
+
+    def lines(self):
+        lines = [f"{s.label or s.name}: {s.rows_changed} dòng thay đổi ({s.seconds * 1000:.1f} ms)" for s in self.steps]
+        if self.columns_dropped:
+            lines.append("Cột đã bỏ: " + ", ".join(map(str, self.columns_dropped)))
+        lines.append(f"Số dòng: {self.rows_before} -> {self.rows_after} (tổng {self.seconds * 1000:.1f} ms)")
+        return lines
+
+
+class CleaningPipeline:
+    """
+    Bộ làm sạch gồm nhiều bước. Bỏ cột toàn NaN chạy trước (để khỏi xử lý cột sẽ bị bỏ), sau đó
+    mỗi cột được đi qua một lần với mọi bước áp dụng được cho nó và gán lại đúng một lần,
+    cuối cùng mới xóa dòng trùng. DataFrame được sửa tại chỗ, không sao chép cả bảng.
+    Dùng được không cần giao diện: CleaningPipeline([...]).run(df) trả về (df, báo cáo).
+    """
+    def __init__(self, steps):
+        self.steps = list(steps)
+
+    def plan(self, df):
+        """Trả về (bước theo bảng chạy trước, {cột: [bước]}, bước theo bảng chạy sau)."""
+        column_steps = [s for s in self.steps if s.per_column]
+        column_steps.sort(key=lambda s: next((i for i, cls in enumerate(COLUMN_ORDER) if isinstance(s, cls)),
+                                             len(COLUMN_ORDER)))
+        before = [s for s in self.steps if isinstance(s, DropEmptyColumns)]
+        after = [s for s in self.steps if not s.per_column and not isinstance(s, DropEmptyColumns)]
+        columns = {}
+        for col in df.columns:
+            if before and df[col].isna().all():
+                continue
+            series = df[col]
+            steps = []
+            for step in column_steps:
+                # Sau khi đổi kiểu ngày, cột không còn là cột chữ nên các bước sau xét theo kiểu mới
+                if isinstance(step, CoerceDates) and step.applies_to(col, series):
+                    steps.append(step)
+                    series = series.iloc[:0].astype("datetime64[ns]")
+                elif step.applies_to(col, series):
+                    steps.append(step)
+            if steps:
+                columns[col] = steps
+        return before, columns, after
+
+    @staticmethod
+    def transform_columns(df, columns, seconds, changed):
+        """Một lượt qua các cột theo kế hoạch; cộng dồn thời gian và số dòng thay đổi vào seconds/changed."""
+        masks = {}
+        for col, steps in columns.items():
+            original = series = df[col]
+            for step in steps:
+                t = time.perf_counter()
+                series, mask = step.transform(series)
+                if mask.any():
+                    masks[id(step)] = mask if id(step) not in masks else masks[id(step)] | mask
+                seconds[id(step)] = seconds.get(id(step), 0.0) + time.perf_counter() - t
+            if series is not original:
+                df[col] = series
+        for key, mask in masks.items():
+            changed[key] = changed.get(key, 0) + int(mask.sum())
+
+    def run(self, df):
+        start = time.perf_counter()
+        rows_before = len(df)
+        before, columns, after = self.plan(df)
+        seconds = {id(s): 0.0 for s in self.steps}
+        changed = {id(s): 0 for s in self.steps}
+        dropped = []
+
+        for step in before:
+            t = time.perf_counter()
+            step.apply_frame(df)
+            dropped = step.dropped
+            seconds[id(step)] += time.perf_counter() - t
+
+        self.transform_columns(df, columns, seconds, changed)
+
+        for step in after:
+            t = time.perf_counter()
+            changed[id(step)] += step.apply_frame(df)
+            seconds[id(step)] += time.perf_counter() - t
+
+        reports = [StepReport(s.name, s.label, seconds[id(s)], changed[id(s)]) for s in self.steps]
+        return df, CleaningReport(reports, rows_before, len(df), dropped, time.perf_counter() - start)
+
+
+STEP_TYPES = {
+    "drop_unused_columns": DropEmptyColumns,
+    "convert_date": CoerceDates,
+    "standardize_case": NormalizeCase,
+    "clamp_negative": ClampNegative,
+    "autofill_missing": FillMissing,
+    "remove_duplicates": DropDuplicates,
+}
+
+
+def build_pipeline(options):
+    """Tạo pipeline từ các tùy chọn dạng {tên bước: bật/tắt} (như các checkbox của TabCleaning)."""
+    return CleaningPipeline(cls() for name, cls in STEP_TYPES.items() if options.get(name))
+
+
+# Số mã băm tối đa giữ trong RAM khi tìm dòng trùng (8 byte mỗi dòng); vượt quá thì chia phân vùng ra đĩa
+MAX_MEMORY_HASHES = 10_000_000
+
+
+class CleaningCancelled(Exception):
+    pass
+
+
+class SortedHashSet:
+    """
+    Tập mã băm uint64 lưu thành vài mảng đã sắp xếp có kích thước giảm dần. Thêm một khối
+    mới thì gộp với các mảng nhỏ hơn hoặc bằng nó (như bộ đếm nhị phân), nên mỗi mã băm chỉ bị
+    sắp xếp lại O(log n) lần; kiểm tra thuộc tập bằng searchsorted trên từng mảng.
+    """
+    def __init__(self):
+        self.levels = []
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
+
+    def contains(self, hashes):
+        found = np.zeros(len(hashes), dtype=bool)
+        for level in self.levels:
+            pos = np.minimum(np.searchsorted(level, hashes), len(level) - 1)
+            found |= level[pos] == hashes
+        return found
+
+    def add(self, hashes):
+        new = np.unique(hashes)
+        while self.levels and len(self.levels[-1]) <= len(new):
+            new = np.union1d(self.levels.pop(), new)
+        if len(new):
+            self.levels.append(new)
+
+
+def first_occurrences(hashes):
+    """Mặt nạ các dòng xuất hiện lần đầu trong khối (theo mã băm)."""
+    keep = np.zeros(len(hashes), dtype=bool)
+    keep[np.unique(hashes, return_index=True)[1]] = True
+    return keep
+
+
+class StreamingCleaner:
+    """
+    Làm sạch file CSV lớn hơn RAM theo từng khối, dùng cùng các bước với CleaningPipeline:
+    - Lượt 1 đọc cả file để đếm số dòng, tìm cột toàn NaN và tính giá trị điền (trung bình cột).
+    - Nếu số dòng không vượt max_hashes: lượt 2 làm sạch từng khối, loại dòng trùng bằng tập
+      mã băm dòng (pd.util.hash_pandas_object) giữ trong RAM và ghi thẳng ra file kết quả.
+    - Nếu vượt: lượt 2 ghi (mã băm, số thứ tự dòng) ra các phân vùng trên đĩa theo mã băm, mỗi
+      phân vùng được xử lý riêng để lập danh sách dòng cần bỏ; lượt 3 làm sạch và ghi kết quả.
+    Bộ nhớ tối đa phụ thuộc chunksize (và max_hashes), không phụ thuộc kích thước file.
+    Có thể chạy trực tiếp (run) hoặc trên luồng phụ (start, rồi đọc stage/progress()/finished).
+    Không truyền output_path thì chỉ kiểm tra và trả về báo cáo (số dòng trùng, số ô thiếu...).
+    """
+    def __init__(self, input_path, output_path=None, options=None, steps=None, chunksize=100000,
+                 max_hashes=MAX_MEMORY_HASHES, tmp_dir=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.steps = list(steps) if steps is not None else build_pipeline(options or {}).steps
+        for step in self.steps:
+            if isinstance(step, FillMissing) and step.strategy not in ("auto", "mean", "constant"):
+                raise ValueError(f"Làm sạch theo khối không hỗ trợ cách điền '{step.strategy}'")
+        self.chunksize = chunksize
+        self.max_hashes = max_hashes
+        self.tmp_dir = tmp_dir
+        try:
+            self.total_bytes = os.path.getsize(input_path)
+        except OSError:
+            self.total_bytes = 0
+        self.stage = ""
+        self.rows_read = 0
+        self.bytes_read = 0
+        self.finished = False
+        self.cancelled = False
+        self.report = None
+        self.error = None
+        self.duplicates = 0
+        self.spilled = False
+        self._cancel = threading.Event()
+        self._thread = None
+
+    # --- Chạy trên luồng phụ ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run_safe, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run_safe(self):
+        try:
+            self.run()
+        except CleaningCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    def cancel(self):
+        self._cancel.set()
+
+    def progress(self):
+        """Tỉ lệ đã đọc của lượt hiện tại, từ 0 đến 1."""
+        if self.finished:
+            return 1.0
+        if not self.total_bytes:
+            return 0.0
+        return min(self.bytes_read / self.total_bytes, 1.0)
+
+    def _chunks(self, stage):
+        self.stage = stage
+        self.rows_read = 0
+        self.bytes_read = 0
+        with open(self.input_path, "rb") as f:
+            for chunk in pd.read_csv(f, chunksize=self.chunksize):
+                if self._cancel.is_set():
+                    raise CleaningCancelled()
+                self.rows_read += len(chunk)
+                self.bytes_read = f.tell()
+                yield chunk
+
+    # --- Các lượt đọc ---
+    def _scan(self, prepare):
+        """Lượt 1: số dòng, số giá trị khác NaN, tổng/số lượng của cột số và kiểu của từng cột."""
+        rows = 0
+        columns = None
+        non_null, sums, counts, kinds = {}, {}, {}, {}
+        for chunk in self._chunks("Lượt 1: thống kê"):
+            rows += len(chunk)
+            if columns is None:
+                columns = list(chunk.columns)
+            for col in columns:
+                non_null[col] = non_null.get(col, 0) + int(chunk[col].notna().sum())
+            if prepare is not None:
+                prepare.transform_columns(chunk, prepare.plan(chunk)[1], {}, {})
+            for col in columns:
+                series = chunk[col]
+                if series.isna().all():
+                    continue
+                if pd.api.types.is_datetime64_any_dtype(series.dtype):
+                    kind = "datetime"
+                elif pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+                    kind = "numeric"
+                    sums[col] = sums.get(col, 0.0) + float(series.sum())
+                    counts[col] = counts.get(col, 0) + int(series.count())
+                else:
+                    kind = "text"
+                # Cột có khối là số, có khối là chữ thì coi là chữ
+                kinds[col] = kind if kinds.get(col, kind) == kind else "text"
+        return rows, columns or [], non_null, sums, counts, kinds
+
+    def _fill_values(self, fill, kinds, sums, counts):
+        values = {}
+        for col, kind in kinds.items():
+            if fill.strategy == "constant":
+                values[col] = fill.value
+            elif kind == "numeric":
+                if counts.get(col):
+                    values[col] = sums[col] / counts[col]
+            elif fill.strategy == "auto":
+                values[col] = pd.Timestamp("1970-01-01") if kind == "datetime" else "unknown"
+        return values
+
+    @staticmethod
+    def _row_hashes(chunk, kinds):
+        # Chuẩn hóa kiểu trước khi băm để cùng một dòng ở các khối khác nhau cho cùng mã băm
+        # (read_csv có thể đoán một cột là int ở khối này và float ở khối khác)
+        normalized = {}
+        for col in chunk.columns:
+            series = chunk[col]
+            kind = kinds.get(col)
+            if kind == "numeric":
+                normalized[col] = pd.to_numeric(series, errors="coerce").astype(np.float64)
+            elif kind == "datetime":
+                normalized[col] = pd.to_datetime(series, errors="coerce").astype("datetime64[ns]")
+            else:
+                normalized[col] = series.astype(str).where(series.notna(), None).astype(object)
+        return pd.util.hash_pandas_object(pd.DataFrame(normalized), index=False).to_numpy()
+
+    def _clean_chunk(self, chunk, dropped, pipeline, seconds, changed):
+        if dropped:
+            chunk = chunk.drop(columns=dropped)
+        pipeline.transform_columns(chunk, pipeline.plan(chunk)[1], seconds, changed)
+        return chunk
+
+    def _partition(self, chunks, kinds, parts, workdir, dedupe, seconds):
+        """Lượt 2 (khi quá nhiều dòng): ghi (mã băm, số thứ tự dòng) ra từng phân vùng trên đĩa."""
+        files = [(open(os.path.join(workdir, f"part{p}.hash"), "wb"), open(os.path.join(workdir, f"part{p}.row"), "wb"))
+                 for p in range(parts)]
+        try:
+            start = 0
+            for chunk in chunks:
+                t = time.perf_counter()
+                hashes = self._row_hashes(chunk, kinds)
+                rows = np.arange(start, start + len(chunk), dtype=np.int64)
+                part = hashes % np.uint64(parts)
+                for p, (hash_file, row_file) in enumerate(files):
+                    mask = part == p
+                    hashes[mask].tofile(hash_file)
+                    rows[mask].tofile(row_file)
+                start += len(chunk)
+                seconds[id(dedupe)] = seconds.get(id(dedupe), 0.0) + time.perf_counter() - t
+        finally:
+            for hash_file, row_file in files:
+                hash_file.close()
+                row_file.close()
+
+        # Mỗi phân vùng vừa RAM: dòng trùng là dòng có cùng mã băm với một dòng đứng trước nó
+        t = time.perf_counter()
+        drops = []
+        for p in range(parts):
+            if self._cancel.is_set():
+                raise CleaningCancelled()
+            hashes = np.fromfile(os.path.join(workdir, f"part{p}.hash"), dtype=np.uint64)
+            rows = np.fromfile(os.path.join(workdir, f"part{p}.row"), dtype=np.int64)
+            order = np.lexsort((rows, hashes))
+            hashes, rows = hashes[order], rows[order]
+            drops.append(rows[1:][hashes[1:] == hashes[:-1]])
+            os.remove(os.path.join(workdir, f"part{p}.hash"))
+            os.remove(os.path.join(workdir, f"part{p}.row"))
+        drop_path = os.path.join(workdir, "drop.npy")
+        np.save(drop_path, np.sort(np.concatenate(drops)) if drops else np.empty(0, dtype=np.int64))
+        seconds[id(dedupe)] = seconds.get(id(dedupe), 0.0) + time.perf_counter() - t
+        return np.load(drop_path, mmap_mode="r")
+
+    def _write(self, chunks, out, keep_mask):
+        header = True
+        kept = 0
+        start = 0
+        for chunk in chunks:
+            keep = keep_mask(chunk, start)
+            start += len(chunk)
+            if keep is not None:
+                chunk = chunk[keep]
+            kept += len(chunk)
+            if out is not None:
+                chunk.to_csv(out, index=False, header=header)
+                header = False
+        return kept
+
+    def run(self):
+        start_time = time.perf_counter()
+        column_steps = [s for s in self.steps if s.per_column]
+        fill = next((s for s in column_steps if isinstance(s, FillMissing)), None)
+        drop_empty = next((s for s in self.steps if isinstance(s, DropEmptyColumns)), None)
+        dedupe = next((s for s in self.steps if isinstance(s, DropDuplicates)), None)
+        if dedupe is not None and dedupe.subset is not None:
+            raise ValueError("Làm sạch theo khối chỉ hỗ trợ xóa dòng trùng trên toàn bộ cột")
+        seconds = {id(s): 0.0 for s in self.steps}
+        changed = {id(s): 0 for s in self.steps}
+
+        prepare = CleaningPipeline([s for s in column_steps if s is not fill])
+        rows, columns, non_null, sums, counts, kinds = self._scan(prepare)
+        dropped = [col for col in columns if non_null.get(col, 0) == 0] if drop_empty is not None else []
+        if drop_empty is not None:
+            drop_empty.dropped = dropped
+        original_fill = fill
+        if fill is not None:
+            # Bước điền dùng giá trị tính trên toàn file thay vì trên từng khối
+            fill = FillMissing(fill.strategy, fill.value, self._fill_values(fill, kinds, sums, counts))
+        pipeline = CleaningPipeline([fill if s is original_fill else s for s in column_steps])
+
+        def cleaned(stage, seconds, changed):
+            for chunk in self._chunks(stage):
+                yield self._clean_chunk(chunk, dropped, pipeline, seconds, changed)
+
+        workdir = tempfile.mkdtemp(prefix="covid_clean_", dir=self.tmp_dir)
+        tmp_out = self.output_path + ".tmp" if self.output_path else None
+        out = open(tmp_out, "w", encoding="utf-8", newline="") if tmp_out else None
+        try:
+            if dedupe is None:
+                keep_mask = lambda chunk, start: None
+                chunks = cleaned("Lượt 2: làm sạch và ghi file", seconds, changed)
+            elif rows <= self.max_hashes:
+                seen = SortedHashSet()
+
+                def keep_mask(chunk, start):
+                    t = time.perf_counter()
+                    hashes = self._row_hashes(chunk, kinds)
+                    keep = first_occurrences(hashes) & ~seen.contains(hashes)
+                    seen.add(hashes[keep])
+                    seconds[id(dedupe)] += time.perf_counter() - t
+                    return keep
+                chunks = cleaned("Lượt 2: làm sạch, loại dòng trùng và ghi file", seconds, changed)
+            else:
+                self.spilled = True
+                parts = -(-rows // self.max_hashes) + 1
+                drop = self._partition(cleaned("Lượt 2: băm dòng ra đĩa", seconds, changed),
+                                       kinds, parts, workdir, dedupe, seconds)
+                self.duplicates = len(drop)
+
+                def keep_mask(chunk, start):
+                    keep = np.ones(len(chunk), dtype=bool)
+                    lo, hi = np.searchsorted(drop, [start, start + len(chunk)])
+                    keep[np.asarray(drop[lo:hi]) - start] = False
+                    return keep
+                # Lượt 3 làm sạch lại từng khối; thống kê các bước đã được tính ở lượt 2
+                chunks = cleaned("Lượt 3: làm sạch và ghi file", {}, {}) if out is not None else iter(())
+            kept = self._write(chunks, out, keep_mask)
+            if self.spilled:
+                kept = rows - self.duplicates
+            elif dedupe is not None:
+                self.duplicates = rows - kept
+            if dedupe is not None:
+                changed[id(dedupe)] = self.duplicates
+            if out is not None:
+                out.close()
+                out = None
+                os.replace(tmp_out, self.output_path)
+        finally:
+            if out is not None:
+                out.close()
+            if tmp_out and os.path.exists(tmp_out):
+                os.remove(tmp_out)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if original_fill is not None:
+            # Báo cáo theo bước gốc mà người gọi truyền vào
+            seconds[id(original_fill)] = seconds.pop(id(fill), 0.0)
+            changed[id(original_fill)] = changed.pop(id(fill), 0)
+        reports = [StepReport(s.name, s.label, seconds.get(id(s), 0.0), changed.get(id(s), 0)) for s in self.steps]
+        self.report = CleaningReport(reports, rows, kept, dropped, time.perf_counter() - start_time)
+        return self.report
@@ -1,19 +1,452 @@
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+
+import numpy as np
 import pandas as pd
 
+from covid_stats.journal import ChangeJournal, snapshot_key
+from covid_stats.models import CovidStats
+from covid_stats.schema import apply_schema
+from covid_stats.tracing import TRACER
+
+CACHE_DIR_NAME = ".covid_cache"
+# Định dạng 2: cache lưu dữ liệu đã đổi kiểu theo schema
+# Định dạng 3: cột lẫn kiểu không lưu trong cache mà đọc lại từ CSV
+CACHE_FORMAT = 3
+
+# Gộp nhật ký vào snapshot khi nhật ký lớn hơn tỉ lệ này so với file CSV (và tối thiểu JOURNAL_MIN_BYTES)
+JOURNAL_COMPACT_RATIO = 0.25
+JOURNAL_MIN_BYTES = 1 << 20
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "writes"])
+
+
+def _all_strings(values):
+    return pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty")
+
+
+class ColumnarCache:
+    """
+    Bộ nhớ đệm dạng cột đặt cạnh file CSV: mỗi cột là một file .npy, kèm schema.json
+    mô tả kiểu dữ liệu. Khóa cache gồm đường dẫn, kích thước và mtime của file nguồn,
+    nên chỉ cần file CSV thay đổi là cache tự bị bỏ qua.
+    """
+    def __init__(self, root=None):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.writes)
+
+    def reset_stats(self):
+        self.hits = self.misses = self.writes = 0
+
+    def cache_path(self, filepath):
+        filepath = os.path.abspath(filepath)
+        directory = self.root or os.path.join(os.path.dirname(filepath), CACHE_DIR_NAME)
+        return os.path.join(directory, os.path.basename(filepath))
+
+    def _key(self, filepath):
+        st = os.stat(filepath)
+        return {
+            "path": os.path.abspath(filepath),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "format": CACHE_FORMAT,
+            "pandas": pd.__version__,
+        }
+
+    def load(self, filepath):
+        """Trả về DataFrame từ cache, hoặc None nếu cache không có/đã cũ."""
+        path = self.cache_path(filepath)
+        try:
+            with open(os.path.join(path, "schema.json"), encoding="utf-8") as f:
+                schema = json.load(f)
+            if schema["key"] != self._key(filepath):
+                self.misses += 1
+                return None
+            # Cột không lưu được trong cache (chữ lẫn số, ngày...) được đọc lại từ file CSV
+            from_csv = [col["name"] for col in schema["columns"] if col["kind"] == "csv"]
+            if from_csv:
+                from_csv = apply_schema(pd.read_csv(filepath, usecols=from_csv))
+            data = {}
+            for i, col in enumerate(schema["columns"]):
+                if col["kind"] == "csv":
+                    data[col["name"]] = from_csv[col["name"]]
+                else:
+                    data[col["name"]] = self._read_column(path, i, col)
+            df = pd.DataFrame(data, columns=[col["name"] for col in schema["columns"]])
+        except (OSError, ValueError, KeyError, TypeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return df
+
+    def store(self, filepath, df):
+        """Ghi DataFrame vào cache; lỗi khi ghi cache không làm hỏng việc đọc dữ liệu."""
+        path = self.cache_path(filepath)
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(path))
+            columns = [self._write_column(tmp, i, name, df[name]) for i, name in enumerate(df.columns)]
+            with open(os.path.join(tmp, "schema.json"), "w", encoding="utf-8") as f:
+                json.dump({"key": self._key(filepath), "columns": columns}, f, ensure_ascii=False)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.rename(tmp, path)
+            tmp = None
+            self.writes += 1
+        except Exception as e:
+            print(f"Lỗi khi ghi cache: {e}")
+        finally:
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    def invalidate(self, filepath):
+        shutil.rmtree(self.cache_path(filepath), ignore_errors=True)
+
+    # Mã hóa từng cột theo loại: mảng NumPy thuần, categorical, nullable (values + mask)
+    # hoặc văn bản (mã số + danh sách giá trị khác nhau). Danh sách giá trị được lưu dạng chuỗi
+    # trong schema.json, nên cột có giá trị không phải chuỗi (lẫn số, ngày...) không được lưu
+    # (kind "csv") mà được đọc lại từ file CSV khi nạp cache.
+    @staticmethod
+    def _write_column(path, i, name, series):
+        dtype = series.dtype
+        col = {"name": name, "dtype": str(dtype)}
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = dtype.categories
+            if categories.dtype.kind not in "biufM" and not _all_strings(categories):
+                col["kind"] = "csv"
+                return col
+            col["kind"] = "category"
+            col["ordered"] = bool(dtype.ordered)
+            np.save(os.path.join(path, f"{i}.npy"), series.cat.codes.to_numpy())
+            if categories.dtype.kind in "biufM":
+                np.save(os.path.join(path, f"{i}.cat.npy"), categories.to_numpy())
+            else:
+                col["categories"] = list(categories)
+        elif isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+            col["kind"] = "numpy"
+            np.save(os.path.join(path, f"{i}.npy"), series.to_numpy())
+        elif isinstance(series.array, pd.api.extensions.ExtensionArray) and hasattr(series.array, "_mask"):
+            col["kind"] = "masked"
+            np.save(os.path.join(path, f"{i}.npy"), series.array._data)
+            np.save(os.path.join(path, f"{i}.mask.npy"), series.array._mask)
+        else:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            if not _all_strings(uniques):
+                col["kind"] = "csv"
+                return col
+            col["kind"] = "text"
+            np.save(os.path.join(path, f"{i}.npy"), codes.astype(np.int32))
+            col["uniques"] = list(uniques)
+        return col
+
+    @staticmethod
+    def _read_column(path, i, col):
+        values = np.load(os.path.join(path, f"{i}.npy"))
+        kind = col["kind"]
+        if kind == "numpy":
+            return values
+        if kind == "masked":
+            mask = np.load(os.path.join(path, f"{i}.mask.npy"))
+            array_type = pd.api.types.pandas_dtype(col["dtype"]).construct_array_type()
+            return array_type(values, mask)
+        if kind == "category":
+            if "categories" in col:
+                categories = col["categories"]
+            else:
+                categories = np.load(os.path.join(path, f"{i}.cat.npy"))
+            return pd.Categorical.from_codes(values, categories, ordered=col["ordered"])
+        if kind == "text":
+            return pd.Categorical.from_codes(values, col["uniques"]).astype(col["dtype"])
+        raise ValueError(f"Không hỗ trợ kiểu cột: {kind}")
+
+
+DEFAULT_CACHE = ColumnarCache()
+
+
 class DataLoader:
-    def __init__(self, filepath):
+    """
+    Đọc/ghi file CSV; dữ liệu đọc vào được đổi sang kiểu gọn theo covid_stats.schema.
+    Thay đổi trên CovidStats được ghi vào nhật ký <file>.journal ngay khi xảy ra
+    (xem attach); khi đọc, nhật ký được áp dụng lại lên snapshot CSV. File CSV chỉ được ghi lại
+    toàn bộ khi gộp nhật ký (compact), bằng file tạm rồi đổi tên nguyên tử.
+    """
+    def __init__(self, filepath, use_cache=True, cache=None, column_map=None):
         self.filepath = filepath
+        self.use_cache = use_cache
+        self.cache = cache or DEFAULT_CACHE
+        self.column_map = column_map
+        self.journal = None
+        self._model = None
+
+    def journal_path(self):
+        return self.filepath + ".journal"
+
+    def row_ids_path(self):
+        return self.filepath + ".rowids.npy"
 
     def load_data(self):
         try:
-            df = pd.read_csv(self.filepath)
-            return df
+            df = self.cache.load(self.filepath) if self.use_cache else None
+            if df is None:
+                df = apply_schema(pd.read_csv(self.filepath))
+                if self.use_cache:
+                    self.cache.store(self.filepath, df)
+            return self.replay_journal(df)
         except Exception as e:
             print(f"Lỗi khi đọc dữ liệu: {e}")
             return pd.DataFrame()
 
+    def load_chunks(self, chunksize=100000, on_chunk=None, cancel_event=None):
+        """
+        Đọc dữ liệu theo từng khối, gọi on_chunk(khối, số dòng đã đọc, số byte đã đọc) sau mỗi khối.
+        Trả về toàn bộ DataFrame, hoặc None nếu cancel_event được bật giữa chừng.
+        """
+        if self.use_cache:
+            df = self.cache.load(self.filepath)
+            if df is not None:
+                if on_chunk:
+                    on_chunk(df, len(df), os.path.getsize(self.filepath))
+                return self.replay_journal(df)
+        chunks = []
+        rows = 0
+        with open(self.filepath, "rb") as f:
+            for chunk in pd.read_csv(f, chunksize=chunksize):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                chunks.append(chunk)
+                rows += len(chunk)
+                if on_chunk:
+                    on_chunk(chunk, rows, f.tell())
+        # Đổi kiểu sau khi ghép để mọi khối dùng chung một bộ giá trị categorical
+        df = apply_schema(pd.concat(chunks, ignore_index=True) if chunks else pd.read_csv(self.filepath))
+        if self.use_cache:
+            self.cache.store(self.filepath, df)
+        return self.replay_journal(df)
+
+    def _valid_journal(self):
+        # Header của nhật ký phải khớp với snapshot hiện tại; nếu file CSV đã bị ghi bởi nơi khác thì bỏ qua
+        header, entries = ChangeJournal(self.journal_path()).read()
+        if header is None or header.get("snapshot") != snapshot_key(self.filepath):
+            return None, []
+        return header, entries
+
+    def has_pending_changes(self):
+        """True nếu nhật ký còn thay đổi chưa gộp vào file CSV."""
+        return bool(self._valid_journal()[1])
+
+    def replay_journal(self, df):
+        """Áp dụng nhật ký thay đổi lên snapshot vừa đọc; index của kết quả là mã dòng."""
+        if self.column_map:
+            df = df.rename(columns=self.column_map)
+        header, entries = self._valid_journal()
+        if header is None:
+            return df
+        entries = self._translate_entries(header, entries, df.columns)
+        if entries is None:
+            print("Lỗi khi đọc nhật ký: tên cột không khớp với nhật ký, bỏ qua nhật ký.")
+            return df
+        if header.get("row_ids"):
+            ids = np.load(self.row_ids_path())
+            if len(ids) != len(df):
+                print("Lỗi khi đọc nhật ký: mã dòng không khớp với snapshot, bỏ qua nhật ký.")
+                return df
+            df.index = pd.Index(ids, dtype=np.int64)
+        # Không cần lịch sử hoàn tác khi chỉ áp dụng lại nhật ký
+        model = CovidStats(df, next_id=header.get("next_id"), undo_budget=0)
+        try:
+            ChangeJournal.apply(model, entries)
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"Lỗi khi áp dụng nhật ký: {e}")
+        data = model.data
+        data.attrs["next_row_id"] = model.next_id
+        return data
+
+    @staticmethod
+    def _translate_entries(header, entries, columns):
+        """
+        Đổi tên cột trong các thao tác của nhật ký sang tên cột của DataFrame đang đọc: nhật ký ghi
+        theo tên cột của model (sau column_map của DataLoader đã ghi nó), còn DataLoader đang đọc có
+        thể dùng column_map khác. Header lưu tên cột theo thứ tự cột của snapshot nên ghép được theo
+        vị trí. Trả về None nếu không ghép được.
+        """
+        written = header.get("columns")
+        if written is None:
+            # Nhật ký cũ không lưu tên cột: chỉ áp dụng khi mọi cột được nhắc tới đều có trong dữ liệu
+            used = {col for entry in entries for col in entry.get("changes", {})}
+            used.update(col for entry in entries for row in entry.get("rows", []) for col in row)
+            return entries if used <= set(map(str, columns)) else None
+        if len(written) != len(columns):
+            return None
+        names = {old: new for old, new in zip(written, columns) if old != new}
+        if not names:
+            return entries
+        translated = []
+        for entry in entries:
+            entry = dict(entry)
+            if "changes" in entry:
+                entry["changes"] = {names.get(col, col): values for col, values in entry["changes"].items()}
+            if "rows" in entry:
+                entry["rows"] = [{names.get(col, col): value for col, value in row.items()} for row in entry["rows"]]
+            translated.append(entry)
+        return translated
+
+    def attach(self, model):
+        """Ghi mọi thay đổi của model vào nhật ký ngay khi chúng xảy ra."""
+        self.detach()
+        self.journal = ChangeJournal(self.journal_path())
+        header, _ = self._valid_journal()
+        if header is None:
+            ids = model.all_ids()
+            self._write_row_ids(ids)
+            self.journal.reset(self._journal_header(model, ids))
+        self._model = model
+        model.add_listener(self.journal.record)
+
+    def detach(self):
+        if self.journal is not None:
+            self._model.remove_listener(self.journal.record)
+            self.journal.close()
+            self.journal = None
+            self._model = None
+
+    def _journal_header(self, model, ids):
+        contiguous = np.array_equal(ids, np.arange(len(ids)))
+        return {"op": "snapshot", "snapshot": snapshot_key(self.filepath), "next_id": model.next_id,
+                "row_ids": not contiguous, "columns": [str(col) for col in model.columns]}
+
+    def _write_row_ids(self, ids):
+        path = self.row_ids_path()
+        if np.array_equal(ids, np.arange(len(ids))):
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp = path + ".tmp.npy"
+        np.save(tmp, np.asarray(ids, dtype=np.int64))
+        os.replace(tmp, path)
+
+    def commit(self, model):
+        """
+        Lưu thay đổi: đồng bộ nhật ký xuống đĩa (chi phí tỉ lệ với số thay đổi), chỉ gộp thành
+        snapshot mới khi nhật ký đã lớn. Trả về True nếu đã gộp; lỗi ghi file được ném ra (OSError).
+        """
+        if self.journal is None:
+            self.attach(model)
+        self.journal.sync()
+        limit = max(JOURNAL_MIN_BYTES, JOURNAL_COMPACT_RATIO * os.path.getsize(self.filepath))
+        if self.journal.size() > limit:
+            self.compact(model)
+            return True
+        return False
+
+    def compact(self, model):
+        """
+        Ghi snapshot mới (file tạm + đổi tên nguyên tử) rồi làm rỗng nhật ký. Nếu ghi lỗi thì lỗi
+        được ném ra trước khi động tới file mã dòng và nhật ký, nên thay đổi vẫn còn trong nhật ký.
+        """
+        df = model.data
+        self.save_data(df)
+        ids = df.index.to_numpy(dtype=np.int64)
+        self._write_row_ids(ids)
+        if self.journal is not None:
+            self.journal.reset(self._journal_header(model, ids))
+
     def save_data(self, df):
+        """Ghi df vào file tạm rồi đổi tên; lỗi ghi (OSError...) được ném ra, file cũ giữ nguyên."""
+        directory = os.path.dirname(os.path.abspath(self.filepath))
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".csv", dir=directory)
         try:
-            df.to_csv(self.filepath, index=False)
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                df.to_csv(f, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.filepath)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def cache_info(self):
+        """Số lần đọc trúng cache, trượt cache và số lần ghi cache."""
+        return self.cache.info()
+
+
+class BackgroundLoad:
+    """
+    Chạy DataLoader.load_chunks trên một luồng phụ. Luồng giao diện gọi poll() định kỳ
+    (qua root.after) để lấy các khối mới và cập nhật tiến độ; cancel() để dừng việc đọc.
+    Nếu có span (thao tác đang đo, xem covid_stats.tracing) thì thời gian đọc là giai đoạn "load" của nó.
+    """
+    def __init__(self, loader, chunksize=100000, span=None):
+        self.loader = loader
+        self.chunksize = chunksize
+        self.span = span
+        try:
+            self.total_bytes = os.path.getsize(loader.filepath)
+        except OSError:
+            self.total_bytes = 0
+        self.rows_read = 0
+        self.bytes_read = 0
+        self.finished = False
+        self.cancelled = False
+        self.result = None
+        self.error = None
+        self._queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def progress(self):
+        """Tỉ lệ đã đọc, từ 0 đến 1."""
+        if self.finished:
+            return 1.0
+        if not self.total_bytes:
+            return 0.0
+        return min(self.bytes_read / self.total_bytes, 1.0)
+
+    def _on_chunk(self, chunk, rows, nbytes):
+        self._queue.put(("chunk", chunk, rows, nbytes))
+
+    def _run(self):
+        try:
+            with TRACER.stage("load", parent=self.span):
+                df = self.loader.load_chunks(self.chunksize, self._on_chunk, self._cancel)
+            self._queue.put(("done", df))
         except Exception as e:
-            print(f"Lỗi khi ghi dữ liệu: {e}")
\ No newline at end of file
+            self._queue.put(("error", e))
+
+    def poll(self):
+        """Gọi từ luồng giao diện: trả về danh sách các khối mới đọc được kể từ lần poll trước."""
+        chunks = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] == "chunk":
+                _, chunk, self.rows_read, self.bytes_read = item
+                chunks.append(chunk)
+            elif item[0] == "done":
+                self.result = item[1]
+                self.cancelled = item[1] is None
+                self.finished = True
+            else:
+                self.error = item[1]
+                self.finished = True
+        return chunks
@@ -0,0 +1,208 @@
+import gzip
+import io
+import os
+import threading
+
+import numpy as np
+
+from covid_stats.tracing import TRACER
+
+# Số dòng đọc và ghi mỗi lần (bộ nhớ dùng khi xuất tỉ lệ với số này, không phụ thuộc cỡ dữ liệu)
+EXPORT_CHUNK_ROWS = 50_000
+
+# Định dạng theo phần mở rộng của file (so khớp đuôi dài nhất trước)
+FORMATS = {
+    ".csv": "csv",
+    ".csv.gz": "csv.gz",
+    ".csv.zst": "csv.zst",
+    ".jsonl": "jsonl",
+    ".parquet": "parquet",
+}
+# Lựa chọn cho hộp thoại lưu file
+EXPORT_FILETYPES = [
+    ("CSV", "*.csv"),
+    ("CSV nén gzip", "*.csv.gz"),
+    ("CSV nén zstd", "*.csv.zst"),
+    ("JSON Lines", "*.jsonl"),
+    ("Parquet", "*.parquet"),
+]
+
+
+def export_format(path):
+    """Định dạng xuất theo tên file; đuôi không nhận ra thì ghi CSV."""
+    name = path.lower()
+    for suffix in sorted(FORMATS, key=len, reverse=True):
+        if name.endswith(suffix):
+            return FORMATS[suffix]
+    return "csv"
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class CsvWriter:
+    """Ghi CSV theo khối (header chỉ ở khối đầu); compression là None, "gzip" hoặc "zstd"."""
+    def __init__(self, path, compression=None):
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("Cần cài thư viện zstandard để xuất CSV nén zstd (pip install zstandard)")
+            self._raw = open(path, "wb")
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw)
+            self._file = io.TextIOWrapper(self._stream, encoding="utf-8", newline="")
+        elif compression == "gzip":
+            self._raw = None
+            self._file = gzip.open(path, "wt", encoding="utf-8", newline="")
+        else:
+            self._raw = None
+            self._file = open(path, "w", encoding="utf-8", newline="")
+        self._header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self._file, index=False, header=self._header)
+        self._header = False
+
+    def close(self):
+        self._file.close()
+        if self._raw is not None and not self._raw.closed:
+            self._raw.close()
+
+
+class JsonLinesWriter:
+    """Mỗi bản ghi một dòng JSON; ngày ghi dạng ISO 8601."""
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8", newline="\n")
+
+    def write(self, chunk):
+        if len(chunk):
+            text = chunk.to_json(orient="records", lines=True, date_format="iso", force_ascii=False)
+            self._file.write(text if text.endswith("\n") else text + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Mỗi khối là một row group; lược đồ lấy theo khối đầu tiên (cần pyarrow)."""
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Cần cài thư viện pyarrow để xuất Parquet (pip install pyarrow)")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._path = path
+        self._writer = None
+        self._schema = None
+
+    def write(self, chunk):
+        table = self._pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = self._pq.ParquetWriter(self._path, self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_writer(path, fmt):
+    if fmt == "csv.gz":
+        return CsvWriter(path, "gzip")
+    if fmt == "csv.zst":
+        return CsvWriter(path, "zstd")
+    if fmt == "jsonl":
+        return JsonLinesWriter(path)
+    if fmt == "parquet":
+        return ParquetWriter(path)
+    return CsvWriter(path)
+
+
+class StreamingExporter:
+    """
+    Xuất các bản ghi theo đúng thứ tự ids (thứ tự của view đã lọc/sắp xếp) ra file, theo từng khối
+    trên luồng phụ. Mỗi khối chỉ lấy các dòng của nó qua get_rows(ids của khối), nên không cần dựng
+    trước một bản sao của cả DataFrame theo thứ tự view. Kết quả được ghi vào file tạm rồi đổi tên,
+    hủy giữa chừng thì file đích không bị động tới.
+    Chạy trực tiếp (run) hoặc trên luồng phụ (start, rồi đọc rows_written/progress()/finished).
+    Trong lúc xuất, dữ liệu nguồn không được sửa (giao diện chặn thêm/sửa/xóa); việc gộp bộ đệm hay
+    dòng đã xóa do sắp xếp/tìm kiếm gây ra thì an toàn vì get_rows của CovidStats chạy dưới khóa.
+    """
+    def __init__(self, get_rows, ids, output_path, fmt=None, chunksize=EXPORT_CHUNK_ROWS, span=None):
+        self.get_rows = get_rows
+        self.ids = np.asarray(ids)
+        self.output_path = output_path
+        self.format = fmt or export_format(output_path)
+        self.chunksize = chunksize
+        self.span = span
+        self.total_rows = len(self.ids)
+        self.rows_written = 0
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = None
+        if self.format not in FORMATS.values():
+            raise ValueError(f"Định dạng xuất không hỗ trợ: {self.format}")
+
+    @classmethod
+    def from_model(cls, model, output_path, **kwargs):
+        """Xuất view hiện tại của CovidStats (hoặc toàn bộ dữ liệu nếu không có view)."""
+        return cls(model.get_rows, model.row_ids(), output_path, **kwargs)
+
+    @classmethod
+    def from_frame(cls, df, output_path, **kwargs):
+        """Xuất một DataFrame theo thứ tự dòng của nó."""
+        return cls(lambda positions: df.iloc[positions], np.arange(len(df)), output_path, **kwargs)
+
+    # --- Chạy trên luồng phụ ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run_safe, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run_safe(self):
+        try:
+            self.run()
+        except ExportCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    def cancel(self):
+        self._cancel.set()
+
+    def progress(self):
+        """Tỉ lệ số dòng đã ghi, từ 0 đến 1."""
+        if self.finished or not self.total_rows:
+            return 1.0 if self.finished else 0.0
+        return self.rows_written / self.total_rows
+
+    def run(self):
+        """Ghi toàn bộ ra output_path; trả về số dòng đã ghi."""
+        tmp = self.output_path + ".tmp"
+        writer = None
+        try:
+            with TRACER.stage("write", parent=self.span, format=self.format):
+                writer = open_writer(tmp, self.format)
+                for start in range(0, max(self.total_rows, 1), self.chunksize):
+                    if self._cancel.is_set():
+                        raise ExportCancelled()
+                    chunk = self.get_rows(self.ids[start:start + self.chunksize])
+                    writer.write(chunk)
+                    self.rows_written += len(chunk)
+                writer.close()
+                writer = None
+            os.replace(tmp, self.output_path)
+            return self.rows_written
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
@@ -0,0 +1,247 @@
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Số mặt nạ của điều kiện lá giữ lại (bỏ mặt nạ dùng lâu nhất trước)
+MAX_CACHED_MASKS = 64
+RANGE_SEPARATOR = ".."
+
+# Các kiểu điều kiện trên giao diện
+MODES = ["chứa", "bằng", "bắt đầu bằng", "trong khoảng"]
+
+
+def date_period(text):
+    """
+    Khoảng thời gian (đầu, cuối) mà text chỉ tới: cả năm ("2020"), cả tháng ("2020-03") hoặc
+    cả ngày ("2020-03-01"); None nếu text không phải ngày.
+    """
+    try:
+        period = pd.Period(str(text).strip())
+    except (ValueError, TypeError):
+        return None
+    return period.start_time, period.end_time
+
+
+class Predicate:
+    """Điều kiện lọc; ghép bằng & (VÀ), | (HOẶC) và ~ (KHÔNG)."""
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def leaves(self):
+        return [self]
+
+
+class Leaf(Predicate):
+    """Điều kiện trên một cột, tra bằng chỉ mục tìm kiếm của CovidStats (không duyệt lại cột)."""
+    column = None
+
+    @property
+    def key(self):
+        return (type(self).__name__, self.column) + self._params()
+
+    def _params(self):
+        return ()
+
+    def lookup(self, index):
+        raise NotImplementedError
+
+
+class Contains(Leaf):
+    def __init__(self, column, text):
+        self.column = column
+        self.text = str(text)
+
+    def _params(self):
+        return (self.text.lower(),)
+
+    def lookup(self, index):
+        if self.column in index.text:
+            return index.contains(self.column, self.text)
+        if index.is_datetime(self.column):
+            # Cột ngày: "chứa" một năm, tháng hoặc ngày nghĩa là mọi thời điểm trong khoảng đó
+            period = date_period(self.text)
+            if period is None:
+                raise ValueError(f"'{self.text}' không phải năm, tháng hoặc ngày (vd. 2020, 2020-03, 2020-03-01); "
+                                 f"để lọc theo khoảng ngày hãy dùng kiểu 'trong khoảng'")
+            return index.range(self.column, *period)
+        # Cột số: "chứa" nghĩa là bằng đúng giá trị
+        return index.equals(self.column, self.text) if index.is_numeric(self.column) else None
+
+    def __str__(self):
+        return f"{self.column} chứa '{self.text}'"
+
+
+class Prefix(Contains):
+    def lookup(self, index):
+        if self.column not in index.text:
+            raise ValueError(f"Cột '{self.column}' không phải cột văn bản")
+        return index.prefix(self.column, self.text)
+
+    def __str__(self):
+        return f"{self.column} bắt đầu bằng '{self.text}'"
+
+
+class Equals(Leaf):
+    def __init__(self, column, value):
+        self.column = column
+        self.value = value
+
+    def _params(self):
+        return (str(self.value).lower(),)
+
+    def lookup(self, index):
+        if self.column in index.text or index.is_numeric(self.column):
+            return index.equals(self.column, self.value)
+        return None
+
+    def __str__(self):
+        return f"{self.column} = '{self.value}'"
+
+
+class Range(Leaf):
+    """Giá trị cột số hoặc ngày trong đoạn [low, high]; None ở một đầu là không giới hạn."""
+    def __init__(self, column, low=None, high=None):
+        self.column = column
+        self.low = low
+        self.high = high
+
+    def _params(self):
+        return (self.low, self.high)
+
+    def lookup(self, index):
+        if not index.is_numeric(self.column):
+            raise ValueError(f"Cột '{self.column}' không phải cột số hoặc ngày")
+        high = self.high
+        if high is not None and index.is_datetime(self.column):
+            # Cận trên là tháng/năm thì lấy hết tháng/năm đó ("..2020-03" gồm cả 31/3)
+            period = date_period(high)
+            high = period[1] if period is not None else high
+        return index.range(self.column, self.low, high)
+
+    def __str__(self):
+        low = "" if self.low is None else self.low
+        high = "" if self.high is None else self.high
+        return f"{self.column} trong [{low}, {high}]"
+
+
+class And(Predicate):
+    joiner = " VÀ "
+
+    def __init__(self, *parts):
+        # Gộp các And lồng nhau thành một danh sách phẳng
+        self.parts = []
+        for part in parts:
+            self.parts.extend(part.parts if type(part) is type(self) else [part])
+
+    def leaves(self):
+        return [leaf for part in self.parts for leaf in part.leaves()]
+
+    def __str__(self):
+        return self.joiner.join(f"({p})" if isinstance(p, (And, Or)) else str(p) for p in self.parts)
+
+
+class Or(And):
+    joiner = " HOẶC "
+
+
+class Not(Predicate):
+    def __init__(self, part):
+        self.part = part
+
+    def leaves(self):
+        return self.part.leaves()
+
+    def __str__(self):
+        return f"KHÔNG ({self.part})"
+
+
+def parse_condition(column, text, mode="chứa"):
+    """
+    Điều kiện lá từ ô nhập trên giao diện. Với "trong khoảng", text có dạng "thấp..cao"
+    (bỏ trống một đầu để không giới hạn), vd. "1000..5000" hoặc "2020-03-01..2020-03-31".
+    """
+    text = text.strip()
+    if mode == "trong khoảng":
+        if RANGE_SEPARATOR not in text:
+            raise ValueError("Khoảng phải có dạng thấp..cao (vd. 100..500)")
+        low, high = (part.strip() or None for part in text.split(RANGE_SEPARATOR, 1))
+        return Range(column, low, high)
+    if mode == "bằng":
+        return Equals(column, text)
+    if mode == "bắt đầu bằng":
+        return Prefix(column, text)
+    return Contains(column, text)
+
+
+class FilterEngine:
+    """
+    Tính điều kiện lọc ghép thành mặt nạ boolean trên model.all_ids(). Mặt nạ của mỗi điều kiện lá
+    được giữ lại, gắn với phiên bản của cột (tăng khi cột bị sửa) và phiên bản tập dòng (tăng khi
+    thêm/xóa), nên lọc thêm hay đổi cách ghép chỉ cần các phép &, |, ~ trên mặt nạ đã có.
+    """
+    def __init__(self, model, max_masks=MAX_CACHED_MASKS):
+        self.model = model
+        self.max_masks = max_masks
+        self._masks = OrderedDict()
+        self._column_versions = defaultdict(int)
+        self._rows_version = 0
+        self.hits = 0
+        self.misses = 0
+        model.add_listener(self.on_mutation)
+
+    def detach(self):
+        self.model.remove_listener(self.on_mutation)
+
+    def on_mutation(self, mutation):
+        if mutation.kind == "update":
+            for col in mutation.columns:
+                self._column_versions[col] += 1
+        else:
+            self._rows_version += 1
+
+    def _versions(self, column):
+        return self._column_versions[column], self._rows_version
+
+    def leaf_mask(self, leaf):
+        key = leaf.key
+        versions = self._versions(leaf.column)
+        cached = self._masks.get(key)
+        if cached is not None and cached[0] == versions:
+            self._masks.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        all_ids = self.model.all_ids()
+        mask = np.zeros(len(all_ids), dtype=bool)
+        ids = leaf.lookup(self.model.index) if leaf.column in self.model.columns else None
+        if ids is not None and len(ids):
+            # all_ids tăng dần nên vị trí của mã dòng tìm bằng searchsorted
+            positions = np.minimum(np.searchsorted(all_ids, ids), len(all_ids) - 1)
+            mask[positions[all_ids[positions] == ids]] = True
+        self._masks[key] = (versions, mask)
+        if len(self._masks) > self.max_masks:
+            self._masks.popitem(last=False)
+        return mask
+
+    def mask(self, predicate):
+        if isinstance(predicate, Leaf):
+            return self.leaf_mask(predicate)
+        if isinstance(predicate, Not):
+            return ~self.mask(predicate.part)
+        masks = [self.mask(part) for part in predicate.parts]
+        combine = np.logical_or if isinstance(predicate, Or) else np.logical_and
+        return combine.reduce(masks) if len(masks) > 1 else masks[0]
+
+    def ids(self, predicate):
+        """Mã dòng (theo thứ tự lưu) của các bản ghi thỏa điều kiện."""
+        return self.model.all_ids()[self.mask(predicate)]
+
+    def clear(self):
+        self._masks.clear()
@@ -0,0 +1,112 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def _json_default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    return str(value)
+
+
+def snapshot_key(filepath):
+    st = os.stat(filepath)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class ChangeJournal:
+    """
+    Nhật ký thay đổi chỉ ghi thêm (JSON Lines) đặt cạnh file dữ liệu. Dòng đầu là header gắn
+    với phiên bản snapshot (kích thước, mtime của file CSV); các dòng sau là từng thao tác
+    insert/update/delete theo mã dòng, ghi ngay khi CovidStats thay đổi.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def read(self):
+        """Trả về (header, danh sách thao tác); bỏ qua dòng cuối bị ghi dở khi chương trình dừng đột ngột."""
+        if not os.path.exists(self.path):
+            return None, []
+        header, entries = None, []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if header is None:
+                    header = entry
+                else:
+                    entries.append(entry)
+        return header, entries
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def reset(self, header):
+        """Ghi lại nhật ký chỉ còn header (sau khi gộp snapshot), thay thế file cũ một cách nguyên tử."""
+        self.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _append(self, entry):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry, ensure_ascii=False, default=_json_default) + "\n")
+        self._file.flush()
+
+    def record(self, mutation):
+        """Listener cho CovidStats: ghi một thao tác vào cuối nhật ký."""
+        ids = mutation.ids.tolist()
+        if mutation.kind == "insert":
+            rows = mutation.after.astype(object).where(mutation.after.notna(), None)
+            self._append({"op": "insert", "ids": ids, "rows": rows.to_dict("records")})
+        elif mutation.kind == "update":
+            after = mutation.after[mutation.columns].astype(object)
+            after = after.where(after.notna(), None)
+            self._append({"op": "update", "ids": ids, "changes": after.to_dict("list")})
+        elif mutation.kind == "delete":
+            self._append({"op": "delete", "ids": ids})
+
+    def sync(self):
+        """Đẩy nhật ký xuống đĩa (fsync); chi phí tỉ lệ với số thay đổi chưa đồng bộ."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def apply(model, entries):
+        """Áp dụng lại các thao tác lên CovidStats; dừng nếu mã dòng không khớp (nhật ký hỏng)."""
+        for entry in entries:
+            op = entry.get("op")
+            if op == "insert":
+                for row_id, row in zip(entry["ids"], entry["rows"]):
+                    if row_id < model.next_id:
+                        # Dòng được thêm lại với mã cũ (hoàn tác xóa, làm lại thêm mới)
+                        model.restore_rows(pd.DataFrame([row], index=pd.Index([row_id], dtype=np.int64)))
+                    elif model.add_record(row) != row_id:
+                        raise ValueError(f"Mã dòng không khớp khi áp dụng nhật ký: {row_id}")
+            elif op == "update":
+                model.update_many(entry["ids"], entry["changes"])
+            elif op == "delete":
+                model.delete_many(entry["ids"])
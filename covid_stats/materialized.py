@@ -0,0 +1,285 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from covid_stats.analyzer import COUNTRY_COL, DATE_COL, METRICS, REGION_COL, carried_forward, daily_new
+
+NEW_COLUMNS = ["Ca mới", "Tử vong mới", "Hồi phục mới"]
+RATIO_COLUMNS = ["Tử vong/100 ca", "Hồi phục/100 ca", "Tử vong/100 hồi phục"]
+WEEK_COLUMNS = ["Ca xác nhận tuần trước", "Thay đổi 1 tuần", "Tỉ lệ tăng 1 tuần"]
+COUNTRY_COUNT_COL = "Số quốc gia"
+WEEK_DAYS = 7
+# Quá số lô thay đổi này mà chưa đọc bảng thì bỏ danh sách và dựng lại toàn bộ khi đọc
+MAX_PENDING = 1000
+
+FULL_GROUPED_COLUMNS = [DATE_COL, COUNTRY_COL] + METRICS + NEW_COLUMNS + [REGION_COL]
+DAY_WISE_COLUMNS = [DATE_COL] + METRICS + NEW_COLUMNS + RATIO_COLUMNS + [COUNTRY_COUNT_COL]
+COUNTRY_WISE_COLUMNS = [COUNTRY_COL] + METRICS + NEW_COLUMNS + RATIO_COLUMNS + WEEK_COLUMNS + [REGION_COL]
+VIEW_NAMES = ("full_grouped", "day_wise", "country_wise_latest")
+
+
+def ratios(metrics):
+    """Tử vong/100 ca, Hồi phục/100 ca, Tử vong/100 hồi phục (làm tròn 2 chữ số; chia cho 0 ra inf/NaN)."""
+    confirmed, deaths, recovered = metrics[..., 0], metrics[..., 1], metrics[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.round(np.stack([deaths / confirmed, recovered / confirmed, deaths / recovered], axis=-1) * 100, 2)
+
+
+def week_change(confirmed, last_week):
+    """Ca xác nhận tuần trước, thay đổi 1 tuần và tỉ lệ tăng 1 tuần (%)."""
+    change = confirmed - last_week
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.round(change / last_week * 100, 2)
+    return np.column_stack([last_week, change, growth])
+
+
+def _counts(values):
+    return np.rint(values).astype(np.int64)
+
+
+class MaterializedViews:
+    """
+    Ba bảng dẫn xuất của bộ dữ liệu gốc (như datasets/full_grouped.csv, day_wise.csv và
+    country_wise_latest.csv) tính từ khối CaseCube: số ca mới, các tỉ lệ trên 100 ca và thay đổi
+    1 tuần được tính bằng phép trừ vectơ trên lưới quốc gia × ngày.
+    Khi gắn với CovidStats (attach), mỗi thay đổi chỉ ghi lại quốc gia và ngày bị ảnh hưởng; lần đọc
+    bảng kế tiếp tính lại các ô đó (từ ngày sớm nhất bị sửa trở đi) và sửa trực tiếp vào bảng đã có.
+    Thêm quốc gia hoặc ngày mới làm lưới đổi kích thước nên các bảng được dựng lại từ đầu.
+    Bảng trả về được dùng chung, không nên sửa trực tiếp.
+    """
+    def __init__(self, cube):
+        self.cube = cube
+        self.model = None
+        self._pending = []
+        self._stale = False
+        self._frames = {}
+        with cube.lock:
+            self._rebuild()
+
+    # --- Dựng toàn bộ ---
+    def _rebuild(self):
+        cube = self.cube
+        self._dates = cube.dates
+        self.present = cube.counts > 0
+        self.new = daily_new(cube.values, self.present)
+        self.reporting = self.present & (cube.values[:, :, 0] > 0)
+        self.world_new = self.new.sum(axis=0)
+        self.country_count = self.reporting.sum(axis=0)
+        self._pending = []
+        self._stale = False
+        self._frames = {}
+
+    def _shape_changed(self):
+        return self.cube.dates is not self._dates or self.cube.values.shape[0] != self.new.shape[0]
+
+    # --- Cập nhật tăng dần theo thay đổi của CovidStats ---
+    def attach(self, model):
+        """Gắn vào model (gắn luôn khối nếu khối chưa theo dõi model này)."""
+        self.detach()
+        if self.cube.model is not model:
+            self.cube.attach(model)
+        self.model = model
+        model.add_listener(self.on_mutation)
+        return self
+
+    def detach(self):
+        if self.model is not None:
+            self.model.remove_listener(self.on_mutation)
+            self.model = None
+
+    def on_mutation(self, mutation):
+        if not set(mutation.columns) & {COUNTRY_COL, DATE_COL, REGION_COL, *METRICS}:
+            return
+        with self.cube.lock:
+            if self._stale:
+                return
+            if len(self._pending) >= MAX_PENDING:
+                self._pending = []
+                self._stale = True
+                return
+            for rows in (mutation.before, mutation.after):
+                if rows is not None and len(rows) and COUNTRY_COL in rows.columns and DATE_COL in rows.columns:
+                    self._pending.append((rows[COUNTRY_COL].to_numpy(), self.cube._to_dates(rows[DATE_COL])))
+
+    def _dirty_cells(self):
+        """Mảng ngày sớm nhất bị sửa của mỗi quốc gia (bằng số ngày nếu quốc gia không đổi)."""
+        cube = self.cube
+        starts = np.full(len(cube.countries), len(cube.dates), dtype=np.int64)
+        for names, dates in self._pending:
+            codes = pd.Series(names).map(cube._country_code).to_numpy()
+            known = pd.notna(codes) & ~np.isnat(dates)
+            if not known.any():
+                continue
+            days = np.searchsorted(cube.dates, dates[known])
+            np.minimum.at(starts, codes[known].astype(np.int64), days)
+        self._pending = []
+        return starts
+
+    def refresh(self):
+        """Tính lại các ô bị ảnh hưởng bởi những thay đổi từ lần đọc trước."""
+        with self.cube.lock:
+            if not self._pending and not self._stale:
+                return
+            if self._stale or self._shape_changed():
+                self._rebuild()
+                return
+            starts = self._dirty_cells()
+            countries = np.flatnonzero(starts < len(self._dates))
+            if len(countries):
+                self._update(countries, int(starts[countries].min()))
+
+    def _update(self, countries, start):
+        cube = self.cube
+        values = cube.values[countries]
+        present_row = cube.counts[countries] > 0
+        new = daily_new(values, present_row, start)
+        present = present_row[:, start:]
+        reporting = present & (values[:, start:, 0] > 0)
+        self.world_new[start:] += (new - self.new[countries, start:]).sum(axis=0)
+        self.country_count[start:] += reporting.sum(axis=0) - self.reporting[countries, start:].sum(axis=0)
+        presence_changed = (present != self.present[countries, start:]).any()
+        self.new[countries, start:] = new
+        self.present[countries, start:] = present
+        self.reporting[countries, start:] = reporting
+        if presence_changed:
+            # Ô có dữ liệu thay đổi nên số dòng của các bảng đổi: dựng lại bảng khi đọc
+            self._frames = {}
+            return
+        if "full_grouped" in self._frames:
+            self._patch_full_grouped(countries, start)
+        if "day_wise" in self._frames:
+            self._patch_day_wise(start)
+        if "country_wise_latest" in self._frames:
+            self._patch_country_wise(countries)
+
+    @staticmethod
+    def _set(frame, rows, columns, block):
+        for j, col in enumerate(columns):
+            values = block[:, j]
+            if pd.api.types.is_integer_dtype(frame[col].dtype):
+                values = _counts(values)
+            frame.iloc[rows, frame.columns.get_loc(col)] = values
+
+    def _region_names(self, codes):
+        return np.array(self.cube.regions + [np.nan], dtype=object)[codes]
+
+    # --- full_grouped: quốc gia × ngày ---
+    def _build_full_grouped(self):
+        cube = self.cube
+        days, countries = np.nonzero(self.present.T)
+        rows = np.full(self.present.shape, -1, dtype=np.int64)
+        rows[countries, days] = np.arange(len(days))
+        frame = pd.DataFrame({
+            DATE_COL: pd.DatetimeIndex(cube.dates[days]),
+            COUNTRY_COL: np.array(cube.countries, dtype=object)[countries],
+        })
+        values = cube.values[countries, days]
+        new = self.new[countries, days]
+        for m, metric in enumerate(METRICS):
+            frame[metric] = _counts(values[:, m])
+        for m, col in enumerate(NEW_COLUMNS):
+            frame[col] = _counts(new[:, m])
+        frame[REGION_COL] = self._region_names(cube.country_region[countries])
+        return frame, rows
+
+    def _patch_full_grouped(self, countries, start):
+        frame, row_of = self._frames["full_grouped"]
+        rows = row_of[countries, start:]
+        cells = rows >= 0
+        c, d = np.nonzero(cells)
+        c, d = countries[c], d + start
+        rows = rows[cells]
+        self._set(frame, rows, METRICS, self.cube.values[c, d])
+        self._set(frame, rows, NEW_COLUMNS, self.new[c, d])
+
+    # --- day_wise: tổng thế giới theo ngày ---
+    def _day_block(self, days):
+        world = self.cube.world[days]
+        return np.column_stack([world, self.world_new[days], ratios(world), self.country_count[days]])
+
+    def _build_day_wise(self):
+        days = np.flatnonzero(self.present.any(axis=0))
+        rows = np.full(len(self._dates), -1, dtype=np.int64)
+        rows[days] = np.arange(len(days))
+        frame = pd.DataFrame({DATE_COL: pd.DatetimeIndex(self._dates[days])})
+        block = self._day_block(days)
+        for j, col in enumerate(DAY_WISE_COLUMNS[1:]):
+            frame[col] = block[:, j] if col in RATIO_COLUMNS else _counts(block[:, j])
+        return frame, rows
+
+    def _patch_day_wise(self, start):
+        frame, row_of = self._frames["day_wise"]
+        days = np.flatnonzero(row_of[start:] >= 0) + start
+        self._set(frame, row_of[days], DAY_WISE_COLUMNS[1:], self._day_block(days))
+
+    # --- country_wise_latest: mỗi quốc gia tại ngày có dữ liệu mới nhất của nó ---
+    def _country_block(self, countries):
+        present = self.present[countries]
+        values = self.cube.values[countries]
+        latest = len(self._dates) - 1 - np.argmax(present[:, ::-1], axis=1)
+        # Ca xác nhận tuần trước: giá trị tại ngày có dữ liệu gần nhất không sau (ngày mới nhất - 7 ngày)
+        week_before = np.searchsorted(self._dates, self._dates[latest] - np.timedelta64(WEEK_DAYS, "D"),
+                                      side="right") - 1
+        confirmed = carried_forward(values[:, :, :1], present)[:, :, 0]
+        last_week = np.where(week_before >= 0, confirmed[np.arange(len(countries)), np.maximum(week_before, 0)], 0)
+        latest_values = values[np.arange(len(countries)), latest]
+        return np.column_stack([latest_values, self.new[countries, latest], ratios(latest_values),
+                                week_change(latest_values[:, 0], last_week)])
+
+    def _build_country_wise(self):
+        countries = np.flatnonzero(self.present.any(axis=1))
+        rows = np.full(len(self.present), -1, dtype=np.int64)
+        rows[countries] = np.arange(len(countries))
+        frame = pd.DataFrame({COUNTRY_COL: np.array(self.cube.countries, dtype=object)[countries]})
+        block = self._country_block(countries)
+        for j, col in enumerate(COUNTRY_WISE_COLUMNS[1:-1]):
+            float_col = col in RATIO_COLUMNS or col == WEEK_COLUMNS[2]
+            frame[col] = block[:, j] if float_col else _counts(block[:, j])
+        frame[REGION_COL] = self._region_names(self.cube.country_region[countries])
+        return frame, rows
+
+    def _patch_country_wise(self, countries):
+        frame, row_of = self._frames["country_wise_latest"]
+        countries = countries[row_of[countries] >= 0]
+        self._set(frame, row_of[countries], COUNTRY_WISE_COLUMNS[1:-1], self._country_block(countries))
+
+    # --- Đọc bảng ---
+    def _frame(self, name):
+        self.refresh()
+        with self.cube.lock:
+            if name not in self._frames:
+                if name == "full_grouped":
+                    self._frames[name] = self._build_full_grouped()
+                elif name == "day_wise":
+                    self._frames[name] = self._build_day_wise()
+                else:
+                    self._frames[name] = self._build_country_wise()
+            return self._frames[name][0]
+
+    def full_grouped(self):
+        """Mỗi quốc gia mỗi ngày: 4 chỉ số, số ca mới và khu vực WHO (sắp theo ngày rồi quốc gia)."""
+        return self._frame("full_grouped")
+
+    def day_wise(self):
+        """Tổng thế giới theo ngày: 4 chỉ số, số ca mới, tỉ lệ trên 100 ca và số quốc gia có ca bệnh."""
+        return self._frame("day_wise")
+
+    def country_wise_latest(self):
+        """Mỗi quốc gia tại ngày mới nhất: 4 chỉ số, số ca mới, tỉ lệ và thay đổi so với 1 tuần trước."""
+        return self._frame("country_wise_latest")
+
+    def table(self, name):
+        if name not in VIEW_NAMES:
+            raise ValueError(f"Không có bảng dẫn xuất '{name}'")
+        return self._frame(name)
+
+    def save(self, output_dir, prefix=""):
+        """Ghi ba bảng ra <prefix><tên bảng>.csv trong output_dir; trả về danh sách đường dẫn."""
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for name in VIEW_NAMES:
+            path = os.path.join(output_dir, f"{prefix}{name}.csv")
+            self.table(name).to_csv(path, index=False)
+            paths.append(path)
+        return paths
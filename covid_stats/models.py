@@ -1,47 +1,579 @@
+import bisect
+import contextlib
+import threading
+from collections import deque, namedtuple
+
+import numpy as np
 import pandas as pd
 
+from covid_stats.search_index import SearchIndex
+
+# Số bản ghi mới giữ trong bộ đệm trước khi gộp một lần vào DataFrame gốc
+APPEND_BUFFER_SIZE = 1024
+# Khi số dòng đã xóa vượt tỉ lệ này thì mới thực sự loại bỏ chúng khỏi DataFrame gốc
+COMPACT_RATIO = 0.25
+
+# Một thay đổi trên dữ liệu, gửi tới các listener: kind là "insert", "update" hoặc "delete";
+# before/after là các dòng (index là mã dòng) trước/sau thay đổi, None nếu không có;
+# columns là các cột bị thay đổi.
+Mutation = namedtuple("Mutation", ["kind", "ids", "before", "after", "columns"])
+
+# Dung lượng tối đa (byte) của lịch sử hoàn tác/làm lại; vượt quá thì bỏ bước cũ nhất
+UNDO_BUDGET_BYTES = 64 * 1024 * 1024
+
+# Một bước hoàn tác/làm lại: op là thao tác cần làm để đảo ngược ("delete" các mã dòng đã thêm,
+# "update" ghi lại giá trị cũ của các ô, "insert" thêm lại các dòng đã xóa); rows là dữ liệu cần
+# cho thao tác đó (index là mã dòng), nbytes là dung lượng bước chiếm.
+UndoStep = namedtuple("UndoStep", ["op", "ids", "rows", "nbytes"])
+
+
+class EditHistory:
+    """
+    Lịch sử hoàn tác/làm lại của CovidStats. Mỗi bước chỉ lưu phần đảo ngược của thay đổi:
+    giá trị cũ của các ô đã sửa, các dòng đã xóa, mã dòng của các dòng đã thêm (không chụp lại
+    cả bảng). Tổng dung lượng hai ngăn xếp giữ trong budget byte, vượt quá thì bỏ bước cũ nhất.
+    """
+    def __init__(self, budget=UNDO_BUDGET_BYTES):
+        self.budget = budget
+        self.undo_stack = deque()
+        self.redo_stack = deque()
+        self.nbytes = 0
+        self.evicted = 0
+        self._applying = None
+
+    @staticmethod
+    def inverse(mutation):
+        ids = np.asarray(mutation.ids, dtype=np.int64)
+        if mutation.kind == "insert":
+            return UndoStep("delete", ids, None, ids.nbytes)
+        if mutation.kind == "update":
+            rows = mutation.before[[col for col in mutation.columns if col in mutation.before.columns]]
+            op = "update"
+        else:
+            rows = mutation.before
+            op = "insert"
+        return UndoStep(op, ids, rows, ids.nbytes + int(rows.memory_usage(index=True, deep=True).sum()))
+
+    def record(self, mutation):
+        """Ghi bước đảo ngược của một thay đổi: thay đổi mới xóa ngăn làm lại."""
+        if self.budget <= 0:
+            return
+        step = self.inverse(mutation)
+        if self._applying == "undo":
+            self.redo_stack.append(step)
+        else:
+            if self._applying is None:
+                self._clear(self.redo_stack)
+            self.undo_stack.append(step)
+        self.nbytes += step.nbytes
+        self._evict()
+
+    def _clear(self, stack):
+        self.nbytes -= sum(step.nbytes for step in stack)
+        stack.clear()
+
+    def _evict(self):
+        while self.nbytes > self.budget and (self.undo_stack or self.redo_stack):
+            stack = self.undo_stack if self.undo_stack else self.redo_stack
+            self.nbytes -= stack.popleft().nbytes
+            self.evicted += 1
+
+    def pop(self, direction):
+        stack = self.undo_stack if direction == "undo" else self.redo_stack
+        if not stack:
+            return None
+        step = stack.pop()
+        self.nbytes -= step.nbytes
+        return step
+
+    @contextlib.contextmanager
+    def applying(self, direction):
+        self._applying = direction
+        try:
+            yield
+        finally:
+            self._applying = None
+
+    def clear(self):
+        self._clear(self.undo_stack)
+        self._clear(self.redo_stack)
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+
 class CovidStats:
-    def __init__(self, data: pd.DataFrame):
-        self.data = data
+    """
+    Dữ liệu gồm DataFrame gốc, bộ đệm các bản ghi mới thêm và bitmap đánh dấu dòng đã xóa.
+    Mỗi bản ghi có một mã dòng (row ID) cố định, dùng làm index của DataFrame gốc; mã này
+    không đổi khi thêm/xóa/gộp dữ liệu. Kết quả tìm kiếm và sắp xếp là một "view": chỉ là
+    mảng mã dòng trỏ vào dữ liệu gốc, nên sửa/xóa trên view là sửa/xóa trên dữ liệu gốc.
+    """
+    def __init__(self, data: pd.DataFrame, next_id=None, undo_budget=UNDO_BUDGET_BYTES):
+        if next_id is None:
+            next_id = data.attrs.get("next_row_id")
+        index = data.index
+        if not (pd.api.types.is_integer_dtype(index.dtype) and index.is_unique and index.is_monotonic_increasing):
+            data = data.reset_index(drop=True)
+        self._base = data
+        self._ids = self._base.index.to_numpy(dtype=np.int64)
+        self._alive = np.ones(len(self._base), dtype=bool)
+        self._n_dead = 0
+        self._buffer = []
+        self._buffer_ids = []
+        self._next_id = int(self._ids[-1]) + 1 if len(self._ids) else 0
+        if next_id is not None:
+            self._next_id = max(self._next_id, int(next_id))
+        self._view = None
+        self._view_cache = None
+        self._listeners = []
+        self._sort_cache = {}
+        self._all_ids_cache = None
+        # Luồng xuất file đọc get_rows trong lúc giao diện vẫn có thể gộp bộ đệm/dòng đã xóa
+        # (sắp xếp, tìm kiếm, model.data); khóa này giữ _base, _ids và bộ đệm nhất quán khi đó
+        self._lock = threading.RLock()
+        self.version = 0
+        self.history = EditHistory(undo_budget)
+        self.index = SearchIndex(self)
 
-    def add_record(self, record: dict):
-        self.data = pd.concat([self.data, pd.DataFrame([record])], ignore_index=True)
-        
-    def delete_record(self, idx: int):
-        self.data = self.data.drop(idx).reset_index(drop=True)
+    @property
+    def data(self):
+        """Toàn bộ dữ liệu (bỏ qua view), index là mã dòng."""
+        self.compact()
+        return self._base
+
+    @property
+    def columns(self):
+        return self._base.columns
+
+    @property
+    def next_id(self):
+        """Mã dòng sẽ cấp cho bản ghi thêm mới tiếp theo."""
+        return self._next_id
+
+    def dtype(self, column):
+        return self._base[column].dtype
+
+    def __len__(self):
+        if self._view is not None:
+            return len(self._view_ids())
+        return len(self._base) - self._n_dead + len(self._buffer)
+
+    def add_listener(self, callback):
+        """Đăng ký hàm callback(mutation) được gọi sau mỗi lần thêm/sửa/xóa."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _changed(self, kind, ids, before, after, columns):
+        self.version += 1
+        self._view_cache = None
+        # Hoán vị sắp xếp chỉ cũ đi khi thêm dòng hoặc khi cột của nó bị sửa;
+        # dòng bị xóa được lọc bỏ lúc dùng.
+        if kind == "insert":
+            self._sort_cache.clear()
+        elif kind == "update":
+            self._sort_cache = {key: perm for key, perm in self._sort_cache.items()
+                                if not set(key[0]) & set(columns)}
+        mutation = Mutation(kind, ids, before, after, list(columns))
+        self.history.record(mutation)
+        for callback in list(self._listeners):
+            callback(mutation)
+
+    # --- Ánh xạ mã dòng -> vị trí ---
+    def _positions(self, ids):
+        """Vị trí trong _base của các mã dòng (chỉ dùng cho mã nằm trong _base)."""
+        return np.searchsorted(self._ids, ids)
+
+    def _in_base(self, ids):
+        # Mã dòng trong bộ đệm luôn lớn hơn mọi mã dòng trong _base
+        return ids < (self._buffer_ids[0] if self._buffer_ids else self._next_id)
+
+    def _is_alive(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        result = np.zeros(len(ids), dtype=bool)
+        in_base = self._in_base(ids)
+        if in_base.any() and len(self._ids):
+            base_ids = ids[in_base]
+            positions = np.minimum(self._positions(base_ids), len(self._ids) - 1)
+            result[in_base] = (self._ids[positions] == base_ids) & self._alive[positions]
+        if self._buffer_ids and not in_base.all():
+            result[~in_base] = np.isin(ids[~in_base], self._buffer_ids)
+        return result
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        with self._lock:
+            self._append_rows(pd.DataFrame(self._buffer, index=pd.Index(self._buffer_ids, dtype=np.int64)))
+            self._buffer = []
+            self._buffer_ids = []
+
+    def _append_rows(self, added):
+        # Cột categorical giữ nguyên kiểu khi ghép (pd.concat sẽ đổi thành chuỗi nếu khác bộ giá trị)
+        for col in added.columns.intersection(self._base.columns):
+            if isinstance(self._base[col].dtype, pd.CategoricalDtype):
+                self._add_categories(col, added[col])
+                added[col] = added[col].astype(self._base[col].dtype)
+        self._base = pd.concat([self._base, added])
+        self._ids = self._base.index.to_numpy(dtype=np.int64)
+        self._alive = np.concatenate([self._alive, np.ones(len(added), dtype=bool)])
+
+    def compact(self):
+        """Gộp bộ đệm thêm mới và loại bỏ hẳn các dòng đã xóa khỏi DataFrame gốc."""
+        self._flush()
+        if self._n_dead:
+            with self._lock:
+                self._base = self._base[self._alive]
+                self._ids = self._base.index.to_numpy(dtype=np.int64)
+                self._alive = np.ones(len(self._base), dtype=bool)
+                self._n_dead = 0
+
+    # --- View (kết quả lọc/sắp xếp) ---
+    def all_ids(self):
+        """Mã dòng của mọi bản ghi còn tồn tại, theo thứ tự lưu."""
+        if self._all_ids_cache is not None and self._all_ids_cache[0] == self.version:
+            return self._all_ids_cache[1]
+        ids = self._ids if self._n_dead == 0 else self._ids[self._alive]
+        if self._buffer_ids:
+            ids = np.concatenate([ids, np.asarray(self._buffer_ids, dtype=np.int64)])
+        self._all_ids_cache = (self.version, ids)
+        return ids
+
+    def _view_ids(self):
+        if self._view_cache is None:
+            self._view_cache = self._view[self._is_alive(self._view)]
+        return self._view_cache
+
+    def row_ids(self):
+        """Mã dòng của các bản ghi trong view hiện tại (hoặc toàn bộ nếu không có view)."""
+        return self.all_ids() if self._view is None else self._view_ids()
+
+    def set_view(self, ids):
+        self._view = np.asarray(ids, dtype=np.int64)
+        self._view_cache = None
 
-    def update_record(self, idx: int, record: dict):
-        for key, value in record.items():
-            self.data.at[idx, key] = value
+    def reset_view(self):
+        self._view = None
+        self._view_cache = None
+
+    @property
+    def has_view(self):
+        return self._view is not None
+
+    # --- Đọc dữ liệu ---
+    def get_rows(self, ids):
+        """DataFrame các bản ghi theo đúng thứ tự ids, index là mã dòng."""
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            in_base = self._in_base(ids)
+            if in_base.all():
+                return self._base.iloc[self._positions(ids)]
+            buffer_pos = np.searchsorted(np.asarray(self._buffer_ids, dtype=np.int64), ids[~in_base])
+            added = pd.DataFrame([self._buffer[i] for i in buffer_pos],
+                                 index=pd.Index(ids[~in_base], dtype=np.int64), columns=self._base.columns)
+            if not in_base.any():
+                return added
+            rows = pd.concat([self._base.iloc[self._positions(ids[in_base])], added])
+        return rows.reindex(ids)
+
+    def get_record(self, row_id) -> dict:
+        return self.get_rows([row_id]).iloc[0].to_dict()
 
 # Lấy dữ liệu theo trang
     def get_page(self, page=1, page_size=20):
         start = (page - 1) * page_size
-        end = start + page_size
-        return self.data.iloc[start:end]
+        if self._view is None and self._n_dead == 0 and not self._buffer:
+            return self._base.iloc[start:start + page_size]
+        return self.get_rows(self.row_ids()[start:start + page_size])
 
 # lấy tông số trang dựa trên kích thước trang
     def get_total_pages(self, page_size=20):
-        return (len(self.data) + page_size - 1) // page_size
+        return (len(self) + page_size - 1) // page_size
 
     def get_all(self):
-        return self.data
-    
+        """Các bản ghi trong view hiện tại (hoặc toàn bộ dữ liệu nếu không có view)."""
+        if self._view is None:
+            return self.data
+        self._flush()
+        return self.get_rows(self._view_ids())
+
+    # --- Ghi dữ liệu ---
+    def _coerce(self, col, values):
+        # Dữ liệu nhập từ form là chuỗi: chuyển về kiểu của cột nếu được
+        if col not in self._base.columns:
+            return values
+        dtype = self._base[col].dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            return values
+        values = pd.Series(np.atleast_1d(np.asarray(values, dtype=object)))
+        if pd.api.types.is_numeric_dtype(dtype):
+            converted = pd.to_numeric(values, errors="coerce")
+            # Giữ nguyên giá trị gốc nếu không phải số, để người dùng không mất dữ liệu đã nhập
+            blank = values.isna() | values.astype(str).str.strip().str.lower().isin(["", "nan", "none", "<na>"])
+            if (converted.isna() & ~blank).any():
+                return values.to_numpy()
+            return self._fit_integer(dtype, converted)
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return pd.to_datetime(values, errors="coerce").to_numpy()
+        return values.to_numpy()
+
+    def _add_categories(self, col, values):
+        # Giá trị mới của cột categorical phải được thêm vào danh sách category trước khi gán
+        categories = self._base[col].cat.categories
+        values = pd.Series(values, dtype=object).dropna()
+        new = pd.Index(pd.unique(values[~values.isin(categories)].to_numpy()))
+        if len(new):
+            try:
+                new = new.astype(categories.dtype)
+            except (TypeError, ValueError):
+                pass
+            self._base[col] = self._base[col].cat.add_categories(new)
+
+    @staticmethod
+    def _fit_integer(dtype, converted):
+        # Cột số nguyên kiểu gọn (int8/Int16...): giá trị vừa kiểu thì ép về đúng kiểu đó để cột
+        # không bị nâng lên int64/float64; không vừa thì để _set_column nâng kiểu cột
+        if not pd.api.types.is_integer_dtype(dtype):
+            return converted.to_numpy()
+        numbers = converted.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = numbers[~np.isnan(numbers)]
+        info = np.iinfo(getattr(dtype, "numpy_dtype", dtype))
+        nullable = isinstance(dtype, pd.api.extensions.ExtensionDtype)
+        if (len(valid) < len(numbers) and not nullable) or not np.array_equal(valid, np.floor(valid)) \
+                or (len(valid) and (valid.min() < info.min or valid.max() > info.max)):
+            return converted.to_numpy()
+        return pd.array(converted, dtype="Float64").astype(dtype) if nullable else numbers.astype(dtype)
+
+    def _set_column(self, positions, col, values):
+        if col not in self._base.columns:
+            self._base[col] = np.nan
+        if isinstance(self._base[col].dtype, pd.CategoricalDtype):
+            self._add_categories(col, values)
+        j = self._base.columns.get_loc(col)
+        try:
+            self._base.iloc[positions, j] = values
+        except (TypeError, ValueError):
+            # Cột không chứa được giá trị mới (vd. NaN vào cột int): nâng kiểu cột rồi gán lại
+            common = pd.concat([self._base[col].iloc[:0], pd.Series(values).iloc[:0]]).dtype
+            self._base[col] = self._base[col].astype(common)
+            self._base.iloc[positions, j] = values
+
+    def add_record(self, record: dict):
+        """Thêm bản ghi, trả về mã dòng mới. Nếu đang có view thì bản ghi được thêm vào cuối view."""
+        row = {key: self._coerce(key, [value])[0] for key, value in record.items() if value is not None}
+        row_id = self._next_id
+        self._next_id += 1
+        self._buffer.append(row)
+        self._buffer_ids.append(row_id)
+        if self._view is not None:
+            self._view = np.append(self._view, row_id)
+        if len(self._buffer) >= APPEND_BUFFER_SIZE:
+            self._flush()
+        ids = np.array([row_id], dtype=np.int64)
+        self._changed("insert", ids, None, self.get_rows(ids), self._base.columns.union(list(row), sort=False))
+        return row_id
+
+    def restore_rows(self, rows: pd.DataFrame):
+        """
+        Thêm lại các bản ghi với đúng mã dòng cũ (index của rows): dùng khi hoàn tác xóa, làm lại
+        thêm mới và khi áp dụng nhật ký. Dòng đã xóa nhưng chưa bị loại khỏi DataFrame gốc chỉ cần
+        bật lại bit còn sống; chỉ khi dòng đã bị gộp bỏ (compact) mới phải ghép lại vào DataFrame gốc.
+        """
+        ids = rows.index.to_numpy(dtype=np.int64)
+        keep = ~self._is_alive(ids)
+        rows, ids = rows[keep], ids[keep]
+        if not len(ids):
+            return
+        rows = pd.DataFrame({col: self._coerce(col, rows[col].to_numpy()) for col in rows.columns},
+                            index=pd.Index(ids, dtype=np.int64))
+        last_base = int(self._ids[-1]) if len(self._ids) else -1
+        in_base = ids <= last_base
+        if in_base.any():
+            positions = np.minimum(self._positions(ids[in_base]), len(self._ids) - 1)
+            dead = self._ids[positions] == ids[in_base]
+            self._alive[positions[dead]] = True
+            self._n_dead -= int(dead.sum())
+            missing = ids[in_base][~dead]
+            if len(missing):
+                # Dòng đã bị gộp bỏ: ghép lại rồi sắp theo mã dòng (chi phí tỉ lệ với cả bảng)
+                self._append_rows(rows.loc[missing])
+                order = np.argsort(self._ids, kind="stable")
+                self._base, self._ids, self._alive = self._base.iloc[order], self._ids[order], self._alive[order]
+        # Mã dòng lớn hơn mọi mã trong DataFrame gốc: chèn vào bộ đệm theo đúng thứ tự
+        for row_id, row in zip(ids[~in_base].tolist(), rows[~in_base].to_dict("records")):
+            pos = bisect.bisect_left(self._buffer_ids, row_id)
+            self._buffer_ids.insert(pos, row_id)
+            self._buffer.insert(pos, {key: value for key, value in row.items() if not pd.isna(value)})
+        self._next_id = max(self._next_id, int(ids.max()) + 1)
+        if self._view is not None:
+            self._view = np.append(self._view, ids)
+        self._changed("insert", ids, None, self.get_rows(ids), self._base.columns.union(list(rows.columns), sort=False))
+
+    def update_record(self, row_id, record: dict):
+        self.update_many([row_id], record)
+
+    def update_many(self, ids, changes: dict):
+        """
+        Sửa nhiều bản ghi trong một lần: changes là {cột: giá trị} với giá trị là một giá trị
+        chung cho mọi dòng hoặc một dãy cùng độ dài với ids. Mã dòng không tồn tại (hoặc đã xóa)
+        gây KeyError và không dòng nào bị sửa.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        alive = self._is_alive(ids)
+        if not alive.all():
+            raise KeyError(f"Không có bản ghi với mã dòng: {ids[~alive][:10].tolist()}")
+        if not self._in_base(ids).all():
+            self._flush()
+        positions = self._positions(ids)
+        before = self._base.iloc[positions]
+        for col, values in changes.items():
+            if np.ndim(values) == 0:
+                values = [values] * len(ids)
+            self._set_column(positions, col, self._coerce(col, values))
+        self._changed("update", ids, before, self._base.iloc[positions], changes.keys())
+
+    def delete_record(self, row_id):
+        self.delete_many([row_id])
+
+    def delete_many(self, ids):
+        """Xóa nhiều bản ghi theo mã dòng trong một lần."""
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        ids = ids[self._is_alive(ids)]
+        if not len(ids):
+            return
+        before = self.get_rows(ids)
+        in_base = self._in_base(ids)
+        if not in_base.all():
+            removed = set(ids[~in_base].tolist())
+            kept = [i for i, row_id in enumerate(self._buffer_ids) if row_id not in removed]
+            self._buffer = [self._buffer[i] for i in kept]
+            self._buffer_ids = [self._buffer_ids[i] for i in kept]
+        positions = self._positions(ids[in_base])
+        self._alive[positions] = False
+        self._n_dead += len(positions)
+        if self._n_dead > COMPACT_RATIO * len(self._base):
+            self.compact()
+        self._changed("delete", ids, before, None, self._base.columns)
+
+    # --- Hoàn tác / làm lại ---
+    def _apply_step(self, step):
+        if step.op == "delete":
+            self.delete_many(step.ids)
+        elif step.op == "update":
+            alive = self._is_alive(step.ids)
+            self.update_many(step.ids[alive], {col: step.rows[col].to_numpy()[alive] for col in step.rows.columns})
+        else:
+            self.restore_rows(step.rows)
+
+    def _replay(self, direction):
+        step = self.history.pop(direction)
+        if step is None:
+            return False
+        with self.history.applying(direction):
+            self._apply_step(step)
+        return True
+
+    def undo(self):
+        """Hoàn tác thay đổi gần nhất (chi phí tỉ lệ với số ô/dòng của thay đổi đó). Trả về False nếu không còn gì."""
+        return self._replay("undo")
+
+    def redo(self):
+        """Làm lại thay đổi vừa hoàn tác. Trả về False nếu không còn gì."""
+        return self._replay("redo")
+
+    # --- Tìm kiếm, sắp xếp: trả về view trên dữ liệu gốc ---
+    def search_ids(self, keyword, columns=None, mode="contains"):
+        """
+        Mã dòng của các bản ghi có một trong các cột chứa keyword (không phân biệt hoa thường),
+        dùng chỉ mục tìm kiếm. mode là "contains" hoặc "prefix" với cột văn bản; với cột số/ngày
+        keyword phải bằng đúng giá trị.
+        """
+        if columns is None:
+            columns = self.columns
+        results = []
+        for col in columns:
+            if col in self.index.text:
+                if mode == "prefix":
+                    results.append(self.index.prefix(col, keyword))
+                else:
+                    results.append(self.index.contains(col, keyword))
+            elif self.index.is_numeric(col):
+                results.append(self.index.equals(col, keyword))
+        if not results:
+            return np.empty(0, dtype=np.int64)
+        return results[0] if len(results) == 1 else np.unique(np.concatenate(results))
+
+    def range_ids(self, column, low=None, high=None):
+        """Mã dòng có giá trị cột số/ngày trong đoạn [low, high]."""
+        return self.index.range(column, low, high)
+
     def search_records(self, keyword, columns=None):
         """
         Tìm kiếm keyword trong các cột chỉ định (hoặc tất cả nếu columns=None).
         Trả về DataFrame kết quả.
         """
-        if columns is None:
-            columns = self.data.columns
-        mask = pd.DataFrame(False, index=self.data.index, columns=columns)
-        for col in columns:
-            mask[col] = self.data[col].astype(str).str.contains(str(keyword), case=False, na=False)
-        result = self.data[mask.any(axis=1)]
-        return result
+        return self.get_rows(self.search_ids(keyword, columns))
+
+    def _sort_codes(self, column):
+        # Mã thứ tự của giá trị trong cột (theo all_ids), NaN nhận mã lớn nhất để luôn xếp cuối
+        values = self._base[column] if self._n_dead == 0 else self._base[column][self._alive]
+        try:
+            codes, uniques = pd.factorize(values, sort=True)
+        except TypeError:
+            codes, uniques = pd.factorize(values.astype(str).where(values.notna()), sort=True)
+        n = len(uniques)
+        codes[codes < 0] = n
+        return codes, n
+
+    def sort_permutation(self, columns, ascending=True):
+        """
+        Mã dòng của toàn bộ dữ liệu theo thứ tự sắp xếp, lấy từ cache nếu có. Thứ tự giảm dần
+        của một cột dùng lại hoán vị tăng dần theo chiều ngược; NaN luôn nằm cuối.
+        """
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        ascending = [ascending] * len(columns) if isinstance(ascending, bool) else list(ascending)
+        self._flush()
+        if len(columns) == 1:
+            key = (tuple(columns), None)
+            cached = self._sort_cache.get(key)
+            if cached is None:
+                codes, n = self._sort_codes(columns[0])
+                order = np.argsort(codes, kind="stable")
+                cached = (self.all_ids()[order], int((codes < n).sum()))
+                self._sort_cache[key] = cached
+            perm, n_valid = cached
+            if ascending[0]:
+                return perm
+            return np.concatenate([perm[:n_valid][::-1], perm[n_valid:]])
+
+        key = (tuple(columns), tuple(ascending))
+        perm = self._sort_cache.get(key)
+        if perm is None:
+            keys = []
+            for col, asc in zip(columns, ascending):
+                codes, n = self._sort_codes(col)
+                keys.append(codes if asc else np.where(codes < n, n - 1 - codes, n))
+            perm = self.all_ids()[np.lexsort(keys[::-1])]
+            self._sort_cache[key] = perm
+        return perm
 
     def sort_records(self, by_column, ascending=True):
         """
-        Sắp xếp dữ liệu theo cột by_column, tăng (ascending=True) hoặc giảm dần.
+        Sắp xếp view hiện tại theo cột by_column (hoặc danh sách cột), tăng (ascending=True)
+        hoặc giảm dần. View mới chỉ là hoán vị mã dòng, get_page cắt trực tiếp trên hoán vị đó.
         """
-        self.data = self.data.sort_values(by=by_column, ascending=ascending).reset_index(drop=True)
\ No newline at end of file
+        perm = self.sort_permutation(by_column, ascending)
+        # Lọc bỏ dòng đã xóa và dòng ngoài view hiện tại bằng bảng tra theo mã dòng
+        keep = np.zeros(self._next_id, dtype=bool)
+        keep[self.row_ids()] = True
+        self.set_view(perm[keep[perm]])
@@ -0,0 +1,276 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from covid_stats.cleaning import DATE_KEYWORDS, date_columns
+from covid_stats.schema import COUNT_COLUMNS, canonical_name, column_memory
+
+# Cột khóa của một dòng số liệu: cùng quốc gia, tỉnh và ngày thì coi là trùng
+KEY_COLUMNS = (
+    ("Quốc gia/Vùng lãnh thổ", "Tỉnh/Bang", "Ngày"),
+    ("Country/Region", "Province/State", "Date"),
+)
+
+PROFILE_COLUMNS = ["Cột", "Kiểu dữ liệu", "Số ô thiếu", "Số giá trị khác nhau", "Nhỏ nhất", "Lớn nhất",
+                   "Trung bình", "Ngày không hợp lệ", "Số âm", "Bộ nhớ (KB)"]
+
+
+def _is_number(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _invalid_dates(series):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        parsed = pd.to_datetime(series, errors="coerce")
+    return int((parsed.isna() & series.notna()).sum())
+
+
+def _is_plain_text(series):
+    values = series.cat.categories if isinstance(series.dtype, pd.CategoricalDtype) else series
+    return pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty")
+
+
+def row_hashes(frame, columns, kinds=None):
+    """
+    Mã băm uint64 của từng dòng trên các cột đã cho. kinds ({cột: "numeric" hoặc "datetime"}) đưa
+    các cột đó về float64/datetime64[ns] trước khi băm, để cùng một giá trị cho cùng mã băm dù cột đang
+    là int, float hay object; cột chữ (object, string, category) được băm trực tiếp, chỉ cột lẫn kiểu
+    mới phải đổi sang chuỗi.
+    """
+    kinds = kinds or {}
+    normalized = {}
+    for col in columns:
+        series = frame[col] if col in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+        kind = kinds.get(col)
+        if kind == "numeric":
+            normalized[col] = pd.to_numeric(series, errors="coerce").astype(np.float64)
+        elif kind == "datetime":
+            normalized[col] = pd.to_datetime(series, errors="coerce").astype("datetime64[ns]")
+        elif _is_plain_text(series):
+            normalized[col] = series
+        else:
+            normalized[col] = series.astype(str).where(series.notna(), None).astype(object)
+    return pd.util.hash_pandas_object(pd.DataFrame(normalized, index=frame.index), index=False).to_numpy()
+
+
+class SortedCounter:
+    """
+    Đếm số lần xuất hiện của từng khóa bằng hai mảng numpy: các khóa khác nhau (đã sắp xếp) và số
+    lần tương ứng. Thêm/bớt một lô khóa là một lần np.unique trên lô đó cộng searchsorted vào mảng;
+    chỉ khi có khóa mới hoặc khóa hết số đếm thì mảng mới được chép lại.
+    """
+    def __init__(self, keys):
+        self.keys, self.counts = np.unique(keys, return_counts=True)
+        self.total = len(keys)
+
+    def _apply(self, keys, sign):
+        if not len(keys):
+            return
+        keys, counts = np.unique(keys, return_counts=True)
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        self.counts[positions[found]] += sign * counts[found]
+        self.total += sign * int(counts[found].sum())
+        if sign > 0 and not found.all():
+            self.keys = np.insert(self.keys, positions[~found], keys[~found])
+            self.counts = np.insert(self.counts, positions[~found], counts[~found])
+            self.total += int(counts[~found].sum())
+        elif sign < 0 and (self.counts[positions[found]] <= 0).any():
+            keep = self.counts > 0
+            self.keys, self.counts = self.keys[keep], self.counts[keep]
+
+    def add(self, keys):
+        self._apply(keys, 1)
+
+    def remove(self, keys):
+        self._apply(keys, -1)
+
+    @property
+    def distinct(self):
+        return len(self.keys)
+
+
+class HashCounter(SortedCounter):
+    """Đếm mã băm dòng; số dòng trùng = tổng số dòng - số mã băm khác nhau."""
+    @property
+    def duplicates(self):
+        return self.total - self.distinct
+
+
+class ColumnStats:
+    """
+    Thống kê của một cột, cập nhật được theo từng thay đổi: đếm từng giá trị (nên biết ngay số
+    giá trị khác nhau và min/max kể cả khi xóa), số ô thiếu, tổng để tính trung bình, số giá trị âm
+    và số ngày sai định dạng. Cột số đếm chính giá trị (float64, nên min/max là hai đầu mảng đã
+    sắp xếp), cột khác đếm mã băm của giá trị.
+    """
+    def __init__(self, name, series, check_dates=False, check_negative=False):
+        self.name = name
+        self.dtype = series.dtype
+        self.numeric = _is_number(series.dtype)
+        self.check_dates = check_dates
+        self.check_negative = check_negative and self.numeric
+        values = series.dropna()
+        self.values = SortedCounter(self._keys(values))
+        self.nulls = len(series) - len(values)
+        # Cộng bằng float64 để tổng không phụ thuộc thứ tự cộng khi cột là float32
+        self.total = float(series.astype(np.float64).sum()) if self.numeric else 0.0
+        self.non_null = len(values)
+        self.negatives = int((series < 0).sum()) if self.check_negative else 0
+        self.invalid_dates = _invalid_dates(series) if check_dates else 0
+
+    def _keys(self, values):
+        if self.numeric:
+            numeric = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            return numeric[~np.isnan(numeric)]
+        return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+    def _apply(self, series, sign):
+        nulls = series.isna()
+        self.nulls += sign * int(nulls.sum())
+        values = series[~nulls]
+        self.non_null += sign * len(values)
+        if self.numeric:
+            numeric = pd.to_numeric(values, errors="coerce")
+            self.total += sign * float(numeric.astype(np.float64).sum())
+            if self.check_negative:
+                self.negatives += sign * int((numeric < 0).sum())
+        if self.check_dates:
+            self.invalid_dates += sign * _invalid_dates(values)
+        (self.values.add if sign > 0 else self.values.remove)(self._keys(values))
+
+    def add(self, series):
+        self._apply(series, 1)
+
+    def remove(self, series):
+        self._apply(series, -1)
+
+    def extremes(self):
+        keys = self.values.keys
+        if self.numeric and len(keys):
+            if pd.api.types.is_integer_dtype(self.dtype):
+                return int(keys[0]), int(keys[-1])
+            return keys[0], keys[-1]
+        return None, None
+
+    def row(self):
+        low, high = self.extremes()
+        mean = self.total / self.non_null if self.numeric and self.non_null else None
+        return [self.name, str(self.dtype), self.nulls, self.values.distinct, low, high, mean,
+                self.invalid_dates if self.check_dates else None,
+                self.negatives if self.check_negative else None]
+
+
+class Profiler:
+    """
+    Hồ sơ dữ liệu: thống kê từng cột và số dòng trùng (toàn dòng và theo cột khóa quốc gia/tỉnh/ngày),
+    dựng trong một lượt qua dữ liệu. source là CovidStats thì hồ sơ cập nhật theo từng thay đổi
+    (listener của CovidStats) và bảng kết quả được giữ lại cho tới khi phiên bản dữ liệu đổi;
+    source là DataFrame thì hồ sơ chỉ mô tả DataFrame đó.
+    """
+    def __init__(self, source, key_columns=None):
+        if isinstance(source, pd.DataFrame):
+            self.model = None
+            self.frame = source
+        else:
+            self.model = source
+            self.frame = None
+        data = self.data
+        if key_columns is None:
+            key_columns = next((keys for keys in KEY_COLUMNS if all(k in data.columns for k in keys)), ())
+        self.key_columns = list(key_columns)
+        self.rows = len(data)
+        dates = set(date_columns(data))
+        self.columns = {col: ColumnStats(col, data[col], col in dates, canonical_name(col) in COUNT_COLUMNS)
+                        for col in data.columns}
+        self.row_duplicates = HashCounter(self._hashes(data, list(data.columns)))
+        self.key_duplicates = HashCounter(self._hashes(data, self.key_columns)) if self.key_columns else None
+        self._table = None
+        self._version = None
+        if self.model is not None:
+            self.model.add_listener(self.on_mutation)
+
+    @property
+    def data(self):
+        return self.frame if self.model is None else self.model.data
+
+    @property
+    def version(self):
+        return None if self.model is None else self.model.version
+
+    def detach(self):
+        if self.model is not None:
+            self.model.remove_listener(self.on_mutation)
+
+    def _column(self, col):
+        stats = self.columns.get(col)
+        if stats is None:
+            # Cột mới (chỉ có ở dòng vừa thêm): các dòng cũ coi như thiếu giá trị
+            stats = ColumnStats(col, pd.Series([np.nan] * self.rows, dtype=object),
+                                any(k in str(col).lower() for k in DATE_KEYWORDS), canonical_name(col) in COUNT_COLUMNS)
+            self.columns[col] = stats
+        return stats
+
+    def _hashes(self, frame, columns):
+        kinds = {col: "numeric" if stats.numeric else "datetime"
+                 for col, stats in self.columns.items()
+                 if stats.numeric or pd.api.types.is_datetime64_any_dtype(stats.dtype)}
+        return row_hashes(frame, columns, kinds)
+
+    def _apply(self, frame, sign, columns):
+        if frame is None or not len(frame):
+            return
+        for col in columns:
+            stats = self._column(col)
+            series = frame[col] if col in frame.columns else pd.Series(np.nan, index=frame.index)
+            if sign > 0:
+                stats.add(series)
+            else:
+                stats.remove(series)
+        hashes = self._hashes(frame, list(self.columns))
+        (self.row_duplicates.add if sign > 0 else self.row_duplicates.remove)(hashes)
+        if self.key_duplicates is not None:
+            keys = self._hashes(frame, self.key_columns)
+            (self.key_duplicates.add if sign > 0 else self.key_duplicates.remove)(keys)
+
+    def on_mutation(self, mutation):
+        if mutation.kind == "insert":
+            for col in mutation.columns:
+                self._column(col)
+            self._apply(mutation.after, 1, list(self.columns))
+            self.rows += len(mutation.after)
+        elif mutation.kind == "delete":
+            self._apply(mutation.before, -1, list(self.columns))
+            self.rows -= len(mutation.before)
+        else:
+            # Cột không bị sửa thì thống kê của nó không đổi; mã băm dòng thì phải tính lại
+            changed = [col for col in mutation.columns if col in self.columns]
+            for col in changed:
+                self.columns[col].remove(mutation.before[col])
+                self.columns[col].add(mutation.after[col])
+            self.row_duplicates.remove(self._hashes(mutation.before, list(self.columns)))
+            self.row_duplicates.add(self._hashes(mutation.after, list(self.columns)))
+            if self.key_duplicates is not None and set(changed) & set(self.key_columns):
+                self.key_duplicates.remove(self._hashes(mutation.before, self.key_columns))
+                self.key_duplicates.add(self._hashes(mutation.after, self.key_columns))
+
+    def table(self):
+        """Bảng thống kê theo cột (DataFrame), tính lại chỉ khi dữ liệu đã đổi phiên bản."""
+        if self._table is None or self._version != self.version:
+            memory = column_memory(self.data)
+            rows = [stats.row() + [memory.get(col, 0) / 1024] for col, stats in self.columns.items()]
+            self._table = pd.DataFrame(rows, columns=PROFILE_COLUMNS)
+            self._version = self.version
+        return self._table
+
+    def summary(self):
+        lines = [f"Tổng số dòng: {self.rows}", f"Tổng số cột: {len(self.columns)}",
+                 f"Tổng số ô bị thiếu (NaN): {sum(s.nulls for s in self.columns.values())}",
+                 f"Số dòng trùng lặp: {self.row_duplicates.duplicates}",
+                 f"Bộ nhớ dữ liệu: {column_memory(self.data).sum() / 1e6:.1f} MB"]
+        if self.key_duplicates is not None:
+            lines.append(f"Số dòng trùng khóa ({', '.join(self.key_columns)}): {self.key_duplicates.duplicates}")
+        return lines
@@ -0,0 +1,132 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Đổi tên cột tiếng Anh của bộ dữ liệu gốc sang tên tiếng Việt dùng trong chương trình
+COLUMN_MAP = {
+    'Province/State': 'Tỉnh/Bang',
+    'Country/Region': 'Quốc gia/Vùng lãnh thổ',
+    'Lat': 'Vĩ độ',
+    'Long': 'Kinh độ',
+    'Date': 'Ngày',
+    'Confirmed': 'Ca xác nhận',
+    'Deaths': 'Tử vong',
+    'Recovered': 'Hồi phục',
+    'Active': 'Đang điều trị',
+    'WHO Region': 'Khu vực WHO'
+}
+
+# Kiểu dữ liệu theo tên cột (tên tiếng Việt; cột tiếng Anh được tra qua COLUMN_MAP)
+CATEGORY_COLUMNS = ("Tỉnh/Bang", "Quốc gia/Vùng lãnh thổ", "Quốc gia", "Khu vực WHO", "Continent")
+DATE_COLUMNS = ("Ngày",)
+COUNT_COLUMNS = ("Ca xác nhận", "Tử vong", "Hồi phục", "Đang điều trị", "Bình phục",
+                 "Ca mới", "Tử vong mới", "Bình phục mới", "Hồi phục mới",
+                 "New cases", "New deaths", "New recovered")
+COORDINATE_COLUMNS = ("Vĩ độ", "Kinh độ")
+
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+MEMORY_COLUMNS = ["Cột", "Kiểu dữ liệu", "Bộ nhớ (KB)", "Trước khi đổi kiểu (KB)", "Giảm (%)"]
+
+
+def canonical_name(col):
+    return COLUMN_MAP.get(col, col)
+
+
+def to_category(series):
+    if not (pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)):
+        return series
+    return series.astype("category")
+
+
+def to_dates(series):
+    """Chuyển sang datetime64; nếu có giá trị không đọc được thì giữ nguyên để không mất dữ liệu."""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        parsed = pd.to_datetime(series, errors="coerce")
+    if (parsed.isna() & series.notna()).any():
+        return series
+    return parsed
+
+
+def to_count(series):
+    """
+    Số nguyên nhỏ nhất chứa được mọi giá trị (int8..int64); có ô thiếu thì dùng kiểu nullable
+    (Int8..Int64). Cột có số lẻ hoặc chữ thì giữ nguyên.
+    """
+    if pd.api.types.is_bool_dtype(series.dtype) or not pd.api.types.is_numeric_dtype(series.dtype):
+        return series
+    values = series.dropna().to_numpy(dtype=np.float64)
+    if not len(values) or not np.array_equal(values, np.floor(values)):
+        return series
+    low, high = values.min(), values.max()
+    dtype = next(t for t in INT_TYPES if np.iinfo(t).min <= low and high <= np.iinfo(t).max)
+    if series.isna().any():
+        return series.astype(np.dtype(dtype).name.capitalize())
+    return series.astype(dtype)
+
+
+def to_coordinate(series):
+    if pd.api.types.is_float_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype):
+        return series.astype(np.float32)
+    return series
+
+
+def column_converter(col):
+    name = canonical_name(col)
+    if name in CATEGORY_COLUMNS:
+        return to_category
+    if name in DATE_COLUMNS:
+        return to_dates
+    if name in COUNT_COLUMNS:
+        return to_count
+    if name in COORDINATE_COLUMNS:
+        return to_coordinate
+    return None
+
+
+def apply_schema(df):
+    """
+    Đổi kiểu các cột đã biết sang dạng gọn: cột khóa chữ thành categorical, Ngày thành datetime64,
+    số ca thành số nguyên nhỏ nhất đủ chứa, tọa độ thành float32. Sửa DataFrame tại chỗ và trả về nó.
+    """
+    for col in df.columns:
+        converter = column_converter(col)
+        if converter is not None:
+            df[col] = converter(df[col])
+    return df
+
+
+def column_memory(df):
+    """Số byte mỗi cột chiếm (kể cả chuỗi Python bên trong cột object)."""
+    return df.memory_usage(index=False, deep=True)
+
+
+def memory_report(df, baseline=None):
+    """
+    Bảng bộ nhớ theo cột của df; nếu có baseline (cùng dữ liệu trước khi đổi kiểu) thì kèm
+    bộ nhớ cũ và tỉ lệ giảm. Dòng cuối là tổng.
+    """
+    usage = column_memory(df)
+    before = column_memory(baseline).reindex(usage.index) if baseline is not None else None
+    rows = []
+    for col in df.columns:
+        row = [col, str(df[col].dtype), usage[col] / 1024]
+        if before is not None:
+            row += [before[col] / 1024, 100 * (1 - usage[col] / before[col]) if before[col] else None]
+        rows.append(row)
+    total = ["Tổng", "", usage.sum() / 1024]
+    if before is not None:
+        total += [before.sum() / 1024, 100 * (1 - usage.sum() / before.sum()) if before.sum() else None]
+    rows.append(total)
+    return pd.DataFrame(rows, columns=MEMORY_COLUMNS[:len(total)])
+
+
+def display_value(value):
+    """Giá trị để hiển thị/sửa trên giao diện: ngày không có giờ chỉ hiện yyyy-MM-dd."""
+    if isinstance(value, pd.Timestamp) and value == value.normalize():
+        return value.strftime("%Y-%m-%d")
+    return value
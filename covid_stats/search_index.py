@@ -0,0 +1,229 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Ký tự đánh dấu đầu/cuối giá trị, để trigram cũng phục vụ được tìm theo tiền tố và tìm chính xác
+START = "\x02"
+END = "\x03"
+# Số thay đổi dồn lại trước khi sắp xếp lại chỉ mục số
+NUMERIC_MERGE_THRESHOLD = 4096
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TextColumnIndex:
+    """
+    Chỉ mục trigram cho một cột văn bản. Trigram được lập trên các giá trị khác nhau của cột
+    (vài trăm quốc gia/tỉnh), mỗi giá trị giữ danh sách mã dòng đã sắp xếp của nó.
+    Tìm kiếm không phân biệt hoa thường.
+    """
+    def __init__(self, ids, series):
+        self._code_of = {}
+        self._keys = []
+        self._grams = defaultdict(set)
+        self._postings = []
+        self._pending = defaultdict(dict)
+
+        codes, uniques = pd.factorize(series)
+        remap = np.array([self._code(str(u).lower()) for u in uniques] + [-1], dtype=np.int64)
+        codes = remap[codes]
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        bounds = np.searchsorted(sorted_codes, np.arange(-1, len(self._keys) + 1))
+        sorted_ids = np.asarray(ids, dtype=np.int64)[order]
+        for code in range(len(self._keys)):
+            self._postings[code] = sorted_ids[bounds[code + 1]:bounds[code + 2]]
+
+    def _code(self, key):
+        code = self._code_of.get(key)
+        if code is None:
+            code = len(self._keys)
+            self._code_of[key] = code
+            self._keys.append(key)
+            self._postings.append(np.empty(0, dtype=np.int64))
+            for gram in trigrams(START + key + END):
+                self._grams[gram].add(code)
+        return code
+
+    def add(self, ids, values):
+        for row_id, value in zip(ids, values):
+            if not pd.isna(value):
+                self._pending[self._code(str(value).lower())][int(row_id)] = True
+
+    def remove(self, ids, values):
+        for row_id, value in zip(ids, values):
+            if not pd.isna(value):
+                code = self._code_of.get(str(value).lower())
+                if code is not None:
+                    self._pending[code][int(row_id)] = False
+
+    def _ids_for(self, code):
+        pending = self._pending.pop(code, None)
+        if pending:
+            present = np.fromiter((i for i, ok in pending.items() if ok), dtype=np.int64)
+            absent = np.fromiter((i for i, ok in pending.items() if not ok), dtype=np.int64)
+            ids = self._postings[code]
+            if len(absent):
+                ids = ids[~np.isin(ids, absent)]
+            self._postings[code] = np.union1d(ids, present)
+        return self._postings[code]
+
+    def _candidates(self, pattern):
+        grams = trigrams(pattern)
+        if not grams:
+            return range(len(self._keys))
+        sets = sorted((self._grams.get(g, set()) for g in grams), key=len)
+        return set.intersection(*sets) if sets[0] else ()
+
+    def match_codes(self, text, mode="contains"):
+        text = str(text).lower()
+        if mode == "prefix":
+            return [c for c in self._candidates(START + text) if self._keys[c].startswith(text)]
+        if mode == "equals":
+            code = self._code_of.get(text)
+            return [] if code is None else [code]
+        return [c for c in self._candidates(text) if text in self._keys[c]]
+
+    def lookup(self, text, mode="contains"):
+        arrays = [self._ids_for(c) for c in self.match_codes(text, mode)]
+        arrays = [a for a in arrays if len(a)]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return arrays[0] if len(arrays) == 1 else np.sort(np.concatenate(arrays))
+
+
+class NumericColumnIndex:
+    """
+    Chỉ mục cột số (hoặc ngày): giá trị đã sắp xếp kèm mã dòng, tra cứu khoảng bằng searchsorted.
+    Thay đổi sau khi dựng được giữ riêng và chỉ gộp lại khi dồn đủ nhiều.
+    """
+    def __init__(self, ids, series):
+        self.is_datetime = pd.api.types.is_datetime64_any_dtype(series.dtype)
+        values = self._to_numeric(series)
+        valid = ~np.isnan(values)
+        order = np.argsort(values[valid], kind="stable")
+        self._values = values[valid][order]
+        self._ids = np.asarray(ids, dtype=np.int64)[valid][order]
+        self._pending = {}
+        self._stale = set()
+
+    def _to_numeric(self, values):
+        values = pd.Series(values)
+        if self.is_datetime:
+            dates = pd.to_datetime(values, errors="coerce").to_numpy(dtype="datetime64[ns]")
+            result = dates.view("int64").astype(np.float64)
+            result[np.isnat(dates)] = np.nan
+            return result
+        return pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def _bound(self, value):
+        if value is None:
+            return None
+        return float(self._to_numeric([value])[0])
+
+    def add(self, ids, values):
+        for row_id, value in zip(np.asarray(ids, dtype=np.int64).tolist(), self._to_numeric(values)):
+            self._stale.add(row_id)
+            if not np.isnan(value):
+                self._pending[row_id] = value
+        if len(self._pending) + len(self._stale) > NUMERIC_MERGE_THRESHOLD:
+            self._merge()
+
+    def remove(self, ids, values=None):
+        for row_id in np.asarray(ids, dtype=np.int64).tolist():
+            self._stale.add(row_id)
+            self._pending.pop(row_id, None)
+
+    def _merge(self):
+        keep = ~np.isin(self._ids, np.fromiter(self._stale, dtype=np.int64))
+        ids = np.concatenate([self._ids[keep], np.fromiter(self._pending.keys(), dtype=np.int64)])
+        values = np.concatenate([self._values[keep], np.fromiter(self._pending.values(), dtype=np.float64)])
+        order = np.argsort(values, kind="stable")
+        self._values, self._ids = values[order], ids[order]
+        self._pending, self._stale = {}, set()
+
+    def lookup_range(self, low=None, high=None):
+        """Mã dòng có giá trị trong đoạn [low, high]; bỏ trống một đầu để không giới hạn."""
+        low, high = self._bound(low), self._bound(high)
+        if (low is not None and np.isnan(low)) or (high is not None and np.isnan(high)):
+            return np.empty(0, dtype=np.int64)
+        start = 0 if low is None else np.searchsorted(self._values, low, side="left")
+        stop = len(self._values) if high is None else np.searchsorted(self._values, high, side="right")
+        hits = self._ids[start:stop]
+        if self._stale:
+            hits = hits[~np.isin(hits, np.fromiter(self._stale, dtype=np.int64))]
+        if self._pending:
+            pending_ids = np.fromiter(self._pending.keys(), dtype=np.int64)
+            pending_values = np.fromiter(self._pending.values(), dtype=np.float64)
+            mask = np.ones(len(pending_ids), dtype=bool)
+            if low is not None:
+                mask &= pending_values >= low
+            if high is not None:
+                mask &= pending_values <= high
+            hits = np.concatenate([hits, pending_ids[mask]])
+        return np.sort(hits)
+
+    def lookup(self, value):
+        return self.lookup_range(value, value)
+
+
+class SearchIndex:
+    """
+    Chỉ mục tìm kiếm cho một CovidStats: trigram cho các cột văn bản (dựng ngay khi nạp dữ liệu),
+    mảng sắp xếp cho cột số/ngày (dựng ở lần tra cứu đầu tiên). Chỉ mục tự cập nhật khi
+    CovidStats thêm, sửa hoặc xóa bản ghi.
+    """
+    def __init__(self, model, text_columns=None):
+        self.model = model
+        data = model.data
+        if text_columns is None:
+            text_columns = [col for col in data.columns if not self._is_numeric(data[col].dtype)]
+        ids = model.all_ids()
+        self.text = {col: TextColumnIndex(ids, data[col]) for col in text_columns if col in data.columns}
+        self.numeric = {}
+        model.add_listener(self.on_mutation)
+
+    @staticmethod
+    def _is_numeric(dtype):
+        return (pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)) \
+            or pd.api.types.is_datetime64_any_dtype(dtype)
+
+    def is_numeric(self, column):
+        return column not in self.text and column in self.model.columns and self._is_numeric(self.model.dtype(column))
+
+    def is_datetime(self, column):
+        return self.is_numeric(column) and pd.api.types.is_datetime64_any_dtype(self.model.dtype(column))
+
+    def _numeric_index(self, column):
+        index = self.numeric.get(column)
+        if index is None:
+            index = NumericColumnIndex(self.model.all_ids(), self.model.data[column])
+            self.numeric[column] = index
+        return index
+
+    def contains(self, column, text):
+        return self.text[column].lookup(text, "contains")
+
+    def prefix(self, column, text):
+        return self.text[column].lookup(text, "prefix")
+
+    def equals(self, column, value):
+        if column in self.text:
+            return self.text[column].lookup(value, "equals")
+        return self._numeric_index(column).lookup(value)
+
+    def range(self, column, low=None, high=None):
+        return self._numeric_index(column).lookup_range(low, high)
+
+    def on_mutation(self, mutation):
+        for col in mutation.columns:
+            index = self.text.get(col) or self.numeric.get(col)
+            if index is None:
+                continue
+            if mutation.before is not None:
+                index.remove(mutation.ids, mutation.before[col].to_numpy())
+            if mutation.after is not None:
+                index.add(mutation.ids, mutation.after[col].to_numpy())
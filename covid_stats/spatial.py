@@ -0,0 +1,281 @@
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from covid_stats.analyzer import COUNTRY_COL, DATE_COL, METRICS, PROVINCE_COL
+from covid_stats.schema import COORDINATE_COLUMNS
+
+LAT_COL, LON_COL = COORDINATE_COLUMNS
+# Cạnh ô lưới của chỉ mục (độ)
+CELL_DEGREES = 1.0
+# Ô gộp của bản đồ: khoảng 1/MAP_BINS_ACROSS chiều rộng vùng dữ liệu, giới hạn trong [MIN, MAX] độ
+MAP_BINS_ACROSS = 40
+MIN_MAP_BIN_DEGREES = 0.5
+MAX_MAP_BIN_DEGREES = 5.0
+KM_PER_DEGREE = 111.195
+DISTANCE_COL = "Khoảng cách (km)"
+
+
+def wrap_longitude(lon):
+    """Đưa kinh độ về [-180, 180)."""
+    return (np.asarray(lon, dtype=np.float64) + 180.0) % 360.0 - 180.0
+
+
+class GridIndex:
+    """
+    Lưới đều cell độ × cell độ trên các điểm (vĩ độ, kinh độ). Các điểm được sắp theo mã ô
+    (hàng × số cột + cột), nên các ô liền nhau trên một hàng lưới là một đoạn liên tục tìm bằng
+    searchsorted: truy vấn khung chữ nhật chỉ xét các điểm trong những ô giao với khung.
+    """
+    def __init__(self, lat, lon, cell=CELL_DEGREES):
+        # Cạnh ô được làm tròn để chia hết 180 độ, nhờ đó lưới quấn vòng đúng qua kinh tuyến 180
+        self.n_rows = int(math.ceil(180.0 / cell))
+        self.n_cols = 2 * self.n_rows
+        self.cell = 180.0 / self.n_rows
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = wrap_longitude(lon)
+        points = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lon))
+        codes = self._row(self.lat[points]) * self.n_cols + self._col(self.lon[points])
+        order = np.argsort(codes, kind="stable")
+        self.points = points[order]
+        self.codes = codes[order]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _row(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90.0) / self.cell), 0, self.n_rows - 1).astype(np.int64)
+
+    def _col(self, lon):
+        return np.clip(np.floor((np.asarray(lon) + 180.0) / self.cell), 0, self.n_cols - 1).astype(np.int64)
+
+    def _span(self, row, col0, col1):
+        # Các điểm trong các ô (row, col0..col1) của một hàng lưới
+        lo = np.searchsorted(self.codes, row * self.n_cols + col0, side="left")
+        hi = np.searchsorted(self.codes, row * self.n_cols + col1, side="right")
+        return self.points[lo:hi]
+
+    def _block(self, row0, row1, col0, col1):
+        # Các điểm trong khối ô; cột được lấy theo vòng (col0 có thể âm, col1 có thể vượt số cột)
+        if col1 - col0 + 1 >= self.n_cols:
+            col_ranges = [(0, self.n_cols - 1)]
+        elif col0 < 0:
+            col_ranges = [(col0 + self.n_cols, self.n_cols - 1), (0, col1)]
+        elif col1 >= self.n_cols:
+            col_ranges = [(col0, self.n_cols - 1), (0, col1 - self.n_cols)]
+        else:
+            col_ranges = [(col0, col1)]
+        parts = [self._span(row, c0, c1) for row in range(row0, row1 + 1) for c0, c1 in col_ranges]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def bbox(self, lat_min, lat_max, lon_min, lon_max):
+        """Chỉ số các điểm nằm trong khung; lon_min > lon_max là khung vắt qua kinh tuyến 180."""
+        # Kinh độ 180 giữ nguyên (mép phải của lưới), các giá trị khác đưa về [-180, 180)
+        lon_min = float(wrap_longitude(lon_min))
+        lon_max = 180.0 if lon_max >= 180 else float(wrap_longitude(lon_max))
+        if lon_min > lon_max:
+            return np.concatenate([self.bbox(lat_min, lat_max, lon_min, 180.0),
+                                   self.bbox(lat_min, lat_max, -180.0, lon_max)])
+        candidates = self._block(int(self._row(lat_min)), int(self._row(lat_max)),
+                                 int(self._col(lon_min)), int(self._col(lon_max)))
+        lat, lon = self.lat[candidates], self.lon[candidates]
+        inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        return candidates[inside]
+
+    def distances(self, lat, lon, points):
+        """
+        Khoảng cách (km) từ (lat, lon) tới các điểm, theo phép chiếu phẳng quanh điểm cần tìm
+        (kinh độ nhân cos vĩ độ); đủ chính xác ở cự ly vài trăm km.
+        """
+        scale = math.cos(math.radians(lat))
+        dy = self.lat[points] - lat
+        dx = wrap_longitude(self.lon[points] - lon) * scale
+        return np.hypot(dx, dy) * KM_PER_DEGREE
+
+    def nearest(self, lat, lon, k=1):
+        """
+        k điểm gần (lat, lon) nhất: (chỉ số, khoảng cách km), gần trước. Tìm trong khối ô quanh
+        điểm, nới rộng gấp đôi tới khi điểm thứ k gần hơn mọi điểm nằm ngoài khối.
+        """
+        if not len(self.points) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        lon = float(wrap_longitude(lon))
+        row, col = int(self._row(lat)), int(self._col(lon))
+        scale = math.cos(math.radians(lat))
+        radius = 1
+        while True:
+            row0, row1 = max(row - radius, 0), min(row + radius, self.n_rows - 1)
+            candidates = self._block(row0, row1, col - radius, col + radius)
+            covers_all = row0 == 0 and row1 == self.n_rows - 1 and 2 * radius + 1 >= self.n_cols
+            if len(candidates) >= k or covers_all:
+                dist = self.distances(lat, lon, candidates)
+                order = np.argsort(dist, kind="stable")[:k]
+                # Điểm ngoài khối cách ít nhất khoảng từ điểm cần tìm tới mép khối
+                margins = []
+                if row0 > 0:
+                    margins.append(lat - (row0 * self.cell - 90.0))
+                if row1 < self.n_rows - 1:
+                    margins.append((row1 + 1) * self.cell - 90.0 - lat)
+                if 2 * radius + 1 < self.n_cols:
+                    margins.append(min(lon - ((col - radius) * self.cell - 180.0),
+                                       (col + radius + 1) * self.cell - 180.0 - lon) * scale)
+                bound = min(margins) * KM_PER_DEGREE if margins else np.inf
+                if covers_all or (len(order) == k and dist[order[-1]] <= bound):
+                    return candidates[order], dist[order]
+            radius *= 2
+
+
+class SpatialIndex:
+    """
+    Chỉ mục không gian của dữ liệu ca bệnh: mỗi địa điểm (một cặp vĩ độ/kinh độ) giữ danh sách mã
+    dòng của nó và số liệu của ngày gần nhất; GridIndex trên các địa điểm trả lời truy vấn khung
+    chữ nhật và địa điểm gần nhất mà không duyệt mọi dòng, và gộp số ca theo ô cho bản đồ.
+    Khi gắn với CovidStats (attach), thay đổi liên quan (thêm/xóa dòng, sửa tọa độ, ngày, số liệu)
+    đánh dấu chỉ mục cũ; refresh() (gọi trên luồng giao diện) dựng lại trước lần dùng kế tiếp.
+    """
+    def __init__(self, df: pd.DataFrame, cell=CELL_DEGREES):
+        self.lock = threading.RLock()
+        self.cell = cell
+        self.model = None
+        self.version = 0
+        self._stale = False
+        self._build(df)
+
+    def _build(self, df):
+        n = len(df)
+
+        def numeric(col, positions=None):
+            if col not in df.columns:
+                return np.full(n if positions is None else len(positions), np.nan)
+            values = df[col] if positions is None else df[col].iloc[positions]
+            return pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+        lat, lon = numeric(LAT_COL), numeric(LON_COL)
+        rows = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        # Mã địa điểm: mã hóa riêng vĩ độ và kinh độ rồi mã hóa cặp mã (nhanh hơn nhiều so với MultiIndex)
+        lat_codes, lat_values = pd.factorize(lat[rows])
+        lon_codes, lon_values = pd.factorize(lon[rows])
+        codes, pairs = pd.factorize(lat_codes.astype(np.int64) * max(len(lon_values), 1) + lon_codes)
+        codes = codes.astype(np.int64)
+        n_locations = len(pairs)
+        # Mã dòng theo địa điểm (dạng CSR): dòng của địa điểm i là row_ids[starts[i]:starts[i + 1]]
+        order = np.argsort(codes, kind="stable")
+        self.row_ids = df.index.to_numpy(dtype=np.int64)[rows[order]]
+        self.starts = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n_locations))]).astype(np.int64)
+        first = rows[order[self.starts[:-1]]]
+        # Số liệu của ngày gần nhất của từng địa điểm (dòng sau cùng nếu trùng ngày)
+        latest = rows[order[self.starts[1:] - 1]] if n_locations else first
+        if DATE_COL in df.columns and n_locations:
+            dates = df[DATE_COL]
+            if not pd.api.types.is_datetime64_any_dtype(dates.dtype):
+                dates = pd.to_datetime(dates, errors="coerce")
+            dates = dates.to_numpy(dtype="datetime64[ns]").view(np.int64)[rows]
+            newest = np.full(n_locations, np.iinfo(np.int64).min)
+            np.maximum.at(newest, codes, dates)
+            on_newest = dates == newest[codes]
+            latest = np.empty(n_locations, dtype=np.int64)
+            latest[codes[on_newest]] = rows[on_newest]
+
+        def labels(col):
+            if col not in df.columns:
+                return np.full(n_locations, "", dtype=object)
+            return df[col].iloc[first].astype(object).to_numpy()
+
+        self.provinces = labels(PROVINCE_COL)
+        self.countries = labels(COUNTRY_COL)
+        self.latest = np.column_stack([np.nan_to_num(numeric(m, latest)) for m in METRICS]) \
+            if n_locations else np.empty((0, len(METRICS)))
+        self.grid = GridIndex(lat_values[pairs // max(len(lon_values), 1)], lon_values[pairs % max(len(lon_values), 1)],
+                              self.cell)
+
+    # --- Gắn với CovidStats ---
+    def attach(self, model):
+        self.model = model
+        model.add_listener(self.on_mutation)
+        return self
+
+    def detach(self):
+        if self.model is not None:
+            self.model.remove_listener(self.on_mutation)
+            self.model = None
+
+    def on_mutation(self, mutation):
+        touched = set(mutation.columns) & {LAT_COL, LON_COL, DATE_COL, COUNTRY_COL, PROVINCE_COL, *METRICS}
+        if mutation.kind != "update" or touched:
+            with self.lock:
+                self._stale = True
+                self.version += 1
+
+    def refresh(self):
+        """Dựng lại chỉ mục nếu dữ liệu đã đổi (đọc model.data nên chỉ gọi trên luồng giao diện)."""
+        if self._stale and self.model is not None:
+            with self.lock:
+                self._build(self.model.data)
+                self._stale = False
+
+    # --- Truy vấn ---
+    def __len__(self):
+        return len(self.grid.lat)
+
+    def location_rows(self, locations):
+        """Mã dòng của các địa điểm."""
+        locations = np.asarray(locations, dtype=np.int64)
+        if not len(locations):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.row_ids[self.starts[i]:self.starts[i + 1]] for i in locations])
+
+    def bbox(self, lat_min, lat_max, lon_min, lon_max):
+        """Chỉ số các địa điểm trong khung (xem location_rows để lấy mã dòng)."""
+        self.refresh()
+        with self.lock:
+            return self.grid.bbox(lat_min, lat_max, lon_min, lon_max)
+
+    def bbox_rows(self, lat_min, lat_max, lon_min, lon_max):
+        """Mã dòng của mọi bản ghi có tọa độ nằm trong khung."""
+        with self.lock:
+            return self.location_rows(self.bbox(lat_min, lat_max, lon_min, lon_max))
+
+    def nearest(self, lat, lon, k=1):
+        """DataFrame k địa điểm gần nhất (gần trước) kèm khoảng cách và số liệu ngày gần nhất."""
+        self.refresh()
+        with self.lock:
+            locations, dist = self.grid.nearest(lat, lon, k)
+            result = pd.DataFrame({
+                PROVINCE_COL: self.provinces[locations],
+                COUNTRY_COL: self.countries[locations],
+                LAT_COL: self.grid.lat[locations],
+                LON_COL: self.grid.lon[locations],
+                DISTANCE_COL: dist,
+            }, index=pd.Index(locations, name="Địa điểm"))
+            for m, metric in enumerate(METRICS):
+                result[metric] = self.latest[locations, m]
+            return result
+
+    def binned(self, metric="Ca xác nhận", countries=None, bin_degrees=None):
+        """
+        Tổng số liệu ngày gần nhất của các địa điểm theo ô bin_degrees độ (mặc định chọn theo độ
+        rộng vùng dữ liệu). Trả về (vĩ độ tâm ô, kinh độ tâm ô, tổng, số địa điểm, cạnh ô).
+        countries: chỉ lấy các quốc gia này (None là mọi quốc gia).
+        """
+        with self.lock:
+            lat, lon = self.grid.lat, self.grid.lon
+            values = self.latest[:, METRICS.index(metric)]
+            keep = np.isfinite(lat) & np.isfinite(lon)
+            if countries is not None:
+                keep &= np.isin(self.countries, list(countries))
+            lat, lon, values = lat[keep], lon[keep], values[keep]
+        if not len(lat):
+            return np.empty(0), np.empty(0), np.empty(0), np.empty(0, dtype=np.int64), bin_degrees
+        if bin_degrees is None:
+            extent = max(lat.max() - lat.min(), lon.max() - lon.min())
+            bin_degrees = float(np.clip(extent / MAP_BINS_ACROSS, MIN_MAP_BIN_DEGREES, MAX_MAP_BIN_DEGREES))
+        bins = GridIndex(lat, lon, bin_degrees)
+        bin_degrees = bins.cell
+        codes, first = np.unique(bins.codes, return_index=True)
+        totals = np.add.reduceat(values[bins.points], first)
+        counts = np.diff(np.append(first, len(bins.points)))
+        centers_lat = (codes // bins.n_cols + 0.5) * bin_degrees - 90.0
+        centers_lon = (codes % bins.n_cols + 0.5) * bin_degrees - 180.0
+        return centers_lat, centers_lon, totals, counts, bin_degrees
@@ -0,0 +1,222 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Số sự kiện tối đa giữ lại để xuất trace (sự kiện cũ nhất bị bỏ trước)
+MAX_EVENTS = 100_000
+
+
+class Span:
+    """
+    Một khoảng thời gian được đo. Dùng với with (span đồng bộ) hoặc tạo bằng Tracer.begin()
+    rồi gọi end() (thao tác bất đồng bộ như đọc file nền, tính biểu đồ trên luồng phụ).
+    Span loại "stage" cộng thời gian của mình vào stages của span gốc theo tên, nên thao tác
+    gốc biết mỗi giai đoạn (load, aggregate, render, treeview_fill...) tốn bao lâu.
+    """
+    __slots__ = ("tracer", "name", "cat", "args", "parent", "start", "stop", "stages", "tid", "_pushed")
+
+    def __init__(self, tracer, name, cat="ui", parent=None, args=None):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.parent = parent
+        self.start = None
+        self.stop = None
+        self.stages = {}
+        self.tid = None
+        self._pushed = False
+
+    @property
+    def seconds(self):
+        end = self.stop if self.stop is not None else time.perf_counter_ns()
+        return (end - self.start) / 1e9 if self.start is not None else 0.0
+
+    def begin(self, start=None):
+        self.start = time.perf_counter_ns() if start is None else start
+        self.tid = threading.get_ident()
+        return self
+
+    def end(self, cancelled=False):
+        if self.stop is not None:
+            return
+        self.stop = time.perf_counter_ns()
+        if cancelled:
+            self.args = dict(self.args or {}, cancelled=True)
+        self.tracer._finish(self, cancelled)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if self.parent is None and stack:
+            self.parent = stack[-1]
+        stack.append(self)
+        self._pushed = True
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._pushed:
+            self.tracer._stack().pop()
+        if exc_type is not None:
+            self.args = dict(self.args or {}, error=exc_type.__name__)
+        self.end()
+        return False
+
+
+class _NullSpan:
+    """Span rỗng dùng khi tắt đo (chi phí gần như bằng 0)."""
+    seconds = 0.0
+    parent = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def begin(self, start=None):
+        return self
+
+    def end(self, cancelled=False):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Ghi lại các span vào một bộ đệm vòng. Span gốc (không có cha) kết thúc trên luồng chính là
+    một thao tác của người dùng: các listener (vd. thanh trạng thái) được gọi với span đó.
+    export_chrome_trace() ghi bộ đệm ra JSON định dạng Chrome trace-event (mở bằng chrome://tracing
+    hoặc Perfetto).
+    """
+    def __init__(self, max_events=MAX_EVENTS):
+        self.enabled = True
+        self.events = deque(maxlen=max_events)
+        self.last_action = None
+        self._listeners = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def add_listener(self, callback):
+        """callback(span) được gọi khi một thao tác (span gốc trên luồng chính) kết thúc."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def span(self, name, cat="ui", parent=None, **args):
+        """Context manager đo một đoạn code; lồng trong span khác thì thành một giai đoạn của nó."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, cat, parent, args or None)
+
+    def stage(self, name, parent=None, **args):
+        """Span của một giai đoạn (load, aggregate, render, treeview_fill...) trong thao tác đang chạy."""
+        return self.span(name, "stage", parent, **args)
+
+    def begin(self, name, cat="ui", parent=None, start=None, **args):
+        """
+        Bắt đầu một span kết thúc sau (gọi end()), có thể qua nhiều lần after() hoặc luồng khác.
+        start (giá trị time.perf_counter_ns()) cho phép tính từ một thời điểm đã ghi trước đó.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, cat, parent, args or None).begin(start)
+
+    @contextlib.contextmanager
+    def within(self, span):
+        """Các span mở bên trong khối with này là con của span (bắt đầu bằng begin() từ trước)."""
+        if span is NULL_SPAN or span is None:
+            yield span
+            return
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+
+    def traced(self, name=None, cat="ui"):
+        """Decorator: mỗi lần gọi hàm là một span (tên mặc định là tên hàm)."""
+        def decorate(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, span_name, cat):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _finish(self, span, cancelled):
+        duration = span.stop - span.start
+        self.events.append((span.name, span.cat, span.start, duration, span.tid, span.args))
+        if span.parent is None:
+            if not cancelled and threading.current_thread() is threading.main_thread():
+                self.last_action = span
+                for callback in list(self._listeners):
+                    callback(span)
+            return
+        if span.cat == "stage":
+            root = span.parent
+            while root.parent is not None:
+                root = root.parent
+            if root is not NULL_SPAN:
+                with self._lock:
+                    root.stages[span.name] = root.stages.get(span.name, 0) + duration
+
+    def clear(self):
+        self.events.clear()
+        self.last_action = None
+
+    def chrome_events(self):
+        pid = os.getpid()
+        events = []
+        for name, cat, start, duration, tid, args in list(self.events):
+            event = {"name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+                     "ts": (start - self._origin) / 1000, "dur": duration / 1000}
+            if args:
+                event["args"] = {k: v if isinstance(v, (int, float, bool)) or v is None else str(v)
+                                 for k, v in args.items()}
+            events.append(event)
+        return events
+
+    def export_chrome_trace(self, path):
+        """Ghi trace ra file JSON; trả về số sự kiện đã ghi."""
+        events = self.chrome_events()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        return len(events)
+
+
+def describe(span, max_stages=4):
+    """Mô tả ngắn một thao tác: tổng thời gian và các giai đoạn lâu nhất."""
+    text = f"{span.name}: {span.seconds * 1000:.1f} ms"
+    stages = sorted(span.stages.items(), key=lambda item: -item[1])[:max_stages]
+    if stages:
+        text += " (" + ", ".join(f"{name} {ns / 1e6:.1f} ms" for name, ns in stages) + ")"
+    return text
+
+
+# Tracer dùng chung cho cả chương trình
+TRACER = Tracer()
+span = TRACER.span
+stage = TRACER.stage
+begin = TRACER.begin
+within = TRACER.within
+traced = TRACER.traced
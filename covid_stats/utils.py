@@ -0,0 +1,80 @@
+import numpy as np
+
+
+def minmax_downsample(x, y, n_bins):
+    """
+    Giảm số điểm của chuỗi dài bằng cách giữ điểm nhỏ nhất và lớn nhất trong mỗi nhóm,
+    nên các đỉnh/đáy vẫn còn trên biểu đồ. Trả về (x, y) tối đa 2 * n_bins điểm.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_bins <= 0 or n <= 2 * n_bins:
+        return x, y
+    edges = np.linspace(0, n, n_bins + 1).astype(np.int64)
+    starts, stops = edges[:-1], edges[1:]
+    filled = np.nan_to_num(y, nan=0.0)
+    # Vị trí min/max trong từng nhóm, tính bằng reduceat trên toàn mảng
+    mins = np.minimum.reduceat(filled, starts)
+    maxs = np.maximum.reduceat(filled, starts)
+    index = np.arange(n)
+    group = np.repeat(np.arange(n_bins), stops - starts)
+    is_min = filled == mins[group]
+    is_max = filled == maxs[group]
+    first_min = np.full(n_bins, n, dtype=np.int64)
+    first_max = np.full(n_bins, n, dtype=np.int64)
+    np.minimum.at(first_min, group[is_min], index[is_min])
+    np.minimum.at(first_max, group[is_max], index[is_max])
+    keep = np.unique(np.concatenate([first_min, first_max]))
+    return x[keep], y[keep]
+
+
+def lttb_indices(x, y, threshold):
+    """Chỉ số các điểm được giữ lại theo thuật toán Largest-Triangle-Three-Buckets."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64), nan=0.0)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Điểm trung bình của nhóm kế tiếp làm đỉnh thứ ba của tam giác
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        if next_stop <= next_start:
+            next_start, next_stop = n - 1, n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def lttb(x, y, threshold):
+    """Giảm chuỗi (x, y) còn threshold điểm, giữ hình dạng trực quan của đường."""
+    keep = lttb_indices(x, y, threshold)
+    return np.asarray(x)[keep], np.asarray(y)[keep]
+
+
+def bin_by_width(x, values, max_bins):
+    """
+    Chia trục x (ví dụ số ngày) thành tối đa max_bins khoảng có cùng độ rộng nguyên và lấy trung
+    bình các dòng của values (n, k) trong mỗi khoảng. Khoảng trống (không có dòng nào) bị bỏ qua.
+    Trả về (cạnh trái của từng khoảng, giá trị trung bình, độ rộng một khoảng).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    if not len(x):
+        return x, values, 1
+    low = np.floor(x.min())
+    width = max(1, int(np.ceil((x.max() - low + 1) / max(max_bins, 1))))
+    codes = ((x - low) // width).astype(np.int64)
+    used, codes = np.unique(codes, return_inverse=True)
+    counts = np.bincount(codes, minlength=len(used))
+    means = np.column_stack([np.bincount(codes, weights=values[:, k], minlength=len(used))
+                             for k in range(values.shape[1])]) / counts[:, None]
+    return low + used * width, means, width
@@ -1,5 +1,7 @@
 import tkinter as tk
 
+from covid_stats.schema import display_value
+
 class RecordModal(tk.Toplevel):
     def __init__(self, master, columns, on_save, init_values=None):
         super().__init__(master)
@@ -14,7 +16,7 @@ class RecordModal(tk.Toplevel):
 
             # nếu có giá trị truyền qua, điền vào ô nhập
             if init_values and col in init_values:
-                entry.insert(0, str(init_values[col]))
+                entry.insert(0, str(display_value(init_values[col])))
 
             self.entries[col] = entry # lưu trữ các ô nhập vào từ điển để dễ dàng truy cập
 
@@ -0,0 +1,142 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+import numpy as np
+import pandas as pd
+
+from covid_stats.analyzer import ANALYTICS, SeriesAnalytics
+from covid_stats import tracing
+
+LEVELS = ["Quốc gia", "Tỉnh/Bang"]
+ORDERS = ["Giảm dần", "Tăng dần"]
+TOP_CHOICES = ["20", "50", "100", "500", "Tất cả"]
+RANK_COLUMNS = ["Hạng", "Tên"] + ANALYTICS
+# Chỉ số hiển thị dạng số nguyên
+COUNT_ANALYTICS = ("Ca xác nhận", "Ca mới")
+
+
+def format_metric(name, value):
+    if pd.isna(value):
+        return ""
+    if name in COUNT_ANALYTICS:
+        return f"{value:,.0f}"
+    return f"{value:,.2f}"
+
+
+class TabAnalysis(ttk.Frame):
+    """
+    Xếp hạng quốc gia hoặc tỉnh/bang theo một chỉ số phân tích (trung bình 7 ngày, tốc độ tăng,
+    thời gian nhân đôi, tỉ lệ tử vong...) tại một ngày. Các chỉ số được tính một lần cho mọi chuỗi
+    (SeriesAnalytics) và giữ lại cho tới khi dữ liệu thay đổi, nên đổi chỉ số hay ngày chỉ cần sắp xếp lại.
+    Bấm vào tiêu đề cột để xếp hạng theo cột đó.
+    """
+    def __init__(self, master):
+        super().__init__(master)
+        self.model = None
+        self.cube = None
+        self.analytics = {}
+        self.level = tk.StringVar(value=LEVELS[0])
+        self.metric = tk.StringVar(value="Ca mới (TB 7 ngày)")
+        self.order = tk.StringVar(value=ORDERS[0])
+        self.top = tk.StringVar(value=TOP_CHOICES[1])
+        self.date = tk.StringVar()
+        self.create_widgets()
+
+    def create_widgets(self):
+        tk.Label(self, text="Phân tích chuỗi thời gian", font=("Segoe UI", 14, "bold")).pack(pady=10)
+
+        option_frame = tk.Frame(self)
+        option_frame.pack(pady=5)
+        tk.Label(option_frame, text="Theo:").grid(row=0, column=0, padx=(0, 2))
+        level_box = ttk.Combobox(option_frame, textvariable=self.level, values=LEVELS, width=10, state="readonly")
+        level_box.grid(row=0, column=1, padx=4)
+        tk.Label(option_frame, text="Chỉ số:").grid(row=0, column=2, padx=(10, 2))
+        metric_box = ttk.Combobox(option_frame, textvariable=self.metric, values=ANALYTICS, width=26, state="readonly")
+        metric_box.grid(row=0, column=3, padx=4)
+        tk.Label(option_frame, text="Ngày:").grid(row=0, column=4, padx=(10, 2))
+        self.date_box = ttk.Combobox(option_frame, textvariable=self.date, width=12, state="readonly")
+        self.date_box.grid(row=0, column=5, padx=4)
+        order_box = ttk.Combobox(option_frame, textvariable=self.order, values=ORDERS, width=9, state="readonly")
+        order_box.grid(row=0, column=6, padx=4)
+        tk.Label(option_frame, text="Hiển thị:").grid(row=0, column=7, padx=(10, 2))
+        top_box = ttk.Combobox(option_frame, textvariable=self.top, values=TOP_CHOICES, width=7, state="readonly")
+        top_box.grid(row=0, column=8, padx=4)
+        ttk.Button(option_frame, text="Xếp hạng", command=self.show_ranking).grid(row=0, column=9, padx=(10, 0))
+        for box in (level_box, metric_box, self.date_box, order_box, top_box):
+            box.bind("<<ComboboxSelected>>", lambda event: self.show_ranking())
+
+        self.status_label = tk.Label(self, text="Chưa có dữ liệu", fg="gray")
+        self.status_label.pack(pady=5)
+
+        table_frame = tk.Frame(self)
+        table_frame.pack(fill="both", expand=True, padx=10, pady=5)
+        self.table = ttk.Treeview(table_frame, columns=RANK_COLUMNS, show="headings")
+        for col in RANK_COLUMNS:
+            self.table.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            self.table.column(col, width=50 if col == "Hạng" else (200 if col == "Tên" else 130),
+                              anchor="w" if col == "Tên" else "e")
+        scroll = ttk.Scrollbar(table_frame, orient="vertical", command=self.table.yview)
+        self.table.configure(yscrollcommand=scroll.set)
+        scroll.pack(side="right", fill="y")
+        self.table.pack(side="left", fill="both", expand=True)
+
+    def update_model(self, model, cube=None):
+        """
+        Dữ liệu mới: chuỗi theo quốc gia lấy từ khối cube (dùng chung với tab biểu đồ),
+        chuỗi theo tỉnh/bang nhóm từ model khi cần.
+        """
+        self.model = model
+        self.cube = cube
+        self.analytics = {}
+        self.table.delete(*self.table.get_children())
+        analytics = self.get_analytics(LEVELS[0]) if model is not None else None
+        dates = [str(d) for d in analytics.dates] if analytics is not None else []
+        self.date_box["values"] = dates[::-1]
+        self.date.set(str(analytics.reporting_day()) if dates else "")
+        self.status_label.config(text="Chọn chỉ số để xếp hạng" if dates else "Chưa có dữ liệu")
+
+    def data_version(self):
+        return self.model.version if self.model is not None else None
+
+    def get_analytics(self, level):
+        """Chỉ số của mọi chuỗi ở một cấp, dựng lại khi model đã thay đổi kể từ lần dựng trước."""
+        version = self.data_version()
+        cached = self.analytics.get(level)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with tracing.stage("analytics"):
+            if level == LEVELS[0] and self.cube is not None:
+                analytics = SeriesAnalytics.from_cube(self.cube)
+            else:
+                analytics = SeriesAnalytics.from_frame(self.model.data)
+        self.analytics[level] = (version, analytics)
+        return analytics
+
+    def sort_by(self, column):
+        if column not in ANALYTICS:
+            return
+        if column == self.metric.get():
+            self.order.set(ORDERS[1] if self.order.get() == ORDERS[0] else ORDERS[0])
+        else:
+            self.metric.set(column)
+        self.show_ranking()
+
+    def show_ranking(self):
+        if self.model is None:
+            messagebox.showwarning("Chưa có dữ liệu", "Vui lòng nạp dữ liệu trước.")
+            return
+        metric = self.metric.get()
+        top = None if self.top.get() == "Tất cả" else int(self.top.get())
+        with tracing.span("rank_analysis", metric=metric, level=self.level.get()):
+            analytics = self.get_analytics(self.level.get())
+            with tracing.stage("rank"):
+                ranking = analytics.rank(metric, self.date.get() or None,
+                                         ascending=self.order.get() == ORDERS[1], top=top)
+            with tracing.stage("treeview_fill"):
+                self.table.delete(*self.table.get_children())
+                for row in ranking.itertuples(index=False, name=None):
+                    values = list(row[:2]) + [format_metric(name, v) for name, v in zip(ANALYTICS, row[2:])]
+                    self.table.insert("", tk.END, values=values)
+        total = int(np.sum(analytics.first_day <= analytics.day_index(self.date.get() or None)))
+        self.status_label.config(text=f"{metric} ({self.order.get().lower()}) — "
+                                      f"{len(ranking)}/{total} {self.level.get().lower()}")
@@ -2,6 +2,11 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import pandas as pd
 import os
+from covid_stats.data_loader import DataLoader, BackgroundLoad
+from covid_stats.exporter import EXPORT_FILETYPES, StreamingExporter
+from covid_stats.cleaning import STEP_TYPES, StreamingCleaner, build_pipeline
+from covid_stats.profiler import Profiler, PROFILE_COLUMNS
+from covid_stats import tracing
 
 class TabCleaning(ttk.Frame):
     def __init__(self, master, dataframe: pd.DataFrame = None, on_cleaned_callback=None):
@@ -9,12 +14,18 @@ class TabCleaning(ttk.Frame):
         self.dataframe = dataframe
         self.cleaned = False
         self.on_cleaned_callback = on_cleaned_callback
+        self.load_job = None
+        self.stream_job = None
+        self.stream_span = None
+        self.export_job = None
+        self.profiler = None
         self.cleaning_options = {
             "autofill_missing": tk.BooleanVar(value=True),
             "remove_duplicates": tk.BooleanVar(value=True),
-            # "standardize_case": tk.BooleanVar(value=True),
-            # "convert_date": tk.BooleanVar(value=True),
-            # "drop_unused_columns": tk.BooleanVar(value=False),
+            "standardize_case": tk.BooleanVar(value=False),
+            "convert_date": tk.BooleanVar(value=False),
+            "drop_unused_columns": tk.BooleanVar(value=False),
+            "clamp_negative": tk.BooleanVar(value=False),
         }
         self.create_widgets()
 
@@ -22,13 +33,7 @@ class TabCleaning(ttk.Frame):
         tk.Label(self, text="Tùy chọn làm sạch dữ liệu", font=("Segoe UI", 14)).pack(pady=10)
 
         for key, var in self.cleaning_options.items():
-            label = {
-                "autofill_missing": "Tự động điền dữ liệu bị khuyết (NaN)",
-                "remove_duplicates": "Xóa dữ liệu trùng lặp",
-                # "standardize_case": "Chuẩn hóa chữ hoa/thường",
-                # "convert_date": "Chuyển định dạng ngày (nếu có cột ngày)",
-                # "drop_unused_columns": "Loại bỏ cột không cần thiết (cột toàn NaN)"
-            }.get(key, key)
+            label = STEP_TYPES[key].label if key in STEP_TYPES else key
 
             tk.Checkbutton(self, text=label, variable=var).pack(anchor="w", padx=20)
         
@@ -39,140 +44,248 @@ class TabCleaning(ttk.Frame):
        
         ttk.Button(button_frame, text="Thực hiện làm sạch", command=self.clean_data).grid(row=0,column=2,padx=4)
         ttk.Button(button_frame, text="Lưu dữ liệu đã làm sạch", command=self.save_cleaned_file).grid(row=0,column=3,padx=4)
+        self.cancel_button = ttk.Button(button_frame, text="Hủy đọc file", command=self.cancel_import, state="disabled")
+        self.cancel_button.grid(row=0,column=4,padx=4)
+        ttk.Button(button_frame, text="Làm sạch file lớn (theo khối)", command=self.clean_large_file).grid(row=0,column=5,padx=4)
         # ttk.Button(self, text="Lưu dữ liệu đã làm sạch", command=self.save_cleaned_file).grid(row=0,column=4,padx=4)
         
         self.status_label = tk.Label(self, text="Chưa có dữ liệu", fg="gray")
         self.status_label.pack(pady=5)
 
+        # Bảng hồ sơ dữ liệu: mỗi dòng là thống kê của một cột
+        self.summary_label = tk.Label(self, text="", justify="left")
+        self.summary_label.pack(anchor="w", padx=20)
+        profile_frame = tk.Frame(self)
+        profile_frame.pack(fill="both", expand=True, padx=20, pady=5)
+        self.profile_table = ttk.Treeview(profile_frame, columns=PROFILE_COLUMNS, show="headings", height=10)
+        for col in PROFILE_COLUMNS:
+            self.profile_table.heading(col, text=col)
+            self.profile_table.column(col, width=120 if col == "Cột" else 95)
+        profile_scroll = ttk.Scrollbar(profile_frame, orient="vertical", command=self.profile_table.yview)
+        self.profile_table.configure(yscrollcommand=profile_scroll.set)
+        profile_scroll.pack(side="right", fill="y")
+        self.profile_table.pack(side="left", fill="both", expand=True)
+
+    def is_exporting(self):
+        # Luồng lưu file đang đọc self.dataframe nên không cho nhập/làm sạch cho tới khi lưu xong
+        if self.export_job and not self.export_job.finished:
+            messagebox.showwarning("Đang lưu", "Dữ liệu đang được lưu ra file, vui lòng đợi hoặc hủy.")
+            return True
+        return False
+
     def import_file(self):
+        if self.is_exporting():
+            return
         file_path = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
         if file_path:
-            try:
-                self.dataframe = pd.read_csv(file_path)
-                self.cleaned = False
-                self.status_label.config(text=f"Đã tải file: {os.path.basename(file_path)}")
-            except Exception as e:
-                messagebox.showerror("Lỗi", f"Không đọc được file CSV:\n{e}")
+            if self.load_job and not self.load_job.finished:
+                self.load_job.cancel()
+                self.load_job.span.end(cancelled=True)
+            span = tracing.begin("import_file", file=os.path.basename(file_path))
+            self.load_job = BackgroundLoad(DataLoader(file_path), span=span).start()
+            self.cancel_button.config(state="normal")
+            self.status_label.config(text=f"Đang đọc file: {os.path.basename(file_path)}")
+            self.after(100, self.poll_import, self.load_job)
+            return
 
         if self.dataframe is None:
             messagebox.showwarning("Chưa có dữ liệu", "Vui lòng nhập file CSV trước.")
             return
 
-        self.check_data_issues()  
-        
+        self.check_data_issues()
+
+    def poll_import(self, job):
+        if job is not self.load_job:
+            return
+        job.poll()
+        file_name = os.path.basename(job.loader.filepath)
+        if not job.finished:
+            self.status_label.config(text=f"Đang đọc file: {file_name} ({job.rows_read} dòng, {job.progress():.0%})")
+            self.after(100, self.poll_import, job)
+            return
+
+        self.load_job = None
+        if not self.stream_job and not self.export_job:
+            self.cancel_button.config(state="disabled")
+        if job.error is not None:
+            job.span.end(cancelled=True)
+            messagebox.showerror("Lỗi", f"Không đọc được file CSV:\n{job.error}")
+        elif job.cancelled:
+            job.span.end(cancelled=True)
+            self.status_label.config(text=f"Đã hủy đọc file: {file_name}")
+            return
+        else:
+            self.dataframe = job.result
+            self.cleaned = False
+            self.invalidate_profile()
+            self.status_label.config(text=f"Đã tải file: {file_name}")
+            job.span.end()
+
+        if self.dataframe is None:
+            messagebox.showwarning("Chưa có dữ liệu", "Vui lòng nhập file CSV trước.")
+            return
+
+        self.check_data_issues()
+
+    def cancel_import(self):
+        if self.load_job:
+            self.load_job.cancel()
+        if self.stream_job:
+            self.stream_job.cancel()
+        if self.export_job:
+            self.export_job.cancel()
+
+    def clean_large_file(self):
+        """Làm sạch một file CSV theo từng khối và ghi thẳng ra file mới, không nạp cả file vào RAM."""
+        if self.stream_job and not self.stream_job.finished:
+            messagebox.showwarning("Đang làm sạch", "Đang làm sạch một file khác, vui lòng đợi hoặc hủy.")
+            return
+        input_path = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv")])
+        if not input_path:
+            return
+        # Làm sạch theo khối đọc thẳng file CSV nên không thấy các thay đổi còn nằm trong nhật ký
+        if DataLoader(input_path).has_pending_changes() and not messagebox.askyesno(
+                "Thay đổi chưa gộp",
+                "File này còn thay đổi trong nhật ký chưa được gộp vào file CSV; các thay đổi đó sẽ không có "
+                "trong file kết quả (dùng \"Nhập file CSV\" để làm sạch cả các thay đổi đó).\n\nVẫn tiếp tục?"):
+            return
+        output_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if not output_path:
+            return
+        options = {key: var.get() for key, var in self.cleaning_options.items()}
+        try:
+            self.stream_job = StreamingCleaner(input_path, output_path, options=options).start()
+        except ValueError as e:
+            messagebox.showerror("Lỗi khi làm sạch", str(e))
+            return
+        self.stream_span = tracing.begin("clean_large_file", file=os.path.basename(input_path))
+        self.cancel_button.config(state="normal")
+        self.after(200, self.poll_stream_clean, self.stream_job)
+
+    def poll_stream_clean(self, job):
+        if job is not self.stream_job:
+            return
+        if not job.finished:
+            self.status_label.config(text=f"{job.stage}: {job.rows_read} dòng ({job.progress():.0%})")
+            self.after(200, self.poll_stream_clean, job)
+            return
+
+        self.stream_job = None
+        self.stream_span.end(cancelled=job.error is not None or job.cancelled)
+        if not self.load_job and not self.export_job:
+            self.cancel_button.config(state="disabled")
+        if job.error is not None:
+            self.status_label.config(text="Lỗi khi làm sạch file")
+            messagebox.showerror("Lỗi khi làm sạch", str(job.error))
+        elif job.cancelled:
+            self.status_label.config(text="Đã hủy làm sạch file")
+        else:
+            self.status_label.config(text=f"Đã làm sạch file. Số dòng còn lại: {job.report.rows_after}")
+            messagebox.showinfo("Kết quả làm sạch", "\n".join(job.report.lines() + [f"Đã lưu tại: {job.output_path}"]))
+
+    def invalidate_profile(self):
+        if self.profiler is not None:
+            self.profiler.detach()
+        self.profiler = None
+
+    def get_profiler(self):
+        """Hồ sơ dữ liệu được dựng một lần cho mỗi bộ dữ liệu (dựng lại sau mỗi lần nạp/làm sạch)."""
+        if self.profiler is None:
+            self.profiler = Profiler(self.dataframe)
+        return self.profiler
+
+    def show_profile(self, profiler):
+        table = profiler.table()
+        with tracing.stage("treeview_fill"):
+            self.profile_table.delete(*self.profile_table.get_children())
+            for row in table.itertuples(index=False, name=None):
+                values = ["" if pd.isna(v) else (f"{v:.4g}" if isinstance(v, float) else v) for v in row]
+                self.profile_table.insert("", tk.END, values=values)
+            self.summary_label.config(text="\n".join(profiler.summary()))
+
+    def clear_profile(self):
+        self.profile_table.delete(*self.profile_table.get_children())
+        self.summary_label.config(text="")
+
     def check_data_issues(self):
         if self.dataframe is None:
             messagebox.showwarning("Chưa có dữ liệu", "Vui lòng nhập file CSV trước.")
             return
 
-        df = self.dataframe
-        total_rows = len(df)
-        total_cols = len(df.columns)
+        with tracing.span("check_data_issues"):
+            with tracing.stage("profile"):
+                profiler = self.get_profiler()
+                table = profiler.table().set_index("Cột")
+            self.show_profile(profiler)
         msg_lines = [
-            f"Tổng số dòng: {total_rows}",
-            f"Tổng số cột: {total_cols}",
+            f"Tổng số dòng: {profiler.rows}",
+            f"Tổng số cột: {len(table)}",
             ""
         ]
-        
+
         if self.cleaning_options["autofill_missing"].get():
-            total_missing = df.isnull().sum().sum()  # Tổng số ô NaN trong toàn bộ DataFrame
-            msg_lines.append(f"Tổng số ô bị thiếu (NaN): {total_missing}")
+            msg_lines.append(f"Tổng số ô bị thiếu (NaN): {int(table['Số ô thiếu'].sum())}")
         else:
             msg_lines.append("Không kiểm tra giá trị thiếu (NaN).")
-            
-        # # 1. Kiểm tra NaN (nếu chọn)
-        # if self.cleaning_options["remove_missing"].get():
-            
-        #     rows_with_nan = df.isnull().any(axis=1).sum()
-        #     msg_lines.append(f"Số dòng có giá trị thiếu (NaN): {rows_with_nan}")
-        # else:
-        #     msg_lines.append("Không kiểm tra giá trị thiếu (NaN).")
 
         # 2. Kiểm tra dòng trùng lặp (nếu chọn)
         if self.cleaning_options["remove_duplicates"].get():
-            duplicate_rows = df.duplicated().sum()
-            msg_lines.append(f"Số dòng trùng lặp: {duplicate_rows}")
+            msg_lines.append(f"Số dòng trùng lặp: {profiler.row_duplicates.duplicates}")
+            if profiler.key_duplicates is not None:
+                msg_lines.append(f"Số dòng trùng khóa (quốc gia, tỉnh, ngày): {profiler.key_duplicates.duplicates}")
         else:
             msg_lines.append("Không kiểm tra dòng trùng lặp.")
 
         # 3. Kiểm tra lỗi ngày (nếu chọn)
-        # if self.cleaning_options["convert_date"].get():
-        #     date_issues = []
-        #     for col in df.columns:
-        #         if "date" in col.lower():
-        #             try:
-        #                 converted = pd.to_datetime(df[col], errors='coerce')
-        #                 n_invalid = converted.isna().sum()
-        #                 if n_invalid > 0:
-        #                     date_issues.append(f"{col} ({n_invalid} giá trị không đúng định dạng)")
-        #             except Exception:
-        #                 date_issues.append(f"{col} (lỗi khi chuyển đổi ngày tháng)")
-        #     msg_lines.append("\nCác cột ngày có lỗi định dạng:")
-        #     if date_issues:
-        #         msg_lines += date_issues
-        #     else:
-        #         msg_lines.append("Không có lỗi định dạng ngày.")
-        # else:
-        #     msg_lines.append("Không kiểm tra định dạng ngày.")
+        if self.cleaning_options["convert_date"].get():
+            invalid = table["Ngày không hợp lệ"].dropna()
+            date_issues = [f"{col} ({int(n)} giá trị không đúng định dạng)" for col, n in invalid.items() if n > 0]
+            msg_lines.append("\nCác cột ngày có lỗi định dạng:")
+            if date_issues:
+                msg_lines += date_issues
+            else:
+                msg_lines.append("Không có lỗi định dạng ngày.")
+        else:
+            msg_lines.append("Không kiểm tra định dạng ngày.")
 
         # 4. Kiểm tra cột toàn NaN (nếu chọn)
-        # if self.cleaning_options["drop_unused_columns"].get():
-        #     cols_all_nan = df.columns[df.isna().all()].tolist()
-        #     msg_lines.append("\nCác cột toàn bộ giá trị thiếu (toàn NaN):")
-        #     if cols_all_nan:
-        #         msg_lines.append(", ".join(cols_all_nan))
-        #     else:
-        #         msg_lines.append("Không có cột toàn NaN.")
-        # else:
-        #     msg_lines.append("Không kiểm tra cột toàn NaN.")
+        if self.cleaning_options["drop_unused_columns"].get():
+            cols_all_nan = table.index[table["Số ô thiếu"] == profiler.rows].tolist()
+            msg_lines.append("\nCác cột toàn bộ giá trị thiếu (toàn NaN):")
+            if cols_all_nan:
+                msg_lines.append(", ".join(map(str, cols_all_nan)))
+            else:
+                msg_lines.append("Không có cột toàn NaN.")
+        else:
+            msg_lines.append("Không kiểm tra cột toàn NaN.")
 
         # Hiển thị kết quả
         messagebox.showinfo("Kết quả kiểm tra dữ liệu", "\n".join(msg_lines))
-            
+
     def clean_data(self):
         if self.dataframe is None:
             messagebox.showwarning("Chưa có dữ liệu", "Vui lòng nhập file CSV.")
             return
+        if self.is_exporting():
+            return
 
         try:
-            df = self.dataframe.copy()
-            original_shape = df.shape
-
-            # Xử lý NaN theo kiểu dữ liệu
-            if self.cleaning_options["autofill_missing"].get():
-                for col in df.columns:
-                    if df[col].isna().any():
-                        if pd.api.types.is_numeric_dtype(df[col]):
-                            df[col].fillna(df[col].mean(), inplace=True)
-                        elif pd.api.types.is_datetime64_any_dtype(df[col]):
-                            df[col].fillna(pd.to_datetime("1970-01-01"), inplace=True)
-                        else:
-                            df[col].fillna("unknown", inplace=True)
-
-            # if self.cleaning_options["remove_missing"].get():
-            #     df.dropna(how='all', inplace=True)
-
-            if self.cleaning_options["remove_duplicates"].get():
-                df.drop_duplicates(inplace=True)
-
-            # if self.cleaning_options["standardize_case"].get():
-            #     for col in df.select_dtypes(include='object').columns:
-            #         df[col] = df[col].astype(str).str.strip().str.lower()
-
-            # if self.cleaning_options["convert_date"].get():
-            #     for col in df.columns:
-            #         if 'date' in col.lower():
-            #             df[col] = pd.to_datetime(df[col], errors='coerce')
-
-            # if self.cleaning_options["drop_unused_columns"].get():
-            #     df.dropna(axis=1, how='all', inplace=True)
-
-            cleaned_rows = df.shape[0]
-            removed_rows = original_shape[0] - cleaned_rows
-
-            self.dataframe = df
-            self.cleaned = True
+            with tracing.span("clean_data"):
+                # Pipeline sửa DataFrame tại chỗ, mỗi cột chỉ được duyệt và gán lại một lần
+                options = {key: var.get() for key, var in self.cleaning_options.items()}
+                with tracing.stage("clean"):
+                    df, report = build_pipeline(options).run(self.dataframe)
+                cleaned_rows = len(df)
+
+                self.dataframe = df
+                self.cleaned = True
+                # Hồ sơ cũ mô tả dữ liệu trước khi làm sạch nên phải dựng lại
+                self.invalidate_profile()
+                with tracing.stage("profile"):
+                    profiler = self.get_profiler()
+                self.show_profile(profiler)
             self.status_label.config(text=f"Đã làm sạch dữ liệu. Số dòng còn lại: {cleaned_rows}")
+            messagebox.showinfo("Kết quả làm sạch", "\n".join(report.lines()))
 
             if self.on_cleaned_callback:
                 self.on_cleaned_callback(df)
@@ -185,18 +298,41 @@ class TabCleaning(ttk.Frame):
             messagebox.showinfo("Chưa làm sạch", "Vui lòng làm sạch trước khi lưu.")
             return
 
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if self.is_exporting():
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=EXPORT_FILETYPES)
         if file_path:
-            try:
-                self.dataframe.to_csv(file_path, index=False)
-                messagebox.showinfo("Thành công", f"Đã lưu tại: {file_path}")
-            except Exception as e:
-                messagebox.showerror("Lỗi", str(e))
+            span = tracing.begin("save_cleaned_file", file=os.path.basename(file_path))
+            self.export_job = StreamingExporter.from_frame(self.dataframe, file_path, span=span).start()
+            self.cancel_button.config(state="normal")
+            self.after(100, self.poll_export, self.export_job)
+
+    def poll_export(self, job):
+        if job is not self.export_job:
+            return
+        if not job.finished:
+            self.status_label.config(text=f"Đang lưu: {job.rows_written}/{job.total_rows} dòng ({job.progress():.0%})")
+            self.after(100, self.poll_export, job)
+            return
+
+        self.export_job = None
+        job.span.end(cancelled=job.error is not None or job.cancelled)
+        if not self.load_job and not self.stream_job:
+            self.cancel_button.config(state="disabled")
+        if job.error is not None:
+            messagebox.showerror("Lỗi", str(job.error))
+        elif job.cancelled:
+            self.status_label.config(text="Đã hủy lưu file")
+        else:
+            self.status_label.config(text=f"Đã lưu {job.rows_written} dòng")
+            messagebox.showinfo("Thành công", f"Đã lưu tại: {job.output_path}")
                 
     
     def reset_state(self):
         self.dataframe = None
         self.cleaned = False
+        self.invalidate_profile()
+        self.clear_profile()
         self.status_label.config(text="Chưa có dữ liệu")
 
     def bind_tab_event(self, notebook: ttk.Notebook):
@@ -1,29 +1,58 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import functools
+import numpy as np
+from covid_stats.analyzer import COUNTRY_COL, PROVINCE_COL, CaseCube, METRICS
+from covid_stats.chart_jobs import ChartScheduler, PAYLOADS, map_payload
+from covid_stats.spatial import LAT_COL, LON_COL, DISTANCE_COL, SpatialIndex
+from covid_stats import tracing
+
+REGION_PREFIX = "Khu vực WHO: "
 
 
 class TabVisualization(ttk.Frame):
     def __init__(self, master, dataframe: pd.DataFrame = None):
         super().__init__(master)
         self.dataframe = dataframe
+        self.cube = None
+        self.spatial = None
+        self.scheduler = ChartScheduler()
+        self.current_chart = None
+        self.chart_span = None
         self.selected_region = tk.StringVar()
         self.available_regions = []
         self.create_widgets()
 
         if self.dataframe is not None:
-            self.update_available_regions()
+            self.set_dataframe(self.dataframe)
 
     def update_dataframe(self, df: pd.DataFrame):
         """
         Cập nhật DataFrame và làm mới danh sách khu vực có sẵn.
         """
-        self.dataframe = df
+        self.set_dataframe(df)
+
+    def update_model(self, model, cube=None, spatial=None):
+        """
+        Dựng khối quốc gia × ngày từ CovidStats và gắn vào nó, để các thao tác thêm/sửa/xóa
+        chỉ cập nhật những ô bị ảnh hưởng thay vì nhóm lại toàn bộ dữ liệu.
+        Nếu đã có sẵn khối và chỉ mục không gian gắn với model (cube, spatial) thì dùng chung.
+        """
+        if self.cube is not None:
+            self.cube.detach()
+        self.scheduler.cancel()
+        self.scheduler.clear()
+        self.dataframe = model.data if model is not None else None
+        with tracing.stage("aggregate"):
+            if cube is None and model is not None:
+                cube = CaseCube(model.data).attach(model)
+            self.cube = cube
+            if spatial is None and model is not None:
+                spatial = SpatialIndex(model.data).attach(model)
+            self.spatial = spatial
         self.update_available_regions()
 
-        
     def create_widgets(self):
         tk.Label(self, text="Biểu đồ trực quan hóa dữ liệu", font=("Segoe UI", 14, "bold")).pack(pady=10)
 
@@ -35,6 +64,7 @@ class TabVisualization(ttk.Frame):
         ttk.Button(button_frame, text="Thống kê top 10 quốc gia có số ca xác nhận nhiều nhất", command=self.plot_bar_chart).grid(row=0, column=2, padx=4)
         ttk.Button(button_frame, text="Biểu đồ cột chồng", command=self.plot_stacked_bar_chart).grid(row=0, column=3, padx=4)
         ttk.Button(button_frame, text="Biểu đồ khu vực", command=self.plot_area_chart).grid(row=0, column=4, padx=4)
+        ttk.Button(button_frame, text="Bản đồ ca bệnh", command=self.plot_map_chart).grid(row=0, column=5, padx=4)
 
         filter_frame = tk.Frame(self)
         filter_frame.pack(pady=5)
@@ -42,122 +72,291 @@ class TabVisualization(ttk.Frame):
         self.region_combobox = ttk.Combobox(filter_frame, textvariable=self.selected_region, state="readonly")
         self.region_combobox.pack(side="left")
         self.region_combobox.bind("<<ComboboxSelected>>", self.on_region_selected)
+        self.status_label = tk.Label(filter_frame, text="")
+        self.status_label.pack(side="left", padx=(10, 0))
 
         self.canvas_frame = tk.Frame(self)
         self.canvas_frame.pack(fill="both", expand=True)
 
+        # Một Figure/canvas dùng chung cho mọi biểu đồ; các lần vẽ sau chỉ cập nhật dữ liệu.
+        # matplotlib chỉ được import khi tab được dựng (lần đầu mở tab biểu đồ)
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.figure = Figure(figsize=(8, 4.5))
+        self.ax = self.figure.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.canvas_frame)
+        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        # Bấm vào bản đồ để xem địa điểm gần nhất
+        self.canvas.mpl_connect("button_press_event", self.on_map_click)
+        self.chart_kind = None
+        self.artists = []
+
     def set_dataframe(self, df: pd.DataFrame):
+        if self.cube is not None:
+            self.cube.detach()
+        self.scheduler.cancel()
+        self.scheduler.clear()
         self.dataframe = df
+        self.cube = CaseCube(df) if df is not None else None
+        self.spatial = SpatialIndex(df) if df is not None else None
         self.update_available_regions()
 
     def update_available_regions(self):
-        if self.dataframe is not None:
-            regions = ["Toàn bộ"] + sorted(self.dataframe['Quốc gia/Vùng lãnh thổ'].dropna().unique().tolist())
+        if self.cube is not None:
+            regions = ["Toàn bộ"] + [REGION_PREFIX + r for r in self.cube.region_names()] + self.cube.country_names()
             self.available_regions = regions
             self.region_combobox['values'] = regions
             self.region_combobox.current(0)
 
     def on_region_selected(self, event=None):
-        pass  
+        # Vẽ lại biểu đồ đang xem cho lựa chọn mới; yêu cầu cũ chưa xong sẽ bị hủy
+        if self.current_chart is not None:
+            self.request_chart(self.current_chart)
 
-    def get_filtered_dataframe(self):
-        if self.dataframe is None:
-            return None
-        df = self.dataframe.copy()
+    def get_selection(self):
+        """Trả về (quốc gia, khu vực WHO) theo lựa chọn trong combobox; cả hai None là toàn bộ."""
         selected = self.selected_region.get()
-        if selected and selected != "Toàn bộ":
-            df = df[df['Quốc gia/Vùng lãnh thổ'] == selected]
-        return df
+        if not selected or selected == "Toàn bộ":
+            return None, None
+        if selected.startswith(REGION_PREFIX):
+            return None, selected[len(REGION_PREFIX):]
+        return selected, None
 
-    def clear_canvas(self):
-        for widget in self.canvas_frame.winfo_children():
-            widget.destroy()
+    def request_chart(self, kind):
+        """
+        Yêu cầu vẽ một loại biểu đồ cho lựa chọn hiện tại. Dữ liệu được tính trên luồng phụ
+        (hoặc lấy ngay từ cache), còn việc vẽ lên canvas vẫn diễn ra trên luồng giao diện.
+        """
+        if self.cube is None:
+            self.warn_no_data()
+            return
+        self.current_chart = kind
+        country, region = self.get_selection()
+        if kind == "map":
+            # Chỉ mục không gian được dựng lại (nếu dữ liệu đã đổi) trên luồng giao diện trước khi tính
+            self.spatial.refresh()
+            version = self.spatial.version
+            members = [country] if country is not None else (self.cube.region_countries(region) if region else None)
+            compute = functools.partial(map_payload, self.spatial, members)
+        else:
+            version = self.cube.version
+            compute = functools.partial(PAYLOADS[kind], self.cube, country, region)
+        key = (kind, self.selected_region.get(), version)
+        # Thao tác vẽ kéo dài từ lúc bấm tới khi canvas vẽ xong; yêu cầu cũ chưa xong thì bị hủy
+        if self.chart_span is not None:
+            self.chart_span.end(cancelled=True)
+        span = self.chart_span = tracing.begin(f"plot_{kind}", selection=key[1])
 
-    def display_plot(self, fig):
-        canvas = FigureCanvasTkAgg(fig, master=self.canvas_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
+        def traced_compute(job):
+            with tracing.stage("aggregate", parent=span):
+                return compute(job)
 
-    def plot_pie_chart(self):
-        df = self.get_filtered_dataframe()
-        if df is None or df.empty:
-            messagebox.showwarning("Chưa có dữ liệu", "Vui lòng chọn khu vực có dữ liệu.")
-            return
-        self.clear_canvas()
+        hit, payload = self.scheduler.submit(key, traced_compute)
+        if hit:
+            self.show_chart(key, payload)
+        else:
+            self.status_label.config(text="Đang tính toán...")
+            self.after(30, self.poll_chart)
 
-        df_latest = df.sort_values("Ngày").iloc[-1]
-        labels = ['Ca xác nhận', 'Tử vong', 'Hồi phục', 'Đang điều trị']
-        sizes = [df_latest['Ca xác nhận'], df_latest['Tử vong'], df_latest['Hồi phục'], df_latest['Đang điều trị']]
+    def poll_chart(self):
+        result = self.scheduler.poll()
+        if result is not None:
+            key, payload, error = result
+            self.status_label.config(text="")
+            if error is not None:
+                if self.chart_span is not None:
+                    self.finish_chart_span(self.chart_span, cancelled=True)
+                messagebox.showerror("Biểu đồ", f"Lỗi khi tính dữ liệu biểu đồ:\n{error}")
+            else:
+                self.show_chart(key, payload)
+        elif self.scheduler.pending():
+            self.after(30, self.poll_chart)
+        else:
+            self.status_label.config(text="")
 
-        fig, ax = plt.subplots()
-        ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
-        ax.axis('equal')
-        ax.set_title(f"Tỉ lệ ca bệnh mới nhất ({self.selected_region.get()})")
-        self.display_plot(fig)
+    def finish_chart_span(self, span, cancelled=False):
+        span.end(cancelled)
+        if span is self.chart_span:
+            self.chart_span = None
 
-    def plot_line_chart(self):
-        df = self.get_filtered_dataframe()
-        if df is None or df.empty:
-            messagebox.showwarning("Chưa có dữ liệu", "Vui lòng chọn khu vực có dữ liệu.")
+    def show_chart(self, key, payload):
+        kind, selected, _ = key
+        span = self.chart_span
+        if payload is None:
+            if span is not None:
+                self.finish_chart_span(span, cancelled=True)
+            self.warn_no_data()
             return
-        self.clear_canvas()
+        draw = {
+            "pie": self.draw_pie_chart,
+            "line": self.draw_line_chart,
+            "bar": self.draw_bar_chart,
+            "stacked": self.draw_stacked_bar_chart,
+            "area": self.draw_area_chart,
+            "map": self.draw_map_chart,
+        }[kind]
+        with tracing.within(span):
+            with tracing.stage("render"):
+                draw(payload, selected)
+        if span is not None:
+            # draw_idle() vẽ canvas ở lần rảnh kế tiếp; kết thúc span sau đó để tính cả thời gian vẽ
+            self.after_idle(self.finish_chart_span, span)
 
-        df['Ngày'] = pd.to_datetime(df['Ngày'])
-        df_grouped = df.groupby('Ngày')[['Ca xác nhận', 'Tử vong', 'Hồi phục', 'Đang điều trị']].sum()
+    def reset_axes(self, kind):
+        """
+        Xóa trục khi đổi loại biểu đồ và trả về True; cùng loại thì giữ các artist cũ để
+        cập nhật dữ liệu tại chỗ.
+        """
+        if kind == self.chart_kind:
+            return False
+        self.ax.clear()
+        # Biểu đồ tròn đặt tỉ lệ trục bằng nhau; clear() không trả lại tỉ lệ tự do
+        self.ax.set_aspect("auto", adjustable="box")
+        self.chart_kind = kind
+        self.artists = []
+        return True
 
-        fig, ax = plt.subplots()
-        df_grouped.plot(ax=ax)
-        ax.set_title(f"Diễn biến theo thời gian ({self.selected_region.get()})")
-        ax.set_xlabel("Ngày")
-        ax.set_ylabel("Số ca")
-        self.display_plot(fig)
+    def redraw(self, points=None):
+        self.ax.relim()
+        if points is not None:
+            # relim() bỏ qua các vùng tô (PolyCollection) nên thêm giới hạn dữ liệu thủ công
+            self.ax.update_datalim(points)
+        self.ax.autoscale_view()
+        self.canvas.draw_idle()
 
-    def plot_bar_chart(self):
-        df = self.get_filtered_dataframe()
-        if df is None or df.empty:
-            messagebox.showwarning("Chưa có dữ liệu", "Vui lòng chọn khu vực có dữ liệu.")
-            return
-        self.clear_canvas()
+    def warn_no_data(self):
+        messagebox.showwarning("Chưa có dữ liệu", "Vui lòng chọn khu vực có dữ liệu.")
 
-        df_grouped = df.groupby('Quốc gia/Vùng lãnh thổ')[['Ca xác nhận']].sum()
-        df_top = df_grouped.sort_values(by='Ca xác nhận', ascending=False).head(10)
+    def plot_pie_chart(self):
+        self.request_chart("pie")
 
-        fig, ax = plt.subplots()
-        df_top.plot(kind='bar', ax=ax, legend=False)
-        ax.set_title("Top 10 quốc gia có số ca xác nhận cao nhất")
-        ax.set_ylabel("Ca xác nhận")
-        self.display_plot(fig)
+    def plot_line_chart(self):
+        self.request_chart("line")
+
+    def plot_bar_chart(self):
+        self.request_chart("bar")
 
     def plot_stacked_bar_chart(self):
-        df = self.get_filtered_dataframe()
-        if df is None or df.empty:
-            messagebox.showwarning("Chưa có dữ liệu", "Vui lòng chọn khu vực có dữ liệu.")
-            return
-        self.clear_canvas()
+        self.request_chart("stacked")
 
-        df['Ngày'] = pd.to_datetime(df['Ngày'])
-        df_grouped = df.groupby('Ngày')[['Ca xác nhận', 'Tử vong', 'Hồi phục', 'Đang điều trị']].sum()
+    def plot_area_chart(self):
+        self.request_chart("area")
 
-        fig, ax = plt.subplots()
-        df_grouped.plot(kind='bar', stacked=True, ax=ax)
-        ax.set_title(f"Biểu đồ cột chồng ({self.selected_region.get()})")
-        ax.set_xlabel("Ngày")
-        ax.set_ylabel("Số ca")
-        self.display_plot(fig)
+    def plot_map_chart(self):
+        self.request_chart("map")
 
-    def plot_area_chart(self):
-        df = self.get_filtered_dataframe()
-        if df is None or df.empty:
-            messagebox.showwarning("Chưa có dữ liệu", "Vui lòng chọn khu vực có dữ liệu.")
+    def draw_pie_chart(self, payload, selected):
+        # Các lát bánh thay đổi theo số liệu nên luôn vẽ lại (chỉ 4 lát)
+        self.chart_kind = None
+        self.reset_axes("pie")
+        self.ax.pie(payload["sizes"], labels=METRICS, autopct='%1.1f%%', startangle=140)
+        self.ax.axis('equal')
+        self.ax.set_title(f"Tỉ lệ ca bệnh mới nhất ({selected})")
+        self.canvas.draw_idle()
+
+    def draw_line_chart(self, payload, selected):
+        if self.reset_axes("line"):
+            self.artists = [self.ax.plot([], [], label=metric)[0] for metric in METRICS]
+            self.ax.xaxis_date()
+            self.ax.legend()
+            self.ax.set_xlabel("Ngày")
+            self.ax.set_ylabel("Số ca")
+        for line, (x, y) in zip(self.artists, payload["lines"]):
+            line.set_data(x, y)
+        self.ax.set_title(f"Diễn biến theo thời gian ({selected})")
+        self.redraw()
+
+    def update_bars(self, kind, x, heights, width, labels=None):
+        """
+        Vẽ các nhóm cột chồng (heights có dạng số cột × số lớp). Nếu số cột không đổi thì chỉ
+        đặt lại vị trí/chiều cao của các hình chữ nhật sẵn có.
+        """
+        heights = np.atleast_2d(np.asarray(heights, dtype=np.float64).T).T
+        bottoms = np.cumsum(heights, axis=1) - heights
+        width = np.broadcast_to(width, len(x))
+        if self.reset_axes(kind) or len(self.artists[0]) != len(x):
+            self.ax.clear()
+            self.artists = [self.ax.bar(x, heights[:, k], width=width, bottom=bottoms[:, k], label=label)
+                            for k, label in enumerate(labels or [None] * heights.shape[1])]
+            if labels:
+                self.ax.legend()
             return
-        self.clear_canvas()
+        for k, bars in enumerate(self.artists):
+            for rect, left, h, b, w in zip(bars, x, heights[:, k], bottoms[:, k], width):
+                rect.set_x(left - w / 2)
+                rect.set_width(w)
+                rect.set_height(h)
+                rect.set_y(b)
+
+    def draw_bar_chart(self, payload, selected):
+        x = np.arange(len(payload["labels"]))
+        self.update_bars("bar", x, payload["heights"], 0.8)
+        self.ax.set_xticks(x)
+        self.ax.set_xticklabels(payload["labels"], rotation=90)
+        self.ax.set_title("Top 10 quốc gia có số ca xác nhận cao nhất")
+        self.ax.set_ylabel("Ca xác nhận")
+        self.figure.tight_layout()
+        self.redraw()
+
+    def draw_stacked_bar_chart(self, payload, selected):
+        size = payload["size"]
+        self.update_bars("stacked", payload["x"], payload["heights"], size * 0.9, METRICS)
+        self.ax.xaxis_date()
+        self.ax.set_title(f"Biểu đồ cột chồng ({selected})")
+        self.ax.set_xlabel("Ngày" if size == 1 else f"Ngày (trung bình mỗi {size} ngày)")
+        self.ax.set_ylabel("Số ca")
+        self.redraw()
 
-        df['Ngày'] = pd.to_datetime(df['Ngày'])
-        df_grouped = df.groupby('Ngày')[['Ca xác nhận', 'Tử vong', 'Hồi phục', 'Đang điều trị']].sum()
+    @staticmethod
+    def band_verts(x, lower, upper):
+        return [np.column_stack([np.concatenate([x, x[::-1]]), np.concatenate([upper, lower[::-1]])])]
 
-        fig, ax = plt.subplots()
-        df_grouped.plot.area(ax=ax, alpha=0.5)
-        ax.set_title(f"Biểu đồ khu vực ({self.selected_region.get()})")
-        ax.set_xlabel("Ngày")
-        ax.set_ylabel("Số ca")
-        self.display_plot(fig)
+    def draw_area_chart(self, payload, selected):
+        x, tops, bottoms = payload["x"], payload["tops"], payload["bottoms"]
+        if self.reset_axes("area"):
+            self.artists = [self.ax.fill_between(x, bottoms[:, k], tops[:, k], alpha=0.5, label=metric)
+                            for k, metric in enumerate(METRICS)]
+            self.ax.xaxis_date()
+            self.ax.legend()
+            self.ax.set_xlabel("Ngày")
+            self.ax.set_ylabel("Số ca")
+        else:
+            for k, band in enumerate(self.artists):
+                band.set_verts(self.band_verts(x, bottoms[:, k], tops[:, k]))
+        self.ax.set_title(f"Biểu đồ khu vực ({selected})")
+        self.redraw(np.column_stack([x, tops[:, -1]]))
+
+    def draw_map_chart(self, payload, selected):
+        # Mỗi ô lưới là một điểm (kích thước theo căn bậc hai số ca), nên số điểm vẽ không phụ thuộc số dòng
+        lon, lat, totals = payload["lon"], payload["lat"], payload["totals"]
+        sizes = 1000 * np.sqrt(totals / max(totals.max(), 1)) + 5
+        colors = np.log10(totals + 1)
+        if self.reset_axes("map"):
+            self.artists = [self.ax.scatter(lon, lat, s=sizes, c=colors, cmap="Reds", alpha=0.7,
+                                            edgecolors="darkred", linewidths=0.5)]
+            self.ax.set_xlabel(LON_COL)
+            self.ax.set_ylabel(LAT_COL)
+            self.ax.grid(True, alpha=0.3)
+        else:
+            points = self.artists[0]
+            points.set_offsets(np.column_stack([lon, lat]))
+            points.set_sizes(sizes)
+            points.set_array(colors)
+            points.set_clim(colors.min(), colors.max())
+        pad = payload["size"]
+        self.ax.set_xlim(max(lon.min() - pad, -180), min(lon.max() + pad, 180))
+        self.ax.set_ylim(max(lat.min() - pad, -90), min(lat.max() + pad, 90))
+        self.ax.set_title(f"Ca xác nhận theo ô {payload['size']:.2g}° × {payload['size']:.2g}° ({selected})")
+        self.canvas.draw_idle()
+
+    def on_map_click(self, event):
+        if self.chart_kind != "map" or event.inaxes is not self.ax or self.spatial is None or event.xdata is None:
+            return
+        nearest = self.spatial.nearest(event.ydata, event.xdata, k=1)
+        if nearest.empty:
+            return
+        place = nearest.iloc[0]
+        name = place[COUNTRY_COL] if pd.isna(place[PROVINCE_COL]) or not place[PROVINCE_COL] \
+            else f"{place[PROVINCE_COL]}, {place[COUNTRY_COL]}"
+        self.status_label.config(text=f"Gần nhất: {name} ({place[DISTANCE_COL]:,.0f} km) — "
+                                      f"{place['Ca xác nhận']:,.0f} ca xác nhận")
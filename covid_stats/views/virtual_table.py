@@ -0,0 +1,116 @@
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+from covid_stats.schema import display_value
+from covid_stats.tracing import TRACER
+
+
+class VirtualTable(tk.Frame):
+    """
+    Bảng ảo cho CovidStats: giữ cố định page_size dòng Treeview và chỉ cập nhật giá trị của
+    chúng bằng item(..., values=...) thay vì xóa/chèn lại. Thanh cuộn dọc (và con lăn chuột)
+    điều khiển vị trí dòng đầu tiên trên toàn bộ dữ liệu, nên có thể cuộn thay cho nút chuyển trang.
+    """
+    def __init__(self, master, page_size=20, on_scroll=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.page_size = page_size
+        self.on_scroll = on_scroll
+        self.model = None
+        self.offset = 0
+        self.columns = []
+        self._slots = []
+        self._slot_index = {}
+        self._attached = []
+        self._slot_ids = np.full(page_size, -1, dtype=np.int64)
+
+        self.tree = ttk.Treeview(self, columns=[], show="headings", height=page_size)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill=tk.BOTH, expand=True)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_wheel)
+
+    def set_columns(self, columns, width=110):
+        """Đặt lại các cột và tạo lại nhóm dòng cố định."""
+        self.columns = list(columns)
+        # Xóa cả các dòng đang bị tách ra (detach), không chỉ các dòng đang hiển thị
+        if self._slots:
+            self.tree.delete(*self._slots)
+        self.tree.configure(columns=self.columns)
+        for col in self.columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width)
+        self._slots = [self.tree.insert("", tk.END, iid=f"slot{i}") for i in range(self.page_size)]
+        self._slot_index = {slot: i for i, slot in enumerate(self._slots)}
+        self._attached = [True] * self.page_size
+        self._slot_ids[:] = -1
+
+    def set_model(self, model, offset=0):
+        self.model = model
+        self.scroll_to(offset)
+
+    def total(self):
+        return len(self.model) if self.model is not None else 0
+
+    def scroll_to(self, offset):
+        total = self.total()
+        offset = max(0, min(int(offset), max(total - 1, 0)))
+        if offset != self.offset:
+            self.tree.selection_remove(self.tree.selection())
+        self.offset = offset
+        self.refresh(total)
+        if self.on_scroll:
+            self.on_scroll(self.offset, total)
+
+    def refresh(self, total=None):
+        """Nạp lại giá trị cho nhóm dòng cố định từ vị trí offset hiện tại."""
+        with TRACER.stage("treeview_fill"):
+            self._fill(total)
+
+    def _fill(self, total):
+        if total is None:
+            total = self.total()
+        if self.model is None or not self._slots:
+            rows, ids = [], np.empty(0, dtype=np.int64)
+        else:
+            ids = self.model.row_ids()[self.offset:self.offset + self.page_size]
+            rows = [tuple(map(display_value, row)) for row in self.model.get_rows(ids).itertuples(index=False, name=None)]
+        n = len(rows)
+        for i, slot in enumerate(self._slots):
+            if i < n:
+                self.tree.item(slot, values=rows[i])
+                if not self._attached[i]:
+                    self.tree.move(slot, "", i)
+                    self._attached[i] = True
+            elif self._attached[i]:
+                self.tree.detach(slot)
+                self._attached[i] = False
+        self._slot_ids[:] = -1
+        self._slot_ids[:n] = ids
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + n) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def selected_ids(self):
+        """Mã dòng (row ID) của các dòng đang được chọn."""
+        ids = [int(self._slot_ids[self._slot_index[item]]) for item in self.tree.selection()]
+        return [row_id for row_id in ids if row_id >= 0]
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * self.total())
+        elif unit == "pages":
+            self.scroll_to(self.offset + int(amount) * self.page_size)
+        else:
+            self.scroll_to(self.offset + int(amount))
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            step = -3
+        else:
+            step = 3
+        self.scroll_to(self.offset + step)
+        return "break"
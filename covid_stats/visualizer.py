@@ -1,8 +1,7 @@
-import matplotlib.pyplot as plt
-
 class Visualizer:
     @staticmethod
     def plot_cases_by_date(df, date_col="date", cases_col="cases", province_col=None):
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(10, 5))
         if province_col and province_col in df.columns:
             for prov in df[province_col].unique():
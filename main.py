@@ -1,12 +1,24 @@
+import time
+# Thời điểm bắt đầu chạy chương trình, dùng để đo thời gian tới khi cửa sổ đầu tiên hiện ra
+STARTED_NS = time.perf_counter_ns()
 import datetime
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from tkinter import filedialog
-from covid_stats.data_loader import DataLoader
+from covid_stats.analyzer import CaseCube
+from covid_stats.data_loader import DataLoader, BackgroundLoad
+from covid_stats.exporter import EXPORT_FILETYPES, StreamingExporter
+from covid_stats.filters import MODES, FilterEngine, parse_condition
+from covid_stats.materialized import MaterializedViews
 from covid_stats.models import CovidStats
+from covid_stats.schema import COLUMN_MAP
+from covid_stats.spatial import SpatialIndex
+from covid_stats import tracing
+from covid_stats.tracing import TRACER, describe
 from covid_stats.views.AddRecord import RecordModal
 from covid_stats.views.clean_data import TabCleaning
-from covid_stats.views.draw_chart import TabVisualization
+from covid_stats.views.virtual_table import VirtualTable
 DATA_FILE = "datasets/covid_19_clean_complete.csv"
 PAGE_SIZE = 20
 
@@ -17,26 +29,33 @@ class CovidApp:
         self.root.geometry("1200x600")
         self.root.configure(bg="white")
         
-        self.loader = DataLoader(DATA_FILE)
         self.df = None
         self.modelCoVidStats = None
         self.page = 1
         self.total_pages = 1
-        column_map = {
-            'Province/State': 'Tỉnh/Bang',
-            'Country/Region': 'Quốc gia/Vùng lãnh thổ',
-            'Lat': 'Vĩ độ',
-            'Long': 'Kinh độ',
-            'Date': 'Ngày',
-            'Confirmed': 'Ca xác nhận',
-            'Deaths': 'Tử vong',
-            'Recovered': 'Hồi phục',
-            'Active': 'Đang điều trị',
-            'WHO Region': 'Khu vực WHO'
-        }
-        self.column_map = column_map  # Lưu lại để dùng khi mở file
+        self.load_job = None
+        self.export_job = None
+        self.previous_df = None
+        self.previous_model = None
+        self.first_chunk_shown = False
+        self.load_span = None
+        self.load_notify = True
+        self.cube = None
+        self.spatial = None
+        self.derived_views = None
+        self.filter_engine = None
+        self.current_filter = None
+        self.column_map = COLUMN_MAP  # Lưu lại để dùng khi mở file
+        self.loader = DataLoader(DATA_FILE, column_map=self.column_map)
+
+        # Thanh trạng thái: thời gian của thao tác gần nhất và nút xuất trace
+        status_bar = tk.Frame(root, bd=1, relief=tk.SUNKEN)
+        status_bar.pack(side=tk.BOTTOM, fill="x")
+        self.latency_label = tk.Label(status_bar, text="", anchor="w")
+        self.latency_label.pack(side="left", fill="x", expand=True, padx=5)
+        tk.Button(status_bar, text="Xuất trace", command=self.export_trace).pack(side="right", padx=5, pady=2)
+        TRACER.add_listener(self.show_latency)
 
-        
         # Tabs
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -50,14 +69,16 @@ class CovidApp:
         self.notebook.add(self.tab_cleaning, text="Làm sạch dữ liệu")
         
         
-        self.tab_visualization = TabVisualization(self.notebook, self.df)
-        
-        # self.tab_visualization.bind_tab_event(notebook)
-        self.notebook.add(self.tab_visualization, text="Biểu đồ")
+        # Tab biểu đồ và tab phân tích chỉ được dựng khi người dùng mở lần đầu
+        self.tab_visualization = None
+        self.tab_analysis = None
+        self.lazy_tabs = {}
+        self.add_lazy_tab("Biểu đồ", self.build_visualization)
         self.notebook.add(self.tab_manage, text="Quản lý ca bệnh")
         self.notebook.add(ttk.Frame(self.notebook), text="Tổng quan")
-        self.notebook.add(ttk.Frame(self.notebook), text="Phân tích")
+        self.add_lazy_tab("Phân tích", self.build_analysis)
         self.notebook.add(ttk.Frame(self.notebook), text="Khác")
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed, add="+")
 		
     
         # Tiêu đề
@@ -98,6 +119,22 @@ class CovidApp:
         self.search_entry = tk.Entry(tool_frame, width=20)
         self.search_entry.grid(row=0, column=17, padx=5)
         tk.Button(tool_frame, text="Tìm", command=self.search_records).grid(row=0, column=18, padx=2)
+        tk.Button(tool_frame, text="Tất cả", command=self.clear_search).grid(row=0, column=19, padx=2)
+        # Hoàn tác / làm lại (Ctrl+Z, Ctrl+Y hoặc Ctrl+Shift+Z)
+        tk.Button(tool_frame, text="Hoàn tác", command=self.undo).grid(row=1, column=0, padx=4, pady=(4, 0))
+        tk.Button(tool_frame, text="Làm lại", command=self.redo).grid(row=1, column=1, padx=4, pady=(4, 0))
+        self.root.bind("<Control-z>", lambda event: self.undo())
+        self.root.bind("<Control-y>", lambda event: self.redo())
+        self.root.bind("<Control-Z>", lambda event: self.redo())
+        # Điều kiện lọc và lọc thêm trên kết quả hiện tại (VÀ/HOẶC)
+        tk.Label(tool_frame, text="Điều kiện:", font=("Segoe UI", 10)).grid(row=1, column=15, sticky="e")
+        self.search_mode = ttk.Combobox(tool_frame, values=MODES, width=12, state="readonly")
+        self.search_mode.grid(row=1, column=16, padx=2, sticky="w")
+        self.search_mode.set(MODES[0])
+        tk.Button(tool_frame, text="Và", command=lambda: self.search_records("and")).grid(row=1, column=18, padx=2)
+        tk.Button(tool_frame, text="Hoặc", command=lambda: self.search_records("or")).grid(row=1, column=19, padx=2)
+        self.filter_label = tk.Label(tool_frame, text="", fg="gray", anchor="w")
+        self.filter_label.grid(row=1, column=20, columnspan=5, sticky="w", padx=5)
 
 
         tk.Button(tool_frame, text="Tăng", command=lambda: self.sort_records(True)).grid(row=0, column=21, padx=2)
@@ -110,8 +147,19 @@ class CovidApp:
 
         tk.Button(tool_frame, text="Export", bg="lightyellow", command=self.export_data).grid(row=0, column=4, padx=4)
         tk.Button(tool_frame, text="Mở file", bg="lightcyan", command=self.open_file).grid(row=0, column=5, padx=4)
+        tk.Button(tool_frame, text="Bảng tổng hợp", bg="lightyellow", command=self.export_views).grid(row=0, column=20, padx=4)
+
+        # Tiến độ đọc file (đọc theo khối trên luồng phụ)
+        self.progress_frame = tk.Frame(self.tab_manage, bg="white")
+        self.progress_frame.pack(fill="x")
+        self.progress_bar = ttk.Progressbar(self.progress_frame, length=300, mode="determinate", maximum=100)
+        self.progress_bar.pack(side="left", padx=5)
+        self.progress_label = tk.Label(self.progress_frame, text="", bg="white")
+        self.progress_label.pack(side="left", padx=5)
+        self.cancel_button = tk.Button(self.progress_frame, text="Hủy", command=self.cancel_load, state="disabled")
+        self.cancel_button.pack(side="left", padx=5)
         # Bảng
-        self.table = ttk.Treeview(self.tab_manage, columns=[], show='headings')
+        self.table = VirtualTable(self.tab_manage, page_size=PAGE_SIZE, on_scroll=self.on_table_scroll)
         self.table.pack(fill=tk.BOTH, expand=True)
 
         
@@ -119,55 +167,178 @@ class CovidApp:
 
         # self.refresh_table()
 
+    def add_lazy_tab(self, text, build):
+        # Khung trống giữ chỗ trên notebook; nội dung được dựng bởi build(khung) khi tab được chọn
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text=text)
+        self.lazy_tabs[str(frame)] = (text, frame, build)
+
+    def on_tab_changed(self, event=None):
+        pending = self.lazy_tabs.pop(self.notebook.select(), None)
+        if pending is not None:
+            text, frame, build = pending
+            with tracing.span("build_tab", tab=text):
+                build(frame)
+
+    def build_visualization(self, frame):
+        from covid_stats.views.draw_chart import TabVisualization
+        self.tab_visualization = TabVisualization(frame)
+        self.tab_visualization.pack(fill=tk.BOTH, expand=True)
+        if self.cube is not None:
+            self.tab_visualization.update_model(self.modelCoVidStats, self.cube, self.spatial)
+
+    def build_analysis(self, frame):
+        from covid_stats.views.analysis import TabAnalysis
+        self.tab_analysis = TabAnalysis(frame)
+        self.tab_analysis.pack(fill=tk.BOTH, expand=True)
+        if self.cube is not None:
+            self.tab_analysis.update_model(self.modelCoVidStats, self.cube)
+
+    def preload(self):
+        """Nạp sẵn file dữ liệu mặc định trên luồng phụ, ngay sau khi cửa sổ đã hiện ra."""
+        if os.path.exists(DATA_FILE):
+            self.load_file(DATA_FILE, action="preload_data", notify=False)
+
     def open_file(self):
         file_path = filedialog.askopenfilename(
             filetypes=[("CSV files", "*.csv")],
             title="Chọn file CSV để mở"
         )
         if file_path:
-            self.loader.filepath = file_path
-            self.df = self.loader.load_data()
-            self.df.rename(columns=self.column_map, inplace=True)
-            self.modelCoVidStats = CovidStats(self.df)
-            self.page = 1
-            self.total_pages = self.modelCoVidStats.get_total_pages(PAGE_SIZE)
-            # Tạo lại bảng với cột mới
-            self.table.destroy()
-            self.table = ttk.Treeview(self.tab_manage, columns=list(self.df.columns), show='headings')
-            for col in self.df.columns:
-                self.table.heading(col, text=col)
-                self.table.column(col, width=110)
-            self.table.pack(fill=tk.BOTH, expand=True)
-            self.sort_column['values'] = list(self.df.columns)
-            if len(self.df.columns) > 0:
-                self.sort_column.set(self.df.columns[0])
-
-            self.tab_visualization.update_dataframe(self.df)
-            self.refresh_table()
-            messagebox.showinfo("Mở file", f"Đã nạp dữ liệu từ file:\n{file_path}")
-    def refresh_table(self):
-        if not self.modelCoVidStats:
-            for item in self.table.get_children():
-                self.table.delete(item)
-            self.page_label.config(text="Trang 0/0")
-            self.total_record.config(text="Tổng số bản ghi: 0")
+            self.load_file(file_path)
+
+    def load_file(self, file_path, action="open_file", notify=True):
+        if self.load_job and not self.load_job.finished:
+            self.load_job.cancel()
+            self.load_job.span.end(cancelled=True)
+        elif self.load_job is None:
+            # Model đang dùng được giữ nguyên (cùng nhật ký, khối cube, view dẫn xuất) để khôi phục
+            # nếu đọc lỗi/bị hủy; khi đang đọc dở file khác thì model cần khôi phục vẫn là model cũ
+            self.previous_df = self.df
+            self.previous_model = self.modelCoVidStats
+        self.load_notify = notify
+        # Thao tác mở file kéo dài qua nhiều lần poll_load, kết thúc khi bảng và biểu đồ đã sẵn sàng
+        span = tracing.begin(action, file=os.path.basename(file_path))
+        self.load_job = BackgroundLoad(DataLoader(file_path, column_map=self.column_map), span=span).start()
+        self.first_chunk_shown = False
+        self.cancel_button.config(state="normal")
+        self.progress_bar["value"] = 0
+        self.progress_label.config(text="Đang đọc dữ liệu...")
+        self.root.after(100, self.poll_load, self.load_job)
+
+    def poll_load(self, job):
+        if job is not self.load_job:
             return
-        for item in self.table.get_children():
-            self.table.delete(item)
-        page_df = self.modelCoVidStats.get_page(self.page, PAGE_SIZE)
-        for i, row in page_df.iterrows():
-            self.table.insert("", tk.END, values=list(row))
-        self.total_pages = self.modelCoVidStats.get_total_pages(PAGE_SIZE)
+        chunks = job.poll()
+        # Hiển thị trang đầu ngay khi có khối đầu tiên
+        if chunks and not self.first_chunk_shown and not job.finished:
+            self.first_chunk_shown = True
+            self.show_dataframe(chunks[0].rename(columns=self.column_map))
+        self.progress_bar["value"] = job.progress() * 100
+        self.progress_label.config(text=f"Đã đọc {job.rows_read} dòng ({job.bytes_read / 1e6:.1f}/{job.total_bytes / 1e6:.1f} MB)")
+        if not job.finished:
+            self.root.after(100, self.poll_load, job)
+            return
+
+        self.load_job = None
+        if not self.export_job:
+            self.cancel_button.config(state="disabled")
+        if job.error is not None:
+            job.span.end(cancelled=True)
+            self.progress_label.config(text="")
+            self.restore_previous()
+            messagebox.showerror("Mở file", f"Lỗi khi đọc dữ liệu:\n{job.error}")
+        elif job.cancelled:
+            job.span.end(cancelled=True)
+            self.progress_label.config(text="Đã hủy đọc file")
+            self.restore_previous()
+        else:
+            # Dữ liệu đã được đổi tên cột và áp dụng nhật ký thay đổi trong DataLoader
+            df = job.result
+            self.previous_df = None
+            self.previous_model = None
+            with tracing.within(job.span):
+                self.loader.detach()
+                self.loader = job.loader
+                self.show_dataframe(df)
+                self.loader.attach(self.modelCoVidStats)
+                self.update_cube()
+                self.update_derived_views()
+                if self.tab_visualization is not None:
+                    self.tab_visualization.update_model(self.modelCoVidStats, self.cube, self.spatial)
+                if self.tab_analysis is not None:
+                    self.tab_analysis.update_model(self.modelCoVidStats, self.cube)
+            job.span.end()
+            self.progress_label.config(text=f"Đã nạp {len(df)} dòng")
+            if self.load_notify:
+                messagebox.showinfo("Mở file", f"Đã nạp dữ liệu từ file:\n{self.loader.filepath}")
+
+    def cancel_load(self):
+        if self.load_job:
+            self.load_job.cancel()
+        if self.export_job:
+            self.export_job.cancel()
+
+    def is_loading(self):
+        if self.load_job and not self.load_job.finished:
+            messagebox.showwarning("Đang tải", "Dữ liệu đang được nạp, vui lòng đợi hoặc hủy.")
+            return True
+        # Luồng xuất đang đọc dữ liệu của model nên không cho sửa cho tới khi xuất xong
+        if self.export_job and not self.export_job.finished:
+            messagebox.showwarning("Đang xuất", "Dữ liệu đang được xuất ra file, vui lòng đợi hoặc hủy.")
+            return True
+        return False
+
+    def restore_previous(self):
+        """Quay lại model trước khi mở file (vẫn gắn với nhật ký, khối cube và các tab như cũ)."""
+        self.df = self.previous_df
+        self.show_model(self.previous_model)
+        self.previous_df = None
+        self.previous_model = None
+
+    def show_dataframe(self, df):
+        self.df = df
+        with tracing.stage("model_build"):
+            model = CovidStats(df) if df is not None else None
+        self.show_model(model)
+
+    def show_model(self, model):
+        self.modelCoVidStats = model
+        if model is not None:
+            model.reset_view()
+        if self.filter_engine is not None:
+            self.filter_engine.detach()
+        self.filter_engine = FilterEngine(self.modelCoVidStats) if self.modelCoVidStats is not None else None
+        self.current_filter = None
+        self.filter_label.config(text="")
+        self.page = 1
+        columns = list(model.columns) if model is not None else []
+        # Đặt lại cột của bảng
+        self.table.set_columns(columns)
+        self.sort_column['values'] = columns
+        if len(columns) > 0:
+            self.sort_column.set(columns[0])
+        self.refresh_table()
+
+    @tracing.traced()
+    def refresh_table(self):
+        # Bảng ảo chỉ cập nhật giá trị của các dòng đang hiển thị
+        self.table.set_model(self.modelCoVidStats, (self.page - 1) * PAGE_SIZE)
+
+    def on_table_scroll(self, offset, total):
+        self.total_pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+        self.page = offset // PAGE_SIZE + 1 if total else 0
         self.page_label.config(text=f"Trang {self.page}/{self.total_pages}")
-        total_records = len(self.modelCoVidStats.get_all())
-        self.total_record.config(text=f"Tổng số bản ghi: {total_records}")
+        self.total_record.config(text=f"Tổng số bản ghi: {total}")
 
 
-# Hàm tìm kiếm bản ghi
-    def search_records(self):
+# Hàm tìm kiếm bản ghi: combine là None (lọc mới), "and" hoặc "or" (ghép với bộ lọc hiện tại)
+    def search_records(self, combine=None):
         search_value = self.search_entry.get().strip()
         search_column_vn = self.search_column.get()
 
+        if self.modelCoVidStats is None:
+            return
         if not search_value:
             messagebox.showwarning("Tìm kiếm", "Vui lòng nhập giá trị để tìm kiếm.")
             return
@@ -176,44 +347,60 @@ class CovidApp:
             messagebox.showwarning("Tìm kiếm", "Cột tìm kiếm không hợp lệ.")
             return
 
-        filtered_df = self.df[self.df[search_column_vn].str.contains(search_value, case=False, na=False)]
+        try:
+            condition = parse_condition(search_column_vn, search_value, self.search_mode.get())
+            if combine == "and" and self.current_filter is not None:
+                condition = self.current_filter & condition
+            elif combine == "or" and self.current_filter is not None:
+                condition = self.current_filter | condition
+            with tracing.span("search_records", column=search_column_vn, combine=combine):
+                with tracing.stage("search"):
+                    ids = self.filter_engine.ids(condition)
+                    self.modelCoVidStats.set_view(ids)
+                self.current_filter = condition
+                self.page = 1
+                self.refresh_table()
+        except ValueError as e:
+            messagebox.showwarning("Tìm kiếm", str(e))
+            return
+        self.filter_label.config(text=f"Bộ lọc: {condition} ({len(ids)} bản ghi)")
 
-        self.modelCoVidStats = CovidStats(filtered_df)
-        self.total_pages = self.modelCoVidStats.get_total_pages(PAGE_SIZE)
+    def clear_search(self):
+        if self.modelCoVidStats is None:
+            return
+        self.modelCoVidStats.reset_view()
+        self.current_filter = None
+        self.filter_label.config(text="")
+        self.page = 1
         self.refresh_table()
-        
-    
 
     def first_page(self):
-        self.page = 1
-        self.refresh_table()
+        self.table.scroll_to(0)
 
     def last_page(self):
-        self.page = self.total_pages
-        self.refresh_table()
+        self.table.scroll_to((self.total_pages - 1) * PAGE_SIZE)
 
     def prev_page(self):
         if self.page > 1:
-            self.page -= 1
-            self.refresh_table()
+            self.table.scroll_to((self.page - 2) * PAGE_SIZE)
 
     def next_page(self):
         if self.page < self.total_pages:
-            self.page += 1
-            self.refresh_table()
+            self.table.scroll_to(self.page * PAGE_SIZE)
 
     def goto_page(self):
         try:
             page = int(self.goto_entry.get())
             if 1 <= page <= self.total_pages:
-                self.page = page
-                self.refresh_table()
+                self.table.scroll_to((page - 1) * PAGE_SIZE)
             else:
                 messagebox.showwarning("Trang", f"Chỉ số trang phải từ 1 đến {self.total_pages}")
         except ValueError:
             messagebox.showwarning("Trang", "Vui lòng nhập số trang hợp lệ.")
 
     def add_record(self):
+        if self.is_loading():
+            return
         # Hàm xử lý khi lưu bản ghi mới
         def on_save(record):
             #kiểm tra
@@ -239,68 +426,188 @@ class CovidApp:
                 messagebox.showwarning("Sai định dạng", "Ngày phải hợp lệ và theo định dạng yyyy-MM-dd!")
                 return
 
-            self.modelCoVidStats.add_record(record)
-            self.refresh_table()
+            with tracing.span("add_record"):
+                self.modelCoVidStats.add_record(record)
+                self.refresh_table()
         RecordModal(self.root, self.df.columns, on_save)
 
     def edit_record(self):
-        selected = self.table.selection()
+        if self.is_loading():
+            return
+        selected = self.table.selected_ids()
         if not selected:
             messagebox.showwarning("Sửa", "Chọn bản ghi để sửa")
             return
-        idx_in_page = self.table.index(selected[0])
-        idx = (self.page - 1) * PAGE_SIZE + idx_in_page
-        current = self.modelCoVidStats.get_all().iloc[idx].to_dict()
+        row_id = selected[0]
+        current = self.modelCoVidStats.get_record(row_id)
         def on_save(record):
-            self.modelCoVidStats.update_record(idx, record)
-            self.refresh_table()
+            with tracing.span("edit_record"):
+                self.modelCoVidStats.update_record(row_id, record)
+                self.refresh_table()
         RecordModal(self.root, self.df.columns, on_save, init_values=current)
 
     def delete_record(self):
-        selected = self.table.selection()
+        if self.is_loading():
+            return
+        selected = self.table.selected_ids()
         if not selected:
             messagebox.showwarning("Xóa", "Chọn bản ghi để xóa")
             return
         if not messagebox.askyesno("Xóa", f"Bạn có chắc muốn xóa {len(selected)} bản ghi?"):
             return
-        idxs_in_page = [self.table.index(item) for item in selected]
-        idxs = sorted([(self.page - 1) * PAGE_SIZE + idx for idx in idxs_in_page], reverse=True)
-        for idx in idxs:
-            self.modelCoVidStats.delete_record(idx)
-        self.refresh_table()
+        with tracing.span("delete_record", rows=len(selected)):
+            self.modelCoVidStats.delete_many(selected)
+            self.table.scroll_to(self.table.offset)
+
+    def undo(self):
+        self._replay_history("undo")
+
+    def redo(self):
+        self._replay_history("redo")
+
+    def _replay_history(self, direction):
+        # Chỉ áp dụng lại phần thay đổi đã lưu, chi phí tỉ lệ với số ô của thao tác
+        if self.is_loading() or self.modelCoVidStats is None:
+            return
+        with tracing.span(direction):
+            replay = self.modelCoVidStats.undo if direction == "undo" else self.modelCoVidStats.redo
+            if not replay():
+                self.root.bell()
+                return
+            self.refresh_table()
 
 # Hàm sắp xếp bản ghi
     def sort_records(self, ascending=True):
         col = self.sort_column.get()
-        if not col or not self.modelCoVidStats:
+        if not col or self.modelCoVidStats is None:
             return
-        # Sắp xếp DataFrame hiện tại
-        sorted_df = self.modelCoVidStats.get_all().sort_values(by=col, ascending=ascending)
-        self.modelCoVidStats = CovidStats(sorted_df)
-        self.page = 1
-        self.total_pages = self.modelCoVidStats.get_total_pages(PAGE_SIZE)
-        self.refresh_table()
+        # Sắp xếp view hiện tại (chỉ đổi thứ tự mã dòng, không sao chép dữ liệu)
+        with tracing.span("sort_records", column=col, ascending=ascending):
+            with tracing.stage("sort"):
+                self.modelCoVidStats.sort_records(col, ascending=ascending)
+            self.page = 1
+            self.refresh_table()
 
 
     def save_data(self):
-        self.loader.save_data(self.modelCoVidStats.get_all())
-        messagebox.showinfo("Lưu", "Đã lưu dữ liệu thành công.")
+        if self.is_loading() or self.modelCoVidStats is None:
+            return
+        # Thay đổi đã nằm trong nhật ký; lưu chỉ cần đồng bộ nhật ký (thỉnh thoảng gộp thành snapshot mới)
+        try:
+            with tracing.span("save_data"):
+                with tracing.stage("commit"):
+                    compacted = self.loader.commit(self.modelCoVidStats)
+        except Exception as e:
+            messagebox.showerror("Lưu", f"Lỗi khi lưu dữ liệu:\n{e}")
+            return
+        detail = "\nĐã gộp nhật ký vào file dữ liệu." if compacted else ""
+        messagebox.showinfo("Lưu", "Đã lưu dữ liệu thành công." + detail)
         
     def export_data(self):
-        # Hỏi người dùng nơi lưu file
+        if self.is_loading() or self.modelCoVidStats is None:
+            return
+        # Hỏi người dùng nơi lưu file; định dạng theo phần mở rộng (csv, csv.gz, csv.zst, jsonl, parquet)
         file_path = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv")],
+            filetypes=EXPORT_FILETYPES,
             title="Chọn nơi lưu file xuất dữ liệu"
         )
+        if file_path:
+            # Xuất view hiện tại (đã lọc/sắp xếp) theo từng khối trên luồng phụ
+            span = tracing.begin("export_data", file=os.path.basename(file_path))
+            self.export_job = StreamingExporter.from_model(self.modelCoVidStats, file_path, span=span).start()
+            self.cancel_button.config(state="normal")
+            self.progress_bar["value"] = 0
+            self.progress_label.config(text="Đang xuất dữ liệu...")
+            self.root.after(100, self.poll_export, self.export_job)
+
+    def poll_export(self, job):
+        if job is not self.export_job:
+            return
+        self.progress_bar["value"] = job.progress() * 100
+        if not job.finished:
+            self.progress_label.config(text=f"Đã xuất {job.rows_written}/{job.total_rows} dòng")
+            self.root.after(100, self.poll_export, job)
+            return
+
+        self.export_job = None
+        if not self.load_job:
+            self.cancel_button.config(state="disabled")
+        job.span.end(cancelled=job.error is not None or job.cancelled)
+        if job.error is not None:
+            self.progress_label.config(text="")
+            messagebox.showerror("Export", f"Lỗi khi xuất dữ liệu:\n{job.error}")
+        elif job.cancelled:
+            self.progress_label.config(text="Đã hủy xuất dữ liệu")
+        else:
+            self.progress_label.config(text=f"Đã xuất {job.rows_written} dòng")
+            messagebox.showinfo("Export", f"Đã xuất dữ liệu ra file:\n{job.output_path}")
+
+    def update_cube(self):
+        # Khối quốc gia × ngày gắn với model, dùng chung cho tab biểu đồ, tab phân tích và bảng tổng hợp
+        if self.cube is not None:
+            self.cube.detach()
+        model = self.modelCoVidStats
+        with tracing.stage("aggregate"):
+            self.cube = CaseCube(model.data).attach(model) if model is not None else None
+        # Chỉ mục không gian (vĩ độ/kinh độ) cho bản đồ và tìm địa điểm gần nhất
+        if self.spatial is not None:
+            self.spatial.detach()
+        with tracing.stage("spatial_index"):
+            self.spatial = SpatialIndex(model.data).attach(model) if model is not None else None
+
+    def update_derived_views(self):
+        # Các bảng dẫn xuất dùng chung khối quốc gia × ngày và tự cập nhật theo model
+        if self.derived_views is not None:
+            self.derived_views.detach()
+        cube = self.cube
+        with tracing.stage("derived_views"):
+            self.derived_views = MaterializedViews(cube).attach(self.modelCoVidStats) if cube is not None else None
+
+    def export_views(self):
+        if self.is_loading():
+            return
+        if self.derived_views is None:
+            messagebox.showwarning("Bảng tổng hợp", "Chưa có dữ liệu quốc gia × ngày để tổng hợp.")
+            return
+        output_dir = filedialog.askdirectory(title="Chọn thư mục ghi full_grouped, day_wise, country_wise_latest")
+        if output_dir:
+            try:
+                with tracing.span("export_views"):
+                    with tracing.stage("write"):
+                        paths = self.derived_views.save(output_dir)
+                messagebox.showinfo("Bảng tổng hợp", "Đã ghi các bảng:\n" + "\n".join(paths))
+            except Exception as e:
+                messagebox.showerror("Bảng tổng hợp", f"Lỗi khi ghi bảng tổng hợp:\n{e}")
+
+    def show_latency(self, span):
+        self.latency_label.config(text="Thao tác gần nhất: " + describe(span))
+
+    def export_trace(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("Chrome trace (JSON)", "*.json")],
+            title="Xuất trace thời gian xử lý"
+        )
         if file_path:
             try:
-                self.modelCoVidStats.get_all().to_csv(file_path, index=False)
-                messagebox.showinfo("Export", f"Đã xuất dữ liệu ra file:\n{file_path}")
+                count = TRACER.export_chrome_trace(file_path)
+                messagebox.showinfo("Xuất trace", f"Đã ghi {count} sự kiện ra file:\n{file_path}\n"
+                                                  "Mở bằng chrome://tracing hoặc ui.perfetto.dev.")
             except Exception as e:
-                messagebox.showerror("Export", f"Lỗi khi xuất dữ liệu:\n{e}")
+                messagebox.showerror("Xuất trace", f"Lỗi khi xuất trace:\n{e}")
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = CovidApp(root)
+    # Đo thời gian khởi động: import, dựng giao diện, tới khi cửa sổ đầu tiên được vẽ xong
+    startup = tracing.begin("startup", start=STARTED_NS)
+    tracing.begin("imports", cat="stage", parent=startup, start=STARTED_NS).end()
+    with tracing.within(startup):
+        with tracing.stage("build_ui"):
+            root = tk.Tk()
+            app = CovidApp(root)
+        with tracing.stage("first_window"):
+            root.update()
+    # Kết thúc span "startup" cũng hiện thời gian khởi động trên thanh trạng thái (show_latency) và trong trace
+    startup.end()
+    app.preload()
     root.mainloop()
@@ -0,0 +1,56 @@
+import shutil
+
+import pandas as pd
+
+from covid_stats.data_loader import ColumnarCache, DataLoader
+from covid_stats.models import CovidStats
+from covid_stats.schema import COLUMN_MAP
+
+
+def edited_copy(tmp_path):
+    """Chép datasets/tesst.csv, sửa và thêm một bản ghi qua DataLoader dùng COLUMN_MAP (như giao diện chính)."""
+    path = str(tmp_path / "tesst.csv")
+    shutil.copy("datasets/tesst.csv", path)
+    loader = DataLoader(path, cache=ColumnarCache(str(tmp_path / "cache")), column_map=COLUMN_MAP)
+    model = CovidStats(loader.load_data())
+    loader.attach(model)
+    model.update_record(model.all_ids()[1], {"Ca xác nhận": 777})
+    model.add_record({"Quốc gia/Vùng lãnh thổ": "Laos", "Ca xác nhận": 5, "Ngày": "2020-03-20"})
+    loader.commit(model)
+    loader.detach()
+    return path
+
+
+def test_replay_with_column_map(tmp_path):
+    path = edited_copy(tmp_path)
+    df = DataLoader(path, use_cache=False, column_map=COLUMN_MAP).load_data()
+    assert list(df.columns) == [COLUMN_MAP[col] for col in pd.read_csv(path).columns]
+    assert df["Ca xác nhận"].tolist()[1] == 777
+    assert df["Quốc gia/Vùng lãnh thổ"].iloc[-1] == "Laos"
+
+
+def test_replay_without_column_map(tmp_path):
+    # Tab làm sạch đọc file không đổi tên cột: nhật ký phải được dịch sang tên cột gốc
+    path = edited_copy(tmp_path)
+    raw = pd.read_csv(path)
+    df = DataLoader(path, use_cache=False).load_data()
+    assert list(df.columns) == list(raw.columns)
+    assert df["Confirmed"].tolist()[1] == 777
+    assert df["Country/Region"].iloc[-1] == "Laos"
+    assert len(df) == len(raw) + 1
+
+
+def test_replay_after_compact(tmp_path):
+    # Sau khi gộp, file CSV mang tên cột tiếng Việt; cả hai cách đọc đều thấy thay đổi mới
+    path = edited_copy(tmp_path)
+    loader = DataLoader(path, use_cache=False, column_map=COLUMN_MAP)
+    model = CovidStats(loader.load_data())
+    loader.attach(model)
+    loader.compact(model)
+    model.update_record(model.all_ids()[0], {"Tử vong": 9})
+    loader.commit(model)
+    loader.detach()
+    for reader in (DataLoader(path, use_cache=False), DataLoader(path, use_cache=False, column_map=COLUMN_MAP)):
+        df = reader.load_data()
+        assert df["Tử vong"].tolist()[0] == 9
+        assert df["Ca xác nhận"].tolist()[1] == 777